@@ -0,0 +1,65 @@
+"""
+Gunicorn settings for serving news_app in production.
+
+Usage (from the repository root, as the Docker image does):
+    gunicorn --config news_app/gunicorn.conf.py
+
+Every value can be overridden from the environment or on the command
+line (``--workers 4``). Use it with
+DJANGO_SETTINGS_MODULE=news_app.settings_production.
+"""
+import multiprocessing
+import os
+
+# Import news_app.wsgi from the directory holding manage.py wherever
+# gunicorn is started
+chdir = os.path.dirname(os.path.abspath(__file__))
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+
+# One process per core, plus spares for the time a worker waits on the
+# database, and threads inside each so one slow request does not hold
+# up its neighbours. Each thread keeps its own persistent database
+# connection: workers * threads must stay below MariaDB's max_connections
+# (151 by default).
+workers = int(os.getenv('WEB_CONCURRENCY')
+              or multiprocessing.cpu_count() * 2 + 1)
+threads = int(os.getenv('GUNICORN_THREADS') or 4)
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+# uvicorn workers (uvicorn_worker.UvicornWorker) serve the ASGI app
+# instead; run them with DB_CONN_MAX_AGE=0
+wsgi_app = ('news_app.asgi:application' if 'uvicorn' in worker_class.lower()
+            else 'news_app.wsgi:application')
+
+# Load Django, the URLconf and the views once in the master process and
+# fork the workers from it: they start faster and share its memory pages
+preload_app = True
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then so a slow leak cannot grow forever; the
+# jitter keeps them from restarting all at once
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '2000'))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+
+
+def when_ready(server):  # pylint: disable=unused-argument
+    """
+    Runs in the master once the app is loaded, before the first fork.
+
+    Loads the search index so the workers inherit it instead of each
+    reading the snapshot, then closes any database connection opened on
+    the way: a connection shared by forked workers would interleave
+    their queries on one socket.
+    """
+    # pylint: disable=import-outside-toplevel
+    from django.conf import settings
+    from django.db import connections
+    from newsapp.functions.search import get_store
+
+    if getattr(settings, 'NEWSAPP_SEARCH_BACKEND', 'index') == 'index':
+        get_store().refresh()
+    connections.close_all()
@@ -23,11 +23,22 @@ env = environ.Env()
 environ.Env.read_env(os.path.join(BASE_DIR, ".env"))
 
 # Twitter API Credentials
-TWITTER_CONSUMER_KEY = env('TWITTER_CONSUMER_KEY')
-TWITTER_CONSUMER_SECRET = env('TWITTER_CONSUMER_SECRET')
-TWITTER_ACCESS_TOKEN = env('TWITTER_ACCESS_TOKEN')
-TWITTER_ACCESS_TOKEN_SECRET = env('TWITTER_ACCESS_TOKEN_SECRET')
-TWITTER_BEARER_TOKEN = env('TWITTER_BEARER_TOKEN')
+TWITTER_CONSUMER_KEY = env('TWITTER_CONSUMER_KEY', default='')
+TWITTER_CONSUMER_SECRET = env('TWITTER_CONSUMER_SECRET', default='')
+TWITTER_ACCESS_TOKEN = env('TWITTER_ACCESS_TOKEN', default='')
+TWITTER_ACCESS_TOKEN_SECRET = env('TWITTER_ACCESS_TOKEN_SECRET', default='')
+TWITTER_BEARER_TOKEN = env('TWITTER_BEARER_TOKEN', default='')
+# Base URL replacing https://api.twitter.com, e.g. a local fake endpoint
+TWITTER_API_URL = env('TWITTER_API_URL', default='')
+
+# Client class ('newsapp.functions.twitter_api.FakeClient' works offline),
+# clients kept per process, and the POST /2/tweets rate limit of the
+# account's access level (free tier: 17 per 24 hours)
+NEWSAPP_TWITTER_CLIENT = env('NEWSAPP_TWITTER_CLIENT', default='tweepy.Client')
+NEWSAPP_TWITTER_POOL_SIZE = env.int('NEWSAPP_TWITTER_POOL_SIZE', default=4)
+NEWSAPP_TWEET_RATE_LIMIT = env.int('NEWSAPP_TWEET_RATE_LIMIT', default=17)
+NEWSAPP_TWEET_RATE_WINDOW = env.int('NEWSAPP_TWEET_RATE_WINDOW',
+                                    default=24 * 60 * 60)
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -55,6 +66,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Inactive unless NEWSAPP_INSTRUMENTATION is set
+    'newsapp.middleware.InstrumentationMiddleware',
+    # Inactive unless NEWSAPP_READ_REPLICAS is set
+    'newsapp.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -98,6 +113,63 @@ DATABASES = {
     }
 }
 
+# DB_ENGINE=sqlite runs the app and test suite locally without MariaDB
+if os.getenv('DB_ENGINE') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('DB_NAME', BASE_DIR / 'db.sqlite3'),
+        }
+    }
+
+# Read replicas of the database above: DB_REPLICA_HOSTS=host1,host2 for
+# MariaDB, or DB_REPLICA_NAME=<file> with DB_ENGINE=sqlite for a local
+# stand-in (a copy of the primary's file). Tests mirror them to default.
+if os.getenv('DB_ENGINE') == 'sqlite':
+    _replicas = [{'NAME': name} for name in
+                 filter(None, [os.getenv('DB_REPLICA_NAME')])]
+else:
+    _replicas = [{'HOST': host} for host in
+                 filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(','))]
+for _number, _replica in enumerate(_replicas, 1):
+    DATABASES[f'replica{_number}'] = {**DATABASES['default'], **_replica,
+                                      'TEST': {'MIRROR': 'default'}}
+
+# GET requests read from these aliases; a user who writes is kept on the
+# primary for NEWSAPP_REPLICA_STICKY_SECONDS
+DATABASE_ROUTERS = ['newsapp.routers.ReplicaRouter']
+NEWSAPP_READ_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+NEWSAPP_REPLICA_STICKY_SECONDS = int(os.getenv(
+    'NEWSAPP_REPLICA_STICKY_SECONDS', '10'))
+
+
+# Cache
+# Cached user roles are versioned here, so deployments running several
+# processes should point CACHE_BACKEND at a shared cache (e.g. Redis).
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND',
+                             'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'newsapp'),
+    }
+}
+# Local-memory and file caches keep only 300 entries by default, fewer
+# than the cached rows of one article list
+if CACHES['default']['BACKEND'].endswith(('LocMemCache', 'FileBasedCache')):
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '20000')),
+    }
+
+# Cache alias and lifetime for single articles/newsletters. Point
+# CACHE_BACKEND at FileBasedCache or Redis to share it between processes.
+NEWSAPP_OBJECT_CACHE = os.getenv('NEWSAPP_OBJECT_CACHE', 'default')
+NEWSAPP_OBJECT_CACHE_TIMEOUT = int(os.getenv('NEWSAPP_OBJECT_CACHE_TIMEOUT',
+                                             '300'))
+# Lifetime of the cached article list rows, kept in the same cache. Rows
+# are keyed on the post's updated_at, so edits never need invalidating
+NEWSAPP_FRAGMENT_CACHE_TIMEOUT = int(os.getenv(
+    'NEWSAPP_FRAGMENT_CACHE_TIMEOUT', '600'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -158,3 +230,58 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = 'newsappreset@gmail.com'
 EMAIL_HOST_PASSWORD = 'hctg jbjj srjv meea'
 DEFAULT_FROM_EMAIL = 'newsappreset@gmail.com'
+
+# Subscriber notifications: recipients per SMTP connection and a
+# messages-per-second cap (0 disables the cap)
+NEWSAPP_EMAIL_BATCH_SIZE = int(os.getenv('NEWSAPP_EMAIL_BATCH_SIZE', '100'))
+NEWSAPP_EMAIL_RATE = float(os.getenv('NEWSAPP_EMAIL_RATE', '0'))
+
+# Personal feeds: entries kept per reader, and the subscriber count above
+# which a publisher's posts are merged in on read instead of fanned out
+NEWSAPP_FEED_MAX_LENGTH = int(os.getenv('NEWSAPP_FEED_MAX_LENGTH', '500'))
+NEWSAPP_FEED_FANOUT_LIMIT = int(os.getenv('NEWSAPP_FEED_FANOUT_LIMIT',
+                                          '10000'))
+
+# Search: 'index' (in-process inverted index stored under
+# NEWSAPP_SEARCH_INDEX_PATH) or 'fulltext' (MariaDB/MySQL FULLTEXT)
+NEWSAPP_SEARCH_BACKEND = os.getenv('NEWSAPP_SEARCH_BACKEND', 'index')
+NEWSAPP_SEARCH_INDEX_PATH = os.getenv('NEWSAPP_SEARCH_INDEX_PATH',
+                                      str(BASE_DIR / 'search_index'))
+# Journal size (bytes) past which changes are folded into the snapshot
+NEWSAPP_SEARCH_JOURNAL_MAX_BYTES = int(os.getenv(
+    'NEWSAPP_SEARCH_JOURNAL_MAX_BYTES', str(16 * 1024 * 1024)))
+
+# Moderation: seconds a claimed post stays reserved for its moderator
+NEWSAPP_CLAIM_TIMEOUT = int(os.getenv('NEWSAPP_CLAIM_TIMEOUT', '900'))
+
+# Request instrumentation: per-view timings and query counts at
+# /internal/metrics/ and on the newsapp.requests logger. The metrics and
+# the X-Profile header are only honoured for INTERNAL_IPS (and staff, for
+# the metrics)
+NEWSAPP_INSTRUMENTATION = os.getenv('NEWSAPP_INSTRUMENTATION') == '1'
+NEWSAPP_DUPLICATE_QUERY_WARNING = int(os.getenv(
+    'NEWSAPP_DUPLICATE_QUERY_WARNING', '5'))
+INTERNAL_IPS = os.getenv('INTERNAL_IPS', '127.0.0.1').split(',')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'newsapp.functions.instrumentation.JsonFormatter'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+        'json': {'class': 'logging.StreamHandler', 'formatter': 'json'},
+    },
+    'loggers': {
+        'newsapp': {
+            'handlers': ['console'],
+            'level': os.getenv('NEWSAPP_LOG_LEVEL', 'INFO'),
+        },
+        'newsapp.requests': {
+            'handlers': ['json'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
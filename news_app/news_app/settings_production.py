@@ -0,0 +1,97 @@
+"""
+Production settings for news_app.
+
+Select them with DJANGO_SETTINGS_MODULE=news_app.settings_production;
+everything not set here comes from settings.py.
+"""
+import os
+from django.core.exceptions import ImproperlyConfigured
+from .settings import *  # noqa: F401,F403 pylint: disable=wildcard-import,unused-wildcard-import
+from .settings import BASE_DIR, CACHES, DATABASES, MIDDLEWARE, TEMPLATES
+
+try:
+    import whitenoise
+except ImportError:
+    whitenoise = None
+
+DEBUG = False
+
+# The development key is public: refuse to start without a real one
+SECRET_KEY = os.getenv('DJANGO_SECRET_KEY')
+if not SECRET_KEY:
+    raise ImproperlyConfigured("Set DJANGO_SECRET_KEY to use the production "
+                               "settings")
+ALLOWED_HOSTS = (os.getenv('DJANGO_ALLOWED_HOSTS')
+                 or 'localhost,127.0.0.1').split(',')
+
+# Persistent database connections: each worker thread keeps its
+# connection for DB_CONN_MAX_AGE seconds instead of paying the TCP and
+# authentication handshake on every request. Health checks test a reused
+# connection before each request, so one the server has dropped is
+# replaced instead of failing the request. Keep DB_CONN_MAX_AGE below
+# MariaDB's wait_timeout. Under ASGI set DB_CONN_MAX_AGE=0, as Django
+# recommends: connections there are not reliably returned between
+# requests and would pile up rather than be reused.
+for _database in DATABASES.values():
+    _database['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', '300'))
+    _database['CONN_HEALTH_CHECKS'] = True
+
+# Shared cache: every gunicorn worker is a separate process, and object
+# versions, ETags and role versions stored in a per-process local-memory
+# cache would go stale in all the other workers. Use Redis at REDIS_URL
+# (redis://host:6379/0), or else a cache directory on the local disk,
+# which is shared by the workers of one machine only.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+elif CACHES['default']['BACKEND'].endswith('LocMemCache'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('CACHE_DIR') or str(BASE_DIR / 'cache'),
+            'OPTIONS': CACHES['default']['OPTIONS'],
+        }
+    }
+
+# Templates are compiled on first use and kept in memory by every worker
+# process instead of being read and parsed again on each render
+TEMPLATES = [{
+    **TEMPLATES[0],
+    'APP_DIRS': False,
+    'OPTIONS': {
+        **TEMPLATES[0]['OPTIONS'],
+        'loaders': [
+            ('django.template.loaders.cached.Loader', [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ]),
+        ],
+    },
+}]
+
+# Static files: collectstatic copies them to STATIC_ROOT. With WhiteNoise
+# installed the app serves them itself, compressed and with far-future
+# cache headers on the hashed names; otherwise serve STATIC_ROOT at
+# STATIC_URL from the proxy in front of gunicorn.
+if whitenoise:
+    # Right after SecurityMiddleware, as WhiteNoise requires
+    _after = MIDDLEWARE.index(
+        'django.middleware.security.SecurityMiddleware') + 1
+    MIDDLEWARE = [*MIDDLEWARE[:_after],
+                  'whitenoise.middleware.WhiteNoiseMiddleware',
+                  *MIDDLEWARE[_after:]]
+    STORAGES = {
+        'default': {
+            'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        },
+        'staticfiles': {
+            'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+        },
+    }
+    # A template naming a file that was never collected renders the plain
+    # URL instead of failing the request
+    WHITENOISE_MANIFEST_STRICT = False
@@ -1,6 +1,8 @@
 '''Imported Modules'''
 from django.contrib import admin
-from .models import Publisher, Journalist, Editor, Reader, Article
+from .models import (
+    Publisher, Journalist, Editor, Reader, Article, OutboxEvent
+)
 
 # Registered models
 admin.site.register(Publisher)
@@ -8,3 +10,4 @@ admin.site.register(Journalist)
 admin.site.register(Editor)
 admin.site.register(Reader)
 admin.site.register(Article)
+admin.site.register(OutboxEvent)
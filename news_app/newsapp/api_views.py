@@ -1,10 +1,34 @@
 """Modules Imported"""
-from rest_framework.decorators import api_view, permission_classes
+import hashlib
+from datetime import datetime, timezone as dt_timezone
+from rest_framework.decorators import (
+    api_view, permission_classes, renderer_classes
+)
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
 from rest_framework import status
+from django.http import Http404, StreamingHttpResponse
 from django.urls import reverse
-from .models import Article, ArticleSerializer, Newsletter, NewsletterSerializer
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import condition
+from .models import (
+    Article, ArticleSerializer, ArticleExportSerializer,
+    ArticleImportSerializer, Journalist, Newsletter, NewsletterSerializer,
+    NewsletterExportSerializer, NewsletterImportSerializer
+)
+from .functions.export import EXPORT_FORMATS, stream_export
+from .functions.ingest import IMPORT_FORMATS, import_posts
+from .functions.fast_serializers import FastJSONRenderer, fast_serializer
+from .functions.object_cache import (
+    listing_version, object_version, post_json
+)
+from .functions.pagination import (
+    InvalidCursor, paginate_by_cursor, parse_page_size
+)
+from .functions.search import POST_TYPES, load_hits, search
+from .functions.stats import published_count
 
 
 def create_resource_response(serializer, resource_name, request):
@@ -18,23 +42,247 @@ def create_resource_response(serializer, resource_name, request):
     return data
 
 
+def build_page_url(request, cursor):
+    """
+    Helper function to build a HATEOAS-style link to another page
+    of the current listing
+    """
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    return request.build_absolute_uri(f"{request.path}?{params.urlencode()}")
+
+
+def request_journalist(request):
+    """
+    Helper function to fetch the current user's journalist profile together
+    with their publisher in one query, or None if they are not a journalist
+    """
+    return (Journalist.objects.select_related('publisher')
+            .filter(user=request.user).first())
+
+
+def create_post_response(request, serializer_class, resource_name):
+    """
+    Helper function to create one post for the current journalist
+    """
+    journalist = request_journalist(request)
+    if journalist is None or journalist.publisher is None:
+        return Response({"error": "Only journalists with a publisher can "
+                                  "create posts"},
+                        status=status.HTTP_403_FORBIDDEN)
+    serializer = serializer_class(data=request.data)
+    if serializer.is_valid():
+        serializer.save(journalist=journalist,
+                        publisher=journalist.publisher)
+        return Response(
+            create_resource_response(serializer, resource_name, request),
+            status=status.HTTP_201_CREATED
+        )
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+def create_import_response(request, serializer_class):
+    """
+    Helper function to import posts for the current journalist from an
+    NDJSON or CSV request body, read as a stream
+    """
+    journalist = request_journalist(request)
+    if journalist is None or journalist.publisher is None:
+        return Response({"error": "Only journalists with a publisher can "
+                                  "import posts"},
+                        status=status.HTTP_403_FORBIDDEN)
+    fmt = next((name for name, content_type in IMPORT_FORMATS.items()
+                if request.content_type == content_type), None)
+    if fmt is None:
+        return Response({"error": "Send application/x-ndjson or text/csv"},
+                        status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    report = import_posts(request.stream or [], fmt, serializer_class,
+                          journalist)
+    if report.created:
+        code = status.HTTP_201_CREATED
+    elif report.failed:
+        code = status.HTTP_400_BAD_REQUEST
+    else:
+        code = status.HTTP_200_OK
+    return Response(report.as_dict(), status=code)
+
+
+def create_page_response(request, queryset, serializer_class, resource_name):
+    """
+    Helper function to build a cursor-paginated listing response
+    with next/prev links. Rows are read as tuples and serialized through
+    the compiled fast path of ``serializer_class``
+    """
+    page_size = parse_page_size(request.query_params.get('page_size'))
+    serializer = fast_serializer(serializer_class)
+    try:
+        page = paginate_by_cursor(serializer.rows(queryset),
+                                  request.query_params.get('cursor'),
+                                  page_size)
+    except InvalidCursor:
+        return Response({"error": "Invalid cursor"},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    with_count = request.query_params.get('count') in ('1', 'true')
+    return Response(
+        page_data(request, page, serializer.many(page.items),
+                  published_count(resource_name) if with_count else None,
+                  resource_name),
+        status=status.HTTP_200_OK
+    )
+
+
+def page_data(request, page, items, count, resource_name):
+    """
+    Helper function to build the body of a listing page, shared by the
+    sync and async API views
+    """
+    return {
+        "count": count,
+        f"{resource_name}s": items,
+        "links": {
+            "self": request.build_absolute_uri(),
+            "next": (build_page_url(request, page.next_cursor)
+                     if page.next_cursor else None),
+            "prev": (build_page_url(request, page.prev_cursor)
+                     if page.prev_cursor else None),
+            "create": request.build_absolute_uri(
+                reverse(f'news_app:api_create_{resource_name}'))
+        }
+    }
+
+
+def create_export_response(request, queryset, serializer_class):
+    """
+    Helper function to stream a queryset as NDJSON or a JSON array,
+    optionally limited to rows changed since ``updated_since``
+    """
+    try:
+        fmt, queryset = export_options(request, queryset)
+    except ValueError as e:
+        return Response({"error": str(e)},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    return StreamingHttpResponse(
+        stream_export(queryset, serializer_class, fmt),
+        content_type=EXPORT_FORMATS[fmt]
+    )
+
+
+def export_options(request, queryset):
+    """
+    Helper function to read the ``output`` and ``updated_since`` export
+    params, shared by the sync and async API views
+
+    Returns:
+        tuple: (format, queryset filtered by ``updated_since``)
+
+    Raises:
+        ValueError: With the error message for the client.
+    """
+    fmt = request.GET.get('output', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError("Unsupported export format")
+
+    updated_since = request.GET.get('updated_since')
+    if updated_since:
+        since = parse_datetime(updated_since)
+        if since is None:
+            raise ValueError("Invalid updated_since")
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        queryset = queryset.filter(updated_at__gte=since)
+    return fmt, queryset
+
+
+def validator_tag(request, *parts):
+    """
+    Helper function to hash the parts of an ETag together with the query
+    string and Accept header, which both change the response body
+    """
+    key = ':'.join(str(part) for part in (
+        *parts,
+        request.META.get('QUERY_STRING', ''),
+        request.META.get('HTTP_ACCEPT', ''),
+    ))
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def listing_condition(model):
+    """
+    Conditional GET for a listing of approved posts.
+
+    Uses the listing version that every save, delete and bulk approval
+    bumps, as ``detail_condition`` does for one post, so validating a
+    request reads one cache key and a 304 never queries the posts.
+    """
+    post_type = model.__name__.lower()
+
+    def version(request):
+        # Read once, so the ETag and Last-Modified agree
+        if not hasattr(request, '_listing_version'):
+            request._listing_version = listing_version(post_type)
+        return request._listing_version
+
+    def etag(request, *args, **kwargs):
+        return validator_tag(request, model.__name__, version(request))
+
+    def last_modified(request, *args, **kwargs):
+        # The version is the time of the last change
+        return datetime.fromtimestamp(version(request) / 1e9,
+                                      tz=dt_timezone.utc)
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def detail_condition(post_type):
+    """
+    Conditional GET for one post, using the object cache version that
+    every save and delete bumps, so no query is needed.
+    """
+    def etag(request, pk):
+        return validator_tag(request, post_type, pk,
+                             object_version(post_type, pk))
+
+    return condition(etag_func=etag)
+
+
 # ---------------------- ARTICLES ----------------------
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@renderer_classes([FastJSONRenderer, BrowsableAPIRenderer])
+@listing_condition(Article)
 def api_articles(request):
     """
-    Retrieve all approved articles
+    Retrieve approved articles, newest first, one cursor page at a time.
+
+    Query params:
+        cursor: Opaque cursor taken from a previous ``next``/``prev`` link.
+        page_size: Items per page (capped at 100).
+        count: Pass ``true`` to include the total, read from the
+        publishers' counters.
+
+    Responses carry ETag and Last-Modified, so pollers can send
+    If-None-Match / If-Modified-Since and get a 304 when nothing changed.
     """
-    articles = Article.objects.filter(approved=True)
-    serializer = ArticleSerializer(articles, many=True)
-    return Response({
-        "count": articles.count(),
-        "articles": serializer.data,
-        "links": {
-            "self": request.build_absolute_uri(),
-            "create": request.build_absolute_uri(reverse('news_app:api_create_article'))
-        }
-    }, status=status.HTTP_200_OK)
+    articles = Article.objects.for_api().published()
+    return create_page_response(request, articles, ArticleSerializer,
+                                'article')
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def api_export_articles(request):
+    """
+    Stream every approved article without loading the corpus in memory.
+
+    Query params:
+        output: ``ndjson`` (default) or ``json``.
+        updated_since: ISO timestamp, only rows changed since then.
+    """
+    articles = Article.objects.for_api().published()
+    return create_export_response(request, articles, ArticleExportSerializer)
 
 
 @api_view(['POST'])
@@ -43,52 +291,70 @@ def api_create_article(request):
     """
     Create a new article and associate it with the current journalist & publisher
     """
-    serializer = ArticleSerializer(data=request.data)
-    if serializer.is_valid():
-        serializer.save(
-            journalist=request.user.journalist,
-            publisher=request.user.journalist.publisher
-        )
-        return Response(
-            create_resource_response(serializer, 'article', request),
-            status=status.HTTP_201_CREATED
-        )
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    return create_post_response(request, ArticleSerializer, 'article')
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def api_import_articles(request):
+    """
+    Bulk create articles for the current journalist from an NDJSON
+    (application/x-ndjson) or CSV (text/csv, with a header row) body.
+
+    Each row needs a title and content. Rows are validated and inserted in
+    chunks; invalid rows are reported by number without stopping the
+    import. Imported articles wait for approval.
+    """
+    return create_import_response(request, ArticleImportSerializer)
 
 
 # Optional: single article view for HATEOAS links
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@detail_condition('article')
 def api_article_detail(request, pk):
     """
     Retrieve a single article by ID
     """
     try:
-        article = Article.objects.get(pk=pk, approved=True)
-    except Article.DoesNotExist:
+        data = post_json('article', pk)
+    except Http404:
+        data = None
+    if not data or not data['approved']:
         return Response({"error": "Article not found"}, status=status.HTTP_404_NOT_FOUND)
 
-    serializer = ArticleSerializer(article)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    return Response(data, status=status.HTTP_200_OK)
 
 
 # ---------------------- NEWSLETTERS ----------------------
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@renderer_classes([FastJSONRenderer, BrowsableAPIRenderer])
+@listing_condition(Newsletter)
 def api_newsletters(request):
     """
-    Retrieve all approved newsletters
+    Retrieve approved newsletters, newest first, one cursor page at a time.
+
+    Accepts the same ``cursor``, ``page_size`` and ``count`` query params
+    as ``api_articles``.
     """
-    newsletters = Newsletter.objects.filter(approved=True)
-    serializer = NewsletterSerializer(newsletters, many=True)
-    return Response({
-        "count": newsletters.count(),
-        "newsletters": serializer.data,
-        "links": {
-            "self": request.build_absolute_uri(),
-            "create": request.build_absolute_uri(reverse('news_app:api_create_newsletter'))
-        }
-    }, status=status.HTTP_200_OK)
+    newsletters = Newsletter.objects.for_api().published()
+    return create_page_response(request, newsletters, NewsletterSerializer,
+                                'newsletter')
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def api_export_newsletters(request):
+    """
+    Stream every approved newsletter without loading them all in memory.
+
+    Accepts the same ``output`` and ``updated_since`` query params
+    as ``api_export_articles``.
+    """
+    newsletters = Newsletter.objects.for_api().published()
+    return create_export_response(request, newsletters,
+                                  NewsletterExportSerializer)
 
 
 @api_view(['POST'])
@@ -97,30 +363,90 @@ def api_create_newsletter(request):
     """
     Create a new newsletter and associate it with the current journalist & publisher
     """
-    serializer = NewsletterSerializer(data=request.data)
-    if serializer.is_valid():
-        serializer.save(
-            journalist=request.user.journalist,
-            publisher=request.user.journalist.publisher
-        )
-        return Response(
-            create_resource_response(serializer, 'newsletter', request),
-            status=status.HTTP_201_CREATED
-        )
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    return create_post_response(request, NewsletterSerializer, 'newsletter')
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def api_import_newsletters(request):
+    """
+    Bulk create newsletters for the current journalist from an NDJSON
+    (application/x-ndjson) or CSV (text/csv, with a header row) body.
+
+    Each row needs a title and content. Rows are validated and inserted in
+    chunks; invalid rows are reported by number without stopping the
+    import. Imported newsletters wait for approval.
+    """
+    return create_import_response(request, NewsletterImportSerializer)
 
 
 # Optional: single newsletter view for HATEOAS links
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@detail_condition('newsletter')
 def api_newsletter_detail(request, pk):
     """
     Retrieve a single newsletter by ID
     """
     try:
-        newsletter = Newsletter.objects.get(pk=pk, approved=True)
-    except Newsletter.DoesNotExist:
+        data = post_json('newsletter', pk)
+    except Http404:
+        data = None
+    if not data or not data['approved']:
         return Response({"error": "Newsletter not found"}, status=status.HTTP_404_NOT_FOUND)
 
-    serializer = NewsletterSerializer(newsletter)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    return Response(data, status=status.HTTP_200_OK)
+
+
+# ---------------------- SEARCH ----------------------
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def api_search(request):
+    """
+    Full-text search over approved articles and newsletters, best match
+    first.
+
+    Query params:
+        q: Search terms.
+        type: ``article`` or ``newsletter`` to search one kind only.
+        page: 1-based page number.
+        page_size: Items per page (capped at 100).
+    """
+    query = request.query_params.get('q', '')
+    post_type = request.query_params.get('type') or None
+    if post_type not in (None, *POST_TYPES):
+        return Response({"error": "Invalid type"},
+                        status=status.HTTP_400_BAD_REQUEST)
+    page_size = parse_page_size(request.query_params.get('page_size'))
+    page = parse_page_size(request.query_params.get('page'), 1,
+                           10000 // page_size)
+
+    results = search(query, post_type, page_size, (page - 1) * page_size)
+    params = request.query_params.copy()
+    links = {"self": request.build_absolute_uri(), "next": None,
+             "prev": None}
+    if page * page_size < results.total:
+        params['page'] = page + 1
+        links['next'] = request.build_absolute_uri(
+            f"{request.path}?{params.urlencode()}")
+    if page > 1:
+        params['page'] = page - 1
+        links['prev'] = request.build_absolute_uri(
+            f"{request.path}?{params.urlencode()}")
+
+    return Response({
+        "query": query,
+        "count": results.total,
+        "results": [{
+            "type": hit.post_type,
+            "id": post.id,
+            "title": post.title,
+            "journalist": post.journalist.user.username,
+            "publisher": post.publisher.user.username,
+            "created_at": post.created_at,
+            "score": hit.score,
+            "url": request.build_absolute_uri(
+                reverse(f'news_app:read_{hit.post_type}', args=[post.id])),
+        } for hit, post in load_hits(results.hits)],
+        "links": links,
+    }, status=status.HTTP_200_OK)
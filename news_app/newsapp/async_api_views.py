@@ -0,0 +1,163 @@
+"""Async versions of the read-only API endpoints, for ASGI deployments"""
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from .api_views import (
+    detail_condition, export_options, listing_condition, page_data
+)
+from .models import (
+    Article, ArticleSerializer, ArticleExportSerializer,
+    Newsletter, NewsletterSerializer, NewsletterExportSerializer
+)
+from .functions.export import EXPORT_FORMATS, astream_export
+from .functions.fast_serializers import dumps, fast_serializer
+from .functions.object_cache import apost_json
+from .functions.pagination import (
+    InvalidCursor, apaginate_by_cursor, parse_page_size
+)
+from .functions.stats import published_count
+
+
+def json_response(data, status=200):
+    """
+    Helper function to encode ``data`` exactly like the DRF views do
+    """
+    return HttpResponse(dumps(data), status=status,
+                        content_type='application/json')
+
+
+def async_login_required(view):
+    """
+    Reject anonymous requests the way the DRF views do, resolving the
+    session user with ``request.auser()``.
+
+    Only session authentication is supported; HTTP Basic clients should
+    keep using the sync endpoints.
+    """
+    @wraps(view)
+    async def inner(request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return json_response(
+                {"detail": "Authentication credentials were not provided."},
+                status=403)
+        return await view(request, *args, **kwargs)
+    return inner
+
+
+async def create_page_response(request, model, serializer_class,
+                               resource_name):
+    """
+    Helper function to build a cursor-paginated listing response, with the
+    same body as the sync API
+    """
+    page_size = parse_page_size(request.GET.get('page_size'))
+    serializer = fast_serializer(serializer_class)
+    queryset = model.objects.for_api().published()
+    try:
+        page = await apaginate_by_cursor(serializer.rows(queryset),
+                                         request.GET.get('cursor'),
+                                         page_size)
+    except InvalidCursor:
+        return json_response({"error": "Invalid cursor"}, status=400)
+
+    count = None
+    if request.GET.get('count') in ('1', 'true'):
+        count = await sync_to_async(published_count)(resource_name)
+    return json_response(page_data(request, page, serializer.many(page.items),
+                                   count, resource_name))
+
+
+async def create_detail_response(request, post_type, pk, not_found):
+    """
+    Helper function to return one approved post from the object cache
+    """
+    try:
+        data = await apost_json(post_type, pk)
+    except Http404:
+        data = None
+    if not data or not data['approved']:
+        return json_response({"error": not_found}, status=404)
+    return json_response(data)
+
+
+def create_export_response(request, model, serializer_class):
+    """
+    Helper function to stream an export from an async generator
+    """
+    queryset = model.objects.for_api().published()
+    try:
+        fmt, queryset = export_options(request, queryset)
+    except ValueError as e:
+        return json_response({"error": str(e)}, status=400)
+    return StreamingHttpResponse(
+        astream_export(queryset, serializer_class, fmt),
+        content_type=EXPORT_FORMATS[fmt]
+    )
+
+
+# ---------------------- ARTICLES ----------------------
+@require_GET
+@async_login_required
+@listing_condition(Article)
+async def api_articles(request):
+    """
+    Async ``api_views.api_articles``: same query params, body and
+    conditional GET headers.
+    """
+    return await create_page_response(request, Article, ArticleSerializer,
+                                      'article')
+
+
+@require_GET
+@async_login_required
+async def api_export_articles(request):
+    """
+    Async ``api_views.api_export_articles``.
+    """
+    return create_export_response(request, Article, ArticleExportSerializer)
+
+
+@require_GET
+@async_login_required
+@detail_condition('article')
+async def api_article_detail(request, pk):
+    """
+    Async ``api_views.api_article_detail``.
+    """
+    return await create_detail_response(request, 'article', pk,
+                                        "Article not found")
+
+
+# ---------------------- NEWSLETTERS ----------------------
+@require_GET
+@async_login_required
+@listing_condition(Newsletter)
+async def api_newsletters(request):
+    """
+    Async ``api_views.api_newsletters``.
+    """
+    return await create_page_response(request, Newsletter,
+                                      NewsletterSerializer, 'newsletter')
+
+
+@require_GET
+@async_login_required
+async def api_export_newsletters(request):
+    """
+    Async ``api_views.api_export_newsletters``.
+    """
+    return create_export_response(request, Newsletter,
+                                  NewsletterExportSerializer)
+
+
+@require_GET
+@async_login_required
+@detail_condition('newsletter')
+async def api_newsletter_detail(request, pk):
+    """
+    Async ``api_views.api_newsletter_detail``.
+    """
+    return await create_detail_response(request, 'newsletter', pk,
+                                        "Newsletter not found")
@@ -0,0 +1,184 @@
+"""Read-only fast path for the article and newsletter serializers"""
+from functools import partial
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils import encoders, json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Columns every row needs for cursor pagination and keyset exports
+KEY_COLUMNS = ('id', 'created_at')
+
+
+def _format_datetime(field, value, tz):
+    """
+    ``DateTimeField.to_representation`` for the ISO 8601 case.
+    """
+    if tz is not None and timezone.is_aware(value):
+        value = value.astimezone(tz).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return field.to_representation(value)
+
+
+class FastSerializer:
+    """
+    Serializes rows read with ``values_list`` exactly like ``serializer_class``.
+
+    The serializer's fields are inspected once and turned into a Python
+    function that builds each dict from a row tuple, so no model instances
+    are created and DRF's per-field machinery is skipped.
+
+    Attributes:
+        serializer_class (Serializer): The ModelSerializer being mirrored.
+        columns (tuple): Columns to read, serializer fields first.
+    """
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        fields = serializer_class().fields
+        model = serializer_class.Meta.model
+        self.datetime_fields = {}
+        self.columns = []
+        lines = []
+
+        for name, field in fields.items():
+            column = field.source
+            if '.' in column or column == '*':
+                raise TypeError(f"{name}: nested sources are not supported")
+            self.columns.append(column)
+            value = f"row[{len(self.columns) - 1}]"
+            converted = self._converter(name, field, value)
+            if model._meta.get_field(column).null:
+                converted = f"None if {value} is None else {converted}"
+            lines.append(f"{name!r}: {converted},")
+
+        self.columns += [column for column in KEY_COLUMNS
+                         if column not in self.columns]
+        source = ("def row_to_dict(row, tz):\n"
+                  "    return {" + "\n        ".join(lines) + "}\n")
+        namespace = {'_datetime': _format_datetime,
+                     '_fields': self.datetime_fields}
+        exec(source, namespace)  # pylint: disable=exec-used
+        self.row_to_dict = namespace['row_to_dict']
+
+    def _converter(self, name, field, value):
+        """
+        Expression that turns a column value into the field's output.
+        """
+        if isinstance(field, serializers.DateTimeField):
+            output_format = getattr(field, 'format',
+                                    api_settings.DATETIME_FORMAT)
+            if output_format is None or output_format.lower() != ISO_8601:
+                raise TypeError(f"{name}: only ISO 8601 output is supported")
+            self.datetime_fields[name] = field
+            return f"_datetime(_fields[{name!r}], {value}, tz)"
+        if isinstance(field, serializers.PrimaryKeyRelatedField):
+            if field.pk_field is not None:
+                raise TypeError(f"{name}: pk_field is not supported")
+            return value
+        if isinstance(field, serializers.BooleanField):
+            return f"bool({value})"
+        if isinstance(field, serializers.IntegerField):
+            return f"int({value})"
+        if isinstance(field, serializers.CharField):
+            return f"str({value})"
+        raise TypeError(f"{name}: {type(field).__name__} is not supported")
+
+    def rows(self, queryset):
+        """
+        ``queryset`` as named rows with the columns this serializer needs.
+        """
+        return queryset.values_list(*self.columns, named=True)
+
+    def _timezone(self):
+        # Resolved per call, as DRF does, so an activated timezone applies
+        for field in self.datetime_fields.values():
+            return (field.timezone if hasattr(field, 'timezone')
+                    else field.default_timezone())
+        return None
+
+    def converter(self):
+        """
+        One-argument row-to-dict function for the current timezone.
+        """
+        return partial(self.row_to_dict, tz=self._timezone())
+
+    def to_representation(self, row):
+        """
+        One row as the dict the DRF serializer would return.
+        """
+        return self.row_to_dict(row, self._timezone())
+
+    def many(self, rows):
+        """
+        A list of rows as dicts.
+        """
+        return list(map(self.converter(), rows))
+
+
+_compiled = {}
+
+
+def fast_serializer(serializer_class):
+    """
+    The compiled ``FastSerializer`` for a serializer class.
+    """
+    if serializer_class not in _compiled:
+        _compiled[serializer_class] = FastSerializer(serializer_class)
+    return _compiled[serializer_class]
+
+
+def _escape_separators(data):
+    # JSONRenderer always escapes U+2028/U+2029 so output is valid JavaScript
+    return (data.replace('\u2028'.encode(), b'\\u2028')
+            .replace('\u2029'.encode(), b'\\u2029'))
+
+
+def _encoder_default(value):
+    return encoders.JSONEncoder().default(value)
+
+
+def dumps(data):
+    """
+    Encode ``data`` byte-for-byte like DRF's ``JSONRenderer`` with its
+    default settings, using orjson when it is installed.
+
+    Datetimes are handed back to DRF's encoder and anything orjson
+    rejects falls back to the standard library, so only the speed
+    differs. Floats are not supported, as orjson formats exponents
+    differently; callers only pass what the fast serializers produce.
+    """
+    if orjson is not None:
+        try:
+            return _escape_separators(orjson.dumps(
+                data, default=_encoder_default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME))
+        except TypeError:
+            pass
+    return _escape_separators(json.dumps(
+        data, cls=encoders.JSONEncoder, ensure_ascii=False, allow_nan=False,
+        separators=(',', ':')).encode())
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    ``JSONRenderer`` that encodes compact responses with ``dumps``.
+
+    Only for views whose data is strings, ints, bools, None, lists and
+    dicts, such as the output of ``FastSerializer``.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if (indent is not None or self.ensure_ascii or not self.compact
+                or not self.strict):
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        return dumps(data)
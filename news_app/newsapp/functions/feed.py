@@ -0,0 +1,223 @@
+"""Per-reader feeds, materialized when a post is approved"""
+from itertools import islice
+from django.conf import settings
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+from ..models import Article, FeedEntry, Newsletter, Publisher, Subscription
+
+FEED_PAGE_SIZE = 20
+FANOUT_BATCH_SIZE = 1000
+
+
+def max_length_setting():
+    """
+    Entries kept per reader (``NEWSAPP_FEED_MAX_LENGTH``).
+    """
+    return getattr(settings, 'NEWSAPP_FEED_MAX_LENGTH', 500)
+
+
+def fanout_limit_setting():
+    """
+    Subscriber count above which a publisher's posts are read on demand
+    instead of copied into every feed (``NEWSAPP_FEED_FANOUT_LIMIT``).
+    """
+    return getattr(settings, 'NEWSAPP_FEED_FANOUT_LIMIT', 10000)
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def subscriber_ids(post, include_publisher=True):
+    """
+    Ids of the users subscribed to a post's publisher or journalist.
+    """
+    query = Q(type='journalist', journalist_id=post.journalist_id)
+    if include_publisher and post.publisher_id:
+        query |= Q(type='publisher', publisher_id=post.publisher_id)
+    return (Subscription.objects.filter(query)
+            .values_list('user_id', flat=True).distinct().order_by('user_id'))
+
+
+def uses_fanout_on_read(publisher):
+    """
+    Check whether a publisher is too large to fan out to, flagging it
+    the first time it crosses the limit.
+    """
+    if publisher is None:
+        return False
+    if not publisher.fanout_on_read:
+        limit = fanout_limit_setting()
+        subscribers = Subscription.objects.filter(
+            type='publisher', publisher=publisher)
+        if subscribers[limit:limit + 1].exists():
+            publisher.fanout_on_read = True
+            publisher.save(update_fields=['fanout_on_read'])
+    return publisher.fanout_on_read
+
+
+def trim_feeds(user_ids=None, max_length=None):
+    """
+    Delete the oldest entries of feeds beyond ``max_length``.
+
+    Fan-out only adds entries, so feeds are trimmed periodically by the
+    ``trim_feeds`` command rather than after every fan-out. Only feeds
+    over the limit, found with one count per reader on the feed index,
+    are ranked.
+
+    Args:
+        user_ids (list): Feeds to trim, or None for every feed.
+        max_length (int): Entries to keep, ``NEWSAPP_FEED_MAX_LENGTH`` by
+            default.
+
+    Returns:
+        int: Number of entries deleted.
+    """
+    max_length = max_length or max_length_setting()
+    entries = FeedEntry.objects.all()
+    if user_ids is not None:
+        entries = entries.filter(user_id__in=user_ids)
+    overflowing = list(entries.values('user_id').annotate(
+        entries=Count('id')).filter(entries__gt=max_length)
+        .values_list('user_id', flat=True))
+
+    deleted = 0
+    for users in _batched(overflowing, FANOUT_BATCH_SIZE):
+        overflow = list(FeedEntry.objects.filter(user_id__in=users).annotate(
+            rank=Window(RowNumber(), partition_by=[F('user_id')],
+                        order_by=F('published_at').desc())
+        ).filter(rank__gt=max_length).values_list('id', flat=True))
+        for ids in _batched(overflow, FANOUT_BATCH_SIZE):
+            deleted += FeedEntry.objects.filter(id__in=ids).delete()[0]
+    return deleted
+
+
+def fan_out(post_type, post):
+    """
+    Add a published post to every subscriber's feed.
+
+    Entries are bulk inserted in batches and duplicates are ignored, so
+    running it again for the same post is harmless. Feeds are capped
+    later by ``trim_feeds``. Subscribers of a publisher flagged
+    ``fanout_on_read`` are skipped; they see its posts through
+    ``read_feed`` instead.
+
+    Args:
+        post_type (str): 'article' or 'newsletter'.
+        post (Article or Newsletter): The approved post.
+
+    Returns:
+        int: Number of feeds written to.
+    """
+    include_publisher = not uses_fanout_on_read(post.publisher)
+    written = 0
+    for user_ids in _batched(subscriber_ids(post, include_publisher),
+                             FANOUT_BATCH_SIZE):
+        FeedEntry.objects.bulk_create([
+            FeedEntry(user_id=user_id,
+                      published_at=post.published_at or post.updated_at,
+                      **{post_type: post})
+            for user_id in user_ids
+        ], ignore_conflicts=True)
+        written += len(user_ids)
+    return written
+
+
+def sort_key(item):
+    """
+    Feed order, newest first when reversed: publish time, then articles
+    before newsletters, then the higher id. Posts approved together share
+    a publish time, so the type and id keep pages from skipping them.
+    """
+    published_at, post_type, post = item
+    return published_at, post_type == 'article', post.id
+
+
+def _older(before, before_post, post_type, field='published_at',
+           id_field='id'):
+    """
+    Condition for posts of ``post_type`` that come after the cursor
+    ``(before, before_post)`` in feed order.
+    """
+    older = Q(**{f'{field}__lt': before})
+    cursor_type, cursor_id = before_post or (None, None)
+    if cursor_type == post_type:
+        older |= Q(**{field: before, f'{id_field}__lt': cursor_id})
+    elif cursor_type == 'article':
+        # At the same time every newsletter sorts after the articles
+        older |= Q(**{field: before})
+    return older
+
+
+def _pulled_posts(user, before, before_post, limit):
+    """
+    Recent posts from the user's fan-out-on-read publishers, as
+    ``(published_at, post_type, post)`` tuples.
+    """
+    publishers = Publisher.objects.filter(
+        fanout_on_read=True,
+        publisher_subscriptions__user=user,
+        publisher_subscriptions__type='publisher',
+    )
+    if not publishers.exists():
+        return []
+
+    posts = []
+    for post_type, model in (('article', Article),
+                             ('newsletter', Newsletter)):
+        queryset = model.objects.published().filter(
+            publisher__in=publishers
+        ).select_related('journalist__user', 'publisher__user')
+        if before:
+            queryset = queryset.filter(_older(before, before_post, post_type))
+        posts += [(post.published_at or post.updated_at, post_type, post)
+                  for post in queryset.order_by(
+                      F('published_at').desc(nulls_last=True), '-id')[:limit]]
+    return posts
+
+
+def read_feed(user, before=None, limit=FEED_PAGE_SIZE, before_post=None):
+    """
+    Return one page of a reader's feed, newest first.
+
+    Materialized entries are one range scan on (user, published_at);
+    posts from very large publishers are merged in at read time. Pages
+    are keyset pages on (published_at, post type, post id), so posts
+    approved together in one batch are never skipped.
+
+    Args:
+        user (User): The reader.
+        before (datetime): Only return posts published before this.
+        limit (int): Page size.
+        before_post (tuple): ``(post_type, post_id)`` of the last post of
+            the previous page, to page through posts sharing ``before``.
+
+    Returns:
+        list: ``(published_at, post_type, post)`` tuples.
+    """
+    entries = FeedEntry.objects.filter(user=user).select_related(
+        'article__journalist__user', 'article__publisher__user',
+        'newsletter__journalist__user', 'newsletter__publisher__user',
+    )
+    if before:
+        entries = entries.filter(
+            (_older(before, before_post, 'article', id_field='article_id')
+             & Q(article__isnull=False))
+            | (_older(before, before_post, 'newsletter',
+                      id_field='newsletter_id')
+               & Q(newsletter__isnull=False)))
+
+    ordered = entries.order_by('-published_at',
+                               F('article_id').desc(nulls_last=True),
+                               F('newsletter_id').desc(nulls_last=True))
+    items = [(entry.published_at,
+              'article' if entry.article_id else 'newsletter',
+              entry.post)
+             for entry in ordered[:limit]]
+    seen = {(post_type, post.id) for _, post_type, post in items}
+    items += [item for item in _pulled_posts(user, before, before_post, limit)
+              if (item[1], item[2].id) not in seen]
+    items.sort(key=sort_key, reverse=True)
+    return items[:limit]
@@ -0,0 +1,137 @@
+"""Rendered list rows, cached per post version and viewer role"""
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils.functional import cached_property
+from django.utils.safestring import mark_safe
+from .object_cache import get_cache
+
+ROW_TEMPLATES = {
+    'article': 'newsapp/article_row.html',
+    'newsletter': 'newsapp/newsletter_row.html',
+}
+
+
+def timeout_setting():
+    """
+    Seconds a rendered row lives (``NEWSAPP_FRAGMENT_CACHE_TIMEOUT``).
+    """
+    return getattr(settings, 'NEWSAPP_FRAGMENT_CACHE_TIMEOUT', 600)
+
+
+class Viewer:
+    """
+    The viewer's journalist, editor and publisher profiles, looked up at
+    most once per request, so rows compare ids instead of each following
+    ``user.journalist``, ``user.editor`` and ``user.publisher``.
+
+    A profile is only looked up when a row needs it: a journalist's own
+    rows never ask whether they are an editor.
+
+    Attributes:
+        user (User): The logged-in user.
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def journalist_id(self):
+        journalist = getattr(self.user, 'journalist', None)
+        return journalist.id if journalist else None
+
+    @cached_property
+    def editor(self):
+        return getattr(self.user, 'editor', None)
+
+    @cached_property
+    def is_publisher(self):
+        return getattr(self.user, 'publisher', None) is not None
+
+    def row_role(self, post):
+        """
+        Which buttons the viewer gets on a post's row.
+
+        Returns:
+            str: 'author' (edit, delete), 'editor' (approve, edit,
+            delete), 'publisher' (approve, delete) or 'reader'.
+        """
+        if (self.journalist_id is not None
+                and post.journalist_id == self.journalist_id):
+            return 'author'
+        if self.editor and post.publisher_id == self.editor.publisher_id:
+            return 'editor'
+        if self.is_publisher:
+            return 'publisher'
+        return 'reader'
+
+
+def row_key(post_type, post, role, mine_view):
+    """
+    Cache key of a row. ``updated_at`` changes on every save, approval
+    included, so an edited post gets a new key and old rows just expire.
+    """
+    version = int(post.updated_at.timestamp() * 1_000_000)
+    return (f'newsapp:row:{post_type}:{post.id}:{version}:{role}:'
+            f'{int(mine_view)}')
+
+
+def render_rows(post_type, posts, viewer, mine_view=False):
+    """
+    HTML of each post's list row, read from the cache with one call and
+    rendered (then stored) only for the rows that are missing.
+
+    Rows depend on the post and the viewer's role, never on the user, so
+    they are shared by everyone with the same role. They hold no CSRF
+    token: the list wraps them in one form that carries it.
+
+    Args:
+        post_type (str): 'article' or 'newsletter'.
+        posts (iterable): Posts from ``for_listing()``.
+        viewer (Viewer): Who is looking.
+        mine_view (bool): Whether the author's "My Articles" page is
+            being shown.
+
+    Returns:
+        list: Safe HTML strings, in the order of ``posts``.
+    """
+    cache = get_cache()
+    entries = []
+    for post in posts:
+        role = viewer.row_role(post)
+        entries.append((post, role, row_key(post_type, post, role, mine_view)))
+    cached = cache.get_many([key for _, _, key in entries])
+
+    rows, missing = [], {}
+    for post, role, key in entries:
+        html = cached.get(key)
+        if html is None:
+            html = render_to_string(ROW_TEMPLATES[post_type], {
+                post_type: post, 'role': role, 'mine_view': mine_view})
+            missing[key] = html
+        rows.append(mark_safe(html))
+    if missing:
+        cache.set_many(missing, timeout_setting())
+    return rows
+
+
+def listing_context(user, articles, newsletters, mine_view=False):
+    """
+    Context for ``article_list.html``.
+
+    Args:
+        user (User): The logged-in user.
+        articles (QuerySet): Articles to list, from ``for_listing()``.
+        newsletters (QuerySet): Newsletters to list, from
+            ``for_listing()``.
+        mine_view (bool): Whether the author's own posts are listed.
+
+    Returns:
+        dict: The rendered rows and ``mine_view``.
+    """
+    viewer = Viewer(user)
+    return {
+        'article_rows': render_rows('article', articles, viewer, mine_view),
+        'newsletter_rows': render_rows('newsletter', newsletters, viewer,
+                                       mine_view),
+        'mine_view': mine_view,
+    }
@@ -0,0 +1,178 @@
+"""Bulk import of articles and newsletters from NDJSON or CSV streams"""
+import csv
+import json
+from itertools import islice
+from django.db import DatabaseError, transaction
+from rest_framework.exceptions import ValidationError
+from .stats import count_posts
+
+IMPORT_CHUNK_SIZE = 1000
+
+IMPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+# Row errors listed in a report; later ones are only counted
+MAX_REPORTED_ERRORS = 100
+
+
+class ImportReport:
+    """
+    Outcome of an import.
+
+    Attributes:
+        rows (int): Rows read.
+        created (int): Posts inserted.
+        failed (int): Rows rejected.
+        errors (list): The first ``MAX_REPORTED_ERRORS`` rejected rows, as
+        ``{'row': number, 'errors': {field: [messages]}}``.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    def reject(self, number, errors):
+        """
+        Record a rejected row.
+        """
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': number, 'errors': errors})
+
+    def as_dict(self):
+        """
+        The report as a plain dict, for API responses.
+        """
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'failed': self.failed,
+            'errors': self.errors,
+        }
+
+
+def _decoded(lines):
+    for number, line in enumerate(lines):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        yield line.lstrip('\ufeff') if number == 0 else line
+
+
+def read_rows(lines, fmt):
+    """
+    Parse an NDJSON or CSV stream lazily.
+
+    NDJSON rows are numbered by line, blank lines are skipped. CSV rows
+    are numbered from the first one after the header.
+
+    Args:
+        lines (iterable): Lines of the stream, as bytes or str.
+        fmt (str): 'ndjson' or 'csv'.
+
+    Yields:
+        tuple: (row number, dict of values, or None if the row could not
+        be parsed).
+    """
+    if fmt == 'csv':
+        for number, row in enumerate(csv.DictReader(_decoded(lines)), 1):
+            yield number, row
+        return
+
+    for number, line in enumerate(_decoded(lines), 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError:
+            yield number, None
+
+
+def _insert(model, chunk, report, batch_size):
+    """
+    Insert one chunk in a transaction. If the database refuses it, retry
+    row by row so only the offending rows are rejected.
+    """
+    try:
+        with transaction.atomic():
+            posts = model.objects.bulk_create([post for _, post in chunk],
+                                              batch_size=batch_size)
+            count_posts(model.__name__.lower(), [
+                (post.publisher_id, post.journalist_id, post.approved, 1)
+                for post in posts])
+        report.created += len(chunk)
+        return
+    except DatabaseError:
+        pass
+
+    for number, post in chunk:
+        post.pk = None
+        try:
+            with transaction.atomic():
+                post.save(force_insert=True)
+            report.created += 1
+        except DatabaseError as e:
+            report.reject(number, {'non_field_errors': [str(e)]})
+
+
+def import_posts(lines, fmt, serializer_class, journalist,
+                 chunk_size=IMPORT_CHUNK_SIZE, batch_size=None):
+    """
+    Validate and insert posts from an NDJSON or CSV stream, chunk by chunk.
+
+    Every row is checked with ``serializer_class``; valid rows of a chunk
+    are inserted with one ``bulk_create`` in their own transaction, so a
+    failure only loses that chunk's invalid rows and the stream is never
+    held in memory.
+
+    ``bulk_create`` skips the ``post_save`` signal. That is safe because
+    imported posts are unapproved: they are not in the search index or the
+    cache, and nothing is announced until an editor approves them through
+    the usual ``save``. The publisher's and journalist's pending counters
+    are bumped once per chunk instead.
+
+    Args:
+        lines (iterable): Lines of the stream, as bytes or str.
+        fmt (str): 'ndjson' or 'csv'.
+        serializer_class (Serializer): Import serializer whose model and
+        fields the rows are validated against.
+        journalist (Journalist): Author of every post; their publisher
+        publishes them.
+        chunk_size (int): Rows validated and committed together.
+        batch_size (int): Rows per INSERT statement, defaulting to the
+        backend's limit.
+
+    Returns:
+        ImportReport: Counts and per-row errors.
+    """
+    model = serializer_class.Meta.model
+    validator = serializer_class()
+    report = ImportReport()
+    rows = read_rows(lines, fmt)
+
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return report
+        report.rows += len(chunk)
+
+        valid = []
+        for number, data in chunk:
+            if data is None:
+                report.reject(number, {'non_field_errors': ["Invalid JSON"]})
+                continue
+            try:
+                values = validator.run_validation(data)
+            except ValidationError as e:
+                report.reject(number, {
+                    field: [str(message) for message in messages]
+                    for field, messages in e.detail.items()})
+                continue
+            valid.append((number, model(
+                journalist=journalist, publisher_id=journalist.publisher_id,
+                **values)))
+        if valid:
+            _insert(model, valid, report, batch_size)
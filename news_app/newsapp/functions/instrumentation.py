@@ -0,0 +1,422 @@
+"""Per-view request metrics: wall time, SQL queries, database connections
+and template rendering"""
+import contextvars
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+from django.conf import settings
+from django.db import connections
+
+# Upper bounds, in seconds, of the request duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                    5.0, 10.0)
+
+_current_stats = contextvars.ContextVar('newsapp_request_stats',
+                                        default=None)
+
+
+def enabled_setting():
+    """
+    Whether requests are instrumented (``NEWSAPP_INSTRUMENTATION``).
+    """
+    return getattr(settings, 'NEWSAPP_INSTRUMENTATION', False)
+
+
+def duplicate_warning_setting():
+    """
+    Duplicate queries in one request that make its log record a warning
+    (``NEWSAPP_DUPLICATE_QUERY_WARNING``).
+    """
+    return getattr(settings, 'NEWSAPP_DUPLICATE_QUERY_WARNING', 5)
+
+
+def _freeze(params):
+    try:
+        hash(params)
+        return params
+    except TypeError:
+        return repr(params)
+
+
+class RequestStats:
+    """
+    Figures for one request.
+
+    Attributes:
+        view (str): URL name of the view, e.g. 'news_app:article_list'.
+        method (str): HTTP method.
+        status (int): Response status code.
+        wall_seconds (float): Time spent in the middleware chain and view.
+        queries (int): SQL queries run.
+        sql_seconds (float): Time spent in those queries.
+        duplicates (int): Queries repeating an earlier one exactly.
+        similar (int): Queries repeating an earlier SQL with other params,
+        the shape of an N+1.
+        template_seconds (float): Time spent rendering templates.
+        connects (int): Database connections opened, 0 when the request
+        reused persistent ones.
+        connect_seconds (float): Time spent opening them.
+        alias_queries (Counter): Queries per database alias.
+    """
+
+    def __init__(self, method=''):
+        self.view = ''
+        self.method = method
+        self.status = 0
+        self.wall_seconds = 0.0
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.duplicates = 0
+        self.similar = 0
+        self.template_seconds = 0.0
+        self.connects = 0
+        self.connect_seconds = 0.0
+        self.alias_queries = Counter()
+        self.rendering = False
+        self._calls = Counter()
+        self._shapes = Counter()
+
+    @property
+    def connected(self):
+        """
+        1 if the request opened a database connection, for the reuse ratio.
+        """
+        return 1 if self.connects else 0
+
+    def record_query(self, sql, params, seconds, alias='default'):
+        """
+        Count one query and check it against the earlier ones.
+        """
+        self.queries += 1
+        self.alias_queries[alias] += 1
+        self.sql_seconds += seconds
+        call = (sql, _freeze(params))
+        if self._calls[call]:
+            self.duplicates += 1
+        elif self._shapes[sql]:
+            self.similar += 1
+        self._calls[call] += 1
+        self._shapes[sql] += 1
+
+    def repeated_sql(self, limit=3):
+        """
+        The most repeated SQL statements, as ``(sql, count)`` pairs.
+        """
+        return [(sql, calls) for sql, calls in self._shapes.most_common(limit)
+                if calls > 1]
+
+    def as_dict(self):
+        """
+        Figures as a plain dict, for logs.
+        """
+        return {
+            'view': self.view,
+            'method': self.method,
+            'status': self.status,
+            'wall_ms': round(self.wall_seconds * 1000, 2),
+            'queries': self.queries,
+            'sql_ms': round(self.sql_seconds * 1000, 2),
+            'duplicate_queries': self.duplicates,
+            'similar_queries': self.similar,
+            'template_ms': round(self.template_seconds * 1000, 2),
+            'connects': self.connects,
+            'connect_ms': round(self.connect_seconds * 1000, 2),
+        }
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper feeding every query to a ``RequestStats``.
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.stats.record_query(sql, params,
+                                    time.perf_counter() - started,
+                                    context['connection'].alias)
+
+
+@contextmanager
+def instrument(stats):
+    """
+    Record the queries and template rendering of the code run inside.
+    """
+    token = _current_stats.set(stats)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(QueryRecorder(stats)))
+            yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+def install_template_timer():
+    """
+    Time renders of Django templates for the request being instrumented.
+
+    Django only signals template rendering in tests, so the backend's
+    ``Template.render`` is wrapped once per process. Nested renders are
+    counted once.
+    """
+    # pylint: disable=import-outside-toplevel
+    from django.template.backends.django import Template
+    if getattr(Template.render, 'newsapp_timed', False):
+        return
+    original = Template.render
+
+    @wraps(original)
+    def render(self, context=None, request=None):
+        stats = _current_stats.get()
+        if stats is None or stats.rendering:
+            return original(self, context, request)
+        stats.rendering = True
+        started = time.perf_counter()
+        try:
+            return original(self, context, request)
+        finally:
+            stats.template_seconds += time.perf_counter() - started
+            stats.rendering = False
+
+    render.newsapp_timed = True
+    Template.render = render
+
+
+def install_connection_timer():
+    """
+    Time the opening of database connections: the TCP and authentication
+    handshake plus the session setup Django runs on a new connection.
+
+    ``connect`` is wrapped once per process. Every connection counts
+    towards the per-alias totals; those opened during an instrumented
+    request also count towards that request.
+    """
+    # pylint: disable=import-outside-toplevel
+    from django.db.backends.base.base import BaseDatabaseWrapper
+    if getattr(BaseDatabaseWrapper.connect, 'newsapp_timed', False):
+        return
+    original = BaseDatabaseWrapper.connect
+
+    @wraps(original)
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return original(self)
+        finally:
+            seconds = time.perf_counter() - started
+            registry.observe_connect(self.alias, seconds)
+            stats = _current_stats.get()
+            if stats is not None:
+                stats.connects += 1
+                stats.connect_seconds += seconds
+
+    connect.newsapp_timed = True
+    BaseDatabaseWrapper.connect = connect
+
+
+class MetricsRegistry:
+    """
+    Per-view totals since the process started.
+
+    Each worker process keeps its own totals, so with several workers a
+    scrape only covers the one that answered it.
+    """
+
+    COUNTERS = (
+        ('db_queries_total', 'queries', "SQL queries run."),
+        ('db_query_seconds_total', 'sql_seconds',
+         "Time spent running SQL queries."),
+        ('db_duplicate_queries_total', 'duplicates',
+         "Queries repeating an earlier query of the same request."),
+        ('db_similar_queries_total', 'similar',
+         "Queries repeating an earlier SQL with other parameters."),
+        ('template_render_seconds_total', 'template_seconds',
+         "Time spent rendering templates."),
+        ('db_connects_total', 'connects',
+         "Database connections opened by requests."),
+        ('db_connect_seconds_total', 'connect_seconds',
+         "Time requests spent opening database connections."),
+        ('db_connecting_requests_total', 'connected',
+         "Requests that opened a database connection."),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """
+        Forget every total.
+        """
+        with self._lock:
+            self._requests = Counter()
+            self._durations = {}
+            self._totals = {}
+            self._connections = {}
+
+    def observe_connect(self, alias, seconds):
+        """
+        Add one opened database connection.
+        """
+        with self._lock:
+            totals = self._connections.setdefault(alias, Counter())
+            totals['opened'] += 1
+            totals['connect_seconds'] += seconds
+
+    def connection_totals(self, alias='default'):
+        """
+        Connections opened, time spent opening them and queries run on
+        ``alias`` so far, as a dict.
+        """
+        with self._lock:
+            totals = self._connections.get(alias, Counter())
+            return {key: totals[key]
+                    for key in ('opened', 'connect_seconds', 'queries')}
+
+    def observe(self, stats):
+        """
+        Add one request's figures.
+        """
+        with self._lock:
+            self._requests[(stats.view, stats.method, stats.status)] += 1
+            buckets = self._durations.setdefault(
+                stats.view, [0] * len(DURATION_BUCKETS) + [0, 0.0])
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if stats.wall_seconds <= bound:
+                    buckets[i] += 1
+            buckets[-2] += 1
+            buckets[-1] += stats.wall_seconds
+            totals = self._totals.setdefault(stats.view, Counter())
+            for _, attribute, _ in self.COUNTERS:
+                totals[attribute] += getattr(stats, attribute)
+            for alias, queries in stats.alias_queries.items():
+                self._connections.setdefault(
+                    alias, Counter())['queries'] += queries
+
+    def render(self):
+        """
+        Totals in the Prometheus text exposition format.
+        """
+        lines = [
+            "# HELP newsapp_requests_total Requests handled.",
+            "# TYPE newsapp_requests_total counter",
+        ]
+        with self._lock:
+            for (view, method, status), total in sorted(
+                    self._requests.items()):
+                labels = _labels(view=view, method=method, status=status)
+                lines.append(f"newsapp_requests_total{{{labels}}} {total}")
+
+            lines += [
+                "# HELP newsapp_request_duration_seconds Wall time of "
+                "requests.",
+                "# TYPE newsapp_request_duration_seconds histogram",
+            ]
+            for view, buckets in sorted(self._durations.items()):
+                for bound, total in zip(DURATION_BUCKETS, buckets):
+                    lines.append(
+                        "newsapp_request_duration_seconds_bucket"
+                        f"{{{_labels(view=view, le=bound)}}} {total}")
+                lines += [
+                    "newsapp_request_duration_seconds_bucket"
+                    f"{{{_labels(view=view, le='+Inf')}}} {buckets[-2]}",
+                    "newsapp_request_duration_seconds_count"
+                    f"{{{_labels(view=view)}}} {buckets[-2]}",
+                    "newsapp_request_duration_seconds_sum"
+                    f"{{{_labels(view=view)}}} {buckets[-1]:.6f}",
+                ]
+
+            for name, attribute, description in self.COUNTERS:
+                lines += [f"# HELP newsapp_{name} {description}",
+                          f"# TYPE newsapp_{name} counter"]
+                for view, totals in sorted(self._totals.items()):
+                    value = totals[attribute]
+                    value = f"{value:.6f}" if isinstance(value, float) \
+                        else value
+                    lines.append(
+                        f"newsapp_{name}{{{_labels(view=view)}}} {value}")
+
+            lines += [
+                "# HELP newsapp_db_connection_reuse_ratio Share of requests "
+                "served on already open database connections.",
+                "# TYPE newsapp_db_connection_reuse_ratio gauge",
+            ]
+            requests = Counter()
+            for (view, _, _), total in self._requests.items():
+                requests[view] += total
+            for view, totals in sorted(self._totals.items()):
+                ratio = 1 - totals['connected'] / requests[view]
+                lines.append("newsapp_db_connection_reuse_ratio"
+                             f"{{{_labels(view=view)}}} {ratio:.4f}")
+
+            lines += self._connection_lines()
+        return '\n'.join(lines) + '\n'
+
+    def _connection_lines(self):
+        lines = []
+        for name, key, kind, description in (
+                ('db_connections_opened_total', 'opened', 'counter',
+                 "Database connections opened."),
+                ('db_connections_connect_seconds_total', 'connect_seconds',
+                 'counter', "Time spent opening database connections."),
+                ('db_connections_queries_total', 'queries', 'counter',
+                 "Queries run by instrumented requests."),
+                ('db_queries_per_connection', None, 'gauge',
+                 "Queries run per connection opened.")):
+            lines += [f"# HELP newsapp_{name} {description}",
+                      f"# TYPE newsapp_{name} {kind}"]
+            for alias, totals in sorted(self._connections.items()):
+                if key is None:
+                    per_connection = totals['queries'] / max(totals['opened'],
+                                                             1)
+                    value = f"{per_connection:.2f}"
+                elif isinstance(totals[key], float):
+                    value = f"{totals[key]:.6f}"
+                else:
+                    value = totals[key]
+                lines.append(f"newsapp_{name}{{{_labels(alias=alias)}}} "
+                             f"{value}")
+        return lines
+
+
+def _labels(**labels):
+    def escape(value):
+        return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+                .replace('\n', '\\n'))
+    return ','.join(f'{name}="{escape(value)}"'
+                    for name, value in labels.items())
+
+
+registry = MetricsRegistry()
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats log records as one JSON object per line.
+
+    Fields passed as ``extra={'fields': {...}}`` are merged into the
+    object, so request logs can be filtered and aggregated by view.
+    """
+
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            **getattr(record, 'fields', {}),
+        }
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
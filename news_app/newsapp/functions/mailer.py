@@ -0,0 +1,157 @@
+"""Batched subscriber email delivery"""
+import logging
+import time
+from smtplib import SMTPRecipientsRefused
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from ..models import Subscription
+
+logger = logging.getLogger(__name__)
+
+
+def batch_size_setting():
+    """
+    Recipients sent per SMTP connection (``NEWSAPP_EMAIL_BATCH_SIZE``).
+    """
+    return getattr(settings, 'NEWSAPP_EMAIL_BATCH_SIZE', 100)
+
+
+def rate_setting():
+    """
+    Maximum messages per second, 0 for no limit (``NEWSAPP_EMAIL_RATE``).
+    """
+    return getattr(settings, 'NEWSAPP_EMAIL_RATE', 0)
+
+
+class DeliveryStats:
+    """
+    Throughput figures for one delivery run.
+
+    Attributes:
+        sent (int): Messages accepted by the mail backend.
+        failed (int): Messages the backend rejected.
+        batches (int): SMTP connections opened.
+        last_id (int): Subscription id of the last recipient handled,
+            whether the message was sent or rejected.
+    """
+
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_id = 0
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        """
+        Seconds since the run started.
+        """
+        return time.perf_counter() - self.started
+
+    @property
+    def messages_per_second(self):
+        """
+        Messages sent per second so far.
+        """
+        elapsed = self.elapsed
+        return self.sent / elapsed if elapsed else 0.0
+
+    def as_dict(self):
+        """
+        Figures as a plain dict, for logs and metrics.
+        """
+        return {
+            'sent': self.sent,
+            'failed': self.failed,
+            'batches': self.batches,
+            'seconds': round(self.elapsed, 3),
+            'messages_per_second': round(self.messages_per_second, 2),
+        }
+
+
+def iter_subscriber_batches(publisher_id, batch_size, after_id=0):
+    """
+    Yield lists of ``(subscription_id, email)`` for a publisher's subscribers.
+
+    Only ids and addresses are read, one keyset page at a time, so neither
+    Subscription nor User instances are built.
+    """
+    subscriptions = Subscription.objects.filter(
+        type='publisher', publisher_id=publisher_id
+    ).exclude(user__email='')
+    while True:
+        batch = list(subscriptions.filter(id__gt=after_id).order_by('id')
+                     .values_list('id', 'user__email')[:batch_size])
+        if not batch:
+            return
+        yield batch
+        after_id = batch[-1][0]
+
+
+def deliver(subject, body, batches, from_email=None, rate=None,
+            on_batch=None):
+    """
+    Send one message per recipient, reusing a connection for each batch.
+
+    Every recipient gets their own message so addresses are never exposed
+    to each other and SMTP recipient limits do not apply. A rejected
+    address is counted and skipped, while a connection failure is raised
+    so the caller can retry after the last recipient handled; progress is
+    reported before it is raised, so nobody is emailed twice.
+
+    Args:
+        subject (str): Email subject.
+        body (str): Email body.
+        batches (iterable): Lists of ``(id, email)`` pairs.
+        from_email (str): Sender, defaults to ``EMAIL_HOST_USER``.
+        rate (float): Maximum messages per second, 0 or None for no limit.
+        on_batch (callable): Called with the stats after each batch, and
+            when one fails part way.
+
+    Returns:
+        DeliveryStats: Figures for the run.
+    """
+    from_email = from_email or settings.EMAIL_HOST_USER
+    stats = DeliveryStats()
+
+    for batch in batches:
+        try:
+            with get_connection(fail_silently=False) as connection:
+                stats.batches += 1
+                for subscription_id, email in batch:
+                    message = EmailMessage(subject, body, from_email, [email],
+                                           connection=connection)
+                    try:
+                        stats.sent += connection.send_messages([message])
+                    except SMTPRecipientsRefused as e:
+                        stats.failed += 1
+                        logger.warning("Email to %s failed: %s", email, e)
+                    stats.last_id = subscription_id
+                    if rate:
+                        ahead = ((stats.sent + stats.failed) / rate
+                                 - stats.elapsed)
+                        if ahead > 0:
+                            time.sleep(ahead)
+        finally:
+            # Also when the connection drops, so a retry resumes after
+            # the messages that did go out
+            if on_batch:
+                on_batch(stats)
+
+    logger.info("Email delivery finished: %s", stats.as_dict())
+    return stats
+
+
+def deliver_to_subscribers(publisher_id, subject, body, after_id=0,
+                           on_batch=None):
+    """
+    Email every subscriber of a publisher using the configured batch size
+    and rate.
+    """
+    return deliver(
+        subject, body,
+        iter_subscriber_batches(publisher_id, batch_size_setting(), after_id),
+        rate=rate_setting(),
+        on_batch=on_batch,
+    )
@@ -0,0 +1,208 @@
+"""Moderation queue: claiming, approving and rejecting pending posts"""
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from ..models import Article, Newsletter, Publisher
+from .object_cache import invalidate_listing, invalidate_many
+from .outbox import enqueue_digest
+from .search import index_posts
+from .stats import batched_counts, count_posts
+
+POST_MODELS = {
+    'article': Article,
+    'newsletter': Newsletter,
+}
+
+ACTIONS = ('approve', 'reject')
+CLAIM_ACTIONS = ('claim', 'release')
+
+# Posts moderated per request
+MAX_MODERATION_BATCH = 500
+
+
+def claim_timeout_setting():
+    """
+    Seconds a claim keeps other moderators off a post
+    (``NEWSAPP_CLAIM_TIMEOUT``).
+    """
+    return getattr(settings, 'NEWSAPP_CLAIM_TIMEOUT', 15 * 60)
+
+
+def moderator_publisher(user):
+    """
+    The publisher whose posts a user moderates: their own for publishers,
+    their employer's for editors, otherwise None. One query, with the
+    publisher's user joined for the queue heading.
+    """
+    return (Publisher.objects.select_related('user')
+            .filter(Q(user=user) | Q(editors__user=user)).first())
+
+
+def parse_post_ids(values):
+    """
+    Turn submitted ids into a list of unique ints, keeping their order.
+
+    Raises:
+        ValueError: If an id is not an integer or there are too many.
+    """
+    post_ids = list(dict.fromkeys(int(value) for value in values))
+    if len(post_ids) > MAX_MODERATION_BATCH:
+        raise ValueError(f"At most {MAX_MODERATION_BATCH} posts at a time")
+    return post_ids
+
+
+def claim_cutoff():
+    """
+    Claims made before this time have expired.
+    """
+    return timezone.now() - timedelta(seconds=claim_timeout_setting())
+
+
+def available_to(user):
+    """
+    Filter for posts that ``user`` may work on: unclaimed, claimed by them,
+    or with an expired claim.
+    """
+    return (Q(claimed_by__isnull=True) | Q(claimed_by=user)
+            | Q(claimed_at__lt=claim_cutoff()))
+
+
+def queue(post_type, publisher):
+    """
+    A publisher's pending posts, for ``paginate_by_cursor`` with
+    ``oldest_first``; the ``*_queue_idx`` index covers the filter and
+    the order.
+    """
+    return (POST_MODELS[post_type].objects.pending()
+            .filter(publisher=publisher).for_queue())
+
+
+def claim(post_type, post_ids, publisher, user):
+    """
+    Claim pending posts so other moderators leave them alone.
+
+    The claim is one conditional ``UPDATE``: the database only lets it
+    change rows that are still free, so of two moderators claiming the
+    same post at once exactly one gets it. Claiming again renews a claim.
+
+    Args:
+        post_type (str): 'article' or 'newsletter'.
+        post_ids (list): Ids of the posts, from ``parse_post_ids``.
+        publisher (Publisher): Publisher the moderator works for.
+        user (User): The moderator.
+
+    Returns:
+        dict: Outcome per id, in the order given: 'claimed' or 'taken'
+        (claimed by someone else, no longer pending, another publisher's
+        post or missing).
+    """
+    now = timezone.now()
+    model = POST_MODELS[post_type]
+    model.objects.pending().filter(
+        available_to(user), id__in=post_ids, publisher=publisher
+    ).update(claimed_by=user, claimed_at=now)
+    claimed = set(model.objects.filter(id__in=post_ids, claimed_by=user,
+                                       claimed_at=now)
+                  .values_list('id', flat=True))
+    return {post_id: 'claimed' if post_id in claimed else 'taken'
+            for post_id in post_ids}
+
+
+def release(post_type, post_ids, user):
+    """
+    Give up ``user``'s claims on posts.
+
+    Returns:
+        int: Claims released.
+    """
+    return POST_MODELS[post_type].objects.filter(
+        id__in=post_ids, claimed_by=user
+    ).update(claimed_by=None, claimed_at=None)
+
+
+def moderate(post_type, post_ids, publisher, user, action):
+    """
+    Approve or reject a batch of posts with one statement.
+
+    Only pending posts of ``publisher`` that no other moderator has
+    claimed are changed; the rest are reported with the reason. Approval
+    is a single ``UPDATE ... WHERE id IN (...) AND publisher_id = ...``,
+    which also drops the claims, and queues one digest email and tweet
+    for the whole batch (see ``enqueue_digest``) in the same transaction.
+    Rejected posts are deleted, as the Delete button does.
+
+    ``update`` skips ``post_save``, so the counters are moved here and the
+    cached copies and the search index of approved posts are refreshed
+    once the batch commits.
+
+    Args:
+        post_type (str): 'article' or 'newsletter'.
+        post_ids (list): Ids of the posts, from ``parse_post_ids``.
+        publisher (Publisher): Publisher the moderator works for.
+        user (User): The moderator.
+        action (str): 'approve' or 'reject'.
+
+    Returns:
+        dict: Outcome per id, in the order given: 'approved', 'rejected',
+        'already_approved', 'claimed' (by another moderator), 'forbidden'
+        (another publisher's post) or 'not_found'.
+    """
+    model = POST_MODELS[post_type]
+    cutoff = claim_cutoff()
+    with transaction.atomic():
+        found = {row[0]: row[1:] for row in
+                 model.objects.select_for_update().filter(id__in=post_ids)
+                 .values_list('id', 'publisher_id', 'approved',
+                              'claimed_by', 'claimed_at', 'journalist_id')}
+
+        results = dict.fromkeys(post_ids)
+        pending = []
+        for post_id in post_ids:
+            if post_id not in found:
+                results[post_id] = 'not_found'
+                continue
+            (publisher_id, approved, claimed_by, claimed_at,
+             _) = found[post_id]
+            if publisher_id != publisher.id:
+                results[post_id] = 'forbidden'
+            elif approved:
+                results[post_id] = 'already_approved'
+            elif claimed_by not in (None, user.id) and claimed_at >= cutoff:
+                results[post_id] = 'claimed'
+            else:
+                pending.append(post_id)
+
+        if not pending:
+            return results
+        batch = model.objects.pending().filter(id__in=pending,
+                                               publisher=publisher)
+        if action == 'approve':
+            now = timezone.now()
+            batch.update(approved=True, updated_at=now, published_at=now,
+                         claimed_by=None, claimed_at=None)
+            enqueue_digest(post_type, pending, publisher)
+            count_posts(post_type, [
+                (publisher.id, found[post_id][-1], approved, delta)
+                for post_id in pending
+                for approved, delta in ((False, -1), (True, 1))])
+            # As post_saved does: now for reads later in this transaction,
+            # and again on commit
+            invalidate_many(post_type, pending)
+            invalidate_listing(post_type)
+            transaction.on_commit(lambda: _refresh(post_type, pending))
+        else:
+            with batched_counts():
+                batch.delete()
+        done = 'approved' if action == 'approve' else 'rejected'
+        results.update((post_id, done) for post_id in pending)
+    return results
+
+
+def _refresh(post_type, post_ids):
+    invalidate_many(post_type, post_ids)
+    invalidate_listing(post_type)
+    index_posts(post_type, POST_MODELS[post_type].objects
+                .filter(id__in=post_ids).only('id', 'title', 'content',
+                                              'approved'))
@@ -0,0 +1,222 @@
+"""Read-through cache for single articles and newsletters"""
+import asyncio
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.template.loader import render_to_string
+from ..models import Article, ArticleSerializer, Newsletter, NewsletterSerializer
+
+# How long a request waits for another one recomputing the same entry
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 2.0
+LOCK_POLL = 0.02
+
+POSTS = {
+    'article': (Article, ArticleSerializer, 'newsapp/read_article.html'),
+    'newsletter': (Newsletter, NewsletterSerializer,
+                   'newsapp/read_newsletter.html'),
+}
+
+
+def get_cache():
+    """
+    The cache named by ``NEWSAPP_OBJECT_CACHE``.
+    """
+    return caches[getattr(settings, 'NEWSAPP_OBJECT_CACHE', 'default')]
+
+
+def timeout_setting():
+    """
+    Seconds an entry lives (``NEWSAPP_OBJECT_CACHE_TIMEOUT``).
+    """
+    return getattr(settings, 'NEWSAPP_OBJECT_CACHE_TIMEOUT', 300)
+
+
+def _version_key(kind, object_id):
+    return f'newsapp:object_version:{kind}:{object_id}'
+
+
+def object_version(kind, object_id):
+    """
+    Current version of an object's cache entries.
+
+    A missing version (first use or eviction) gets a fresh one, so entries
+    written under an older version can never be served.
+    """
+    cache = get_cache()
+    version = cache.get(_version_key(kind, object_id))
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(_version_key(kind, object_id), version, None):
+            version = cache.get(_version_key(kind, object_id), version)
+    return version
+
+
+def invalidate(kind, object_id):
+    """
+    Make every cached entry for an object stale.
+    """
+    get_cache().set(_version_key(kind, object_id), time.time_ns(), None)
+
+
+def invalidate_many(kind, object_ids):
+    """
+    ``invalidate`` for many objects, with one cache call.
+    """
+    version = time.time_ns()
+    get_cache().set_many({_version_key(kind, object_id): version
+                          for object_id in object_ids}, None)
+
+
+def listing_version(kind):
+    """
+    Current version of the listing of approved posts of one kind: the
+    time, in nanoseconds, of the last change to it.
+    """
+    return object_version(kind, 'listing')
+
+
+def invalidate_listing(kind):
+    """
+    Make validators built from ``listing_version`` stale.
+    """
+    invalidate(kind, 'listing')
+
+
+def entry_key(kind, object_id, part):
+    """
+    Cache key of one representation under the object's current version.
+    """
+    return (f'newsapp:object:{kind}:{object_id}:'
+            f'{object_version(kind, object_id)}:{part}')
+
+
+def get_or_compute(kind, object_id, part, compute):
+    """
+    Return a cached value, computing it at most once at a time.
+
+    When the entry is missing, the first request takes a lock and runs
+    ``compute``; concurrent requests for the same entry wait for its
+    result instead of all hitting the database (cache stampede). If the
+    result does not show up within ``LOCK_WAIT`` they compute it
+    themselves.
+
+    Args:
+        kind (str): Object type, e.g. 'article'.
+        object_id (int): Object id.
+        part (str): Which representation, e.g. 'json' or 'html'.
+        compute (callable): Builds the value on a miss.
+
+    Returns:
+        The cached or freshly computed value.
+    """
+    cache = get_cache()
+    key = entry_key(kind, object_id, part)
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock = f'{key}:lock'
+    if not cache.add(lock, 1, LOCK_TIMEOUT):
+        deadline = time.monotonic() + LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL)
+            value = cache.get(key)
+            if value is not None:
+                return value
+        return compute()
+
+    try:
+        value = compute()
+        cache.set(key, value, timeout_setting())
+    finally:
+        cache.delete(lock)
+    return value
+
+
+async def aget_or_compute(kind, object_id, part, compute):
+    """
+    ``get_or_compute`` for async views, where ``compute`` is a coroutine
+    function and waiting for another request does not block the loop.
+    """
+    cache = get_cache()
+    key = entry_key(kind, object_id, part)
+    value = await cache.aget(key)
+    if value is not None:
+        return value
+
+    lock = f'{key}:lock'
+    if not await cache.aadd(lock, 1, LOCK_TIMEOUT):
+        deadline = time.monotonic() + LOCK_WAIT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(LOCK_POLL)
+            value = await cache.aget(key)
+            if value is not None:
+                return value
+        return await compute()
+
+    try:
+        value = await compute()
+        await cache.aset(key, value, timeout_setting())
+    finally:
+        await cache.adelete(lock)
+    return value
+
+
+def _get_post(post_type, post_id):
+    model = POSTS[post_type][0]
+    return get_object_or_404(
+        model.objects.select_related('journalist__user', 'publisher__user'),
+        id=post_id)
+
+
+def post_json(post_type, post_id):
+    """
+    Serialized data for an article or newsletter.
+
+    Raises:
+        Http404: If the post does not exist.
+    """
+    serializer_class = POSTS[post_type][1]
+    return get_or_compute(
+        post_type, post_id, 'json',
+        lambda: dict(serializer_class(_get_post(post_type, post_id)).data))
+
+
+def post_html(post_type, post_id):
+    """
+    Rendered read page for an article or newsletter.
+
+    The read templates only use the post itself, so the same HTML is
+    served to every visitor.
+
+    Raises:
+        Http404: If the post does not exist.
+    """
+    template = POSTS[post_type][2]
+    return get_or_compute(
+        post_type, post_id, 'html',
+        lambda: render_to_string(template,
+                                 {post_type: _get_post(post_type, post_id)}))
+
+
+async def apost_json(post_type, post_id):
+    """
+    ``post_json`` for async views, reading the post with ``aget``.
+
+    Raises:
+        Http404: If the post does not exist.
+    """
+    model, serializer_class, _ = POSTS[post_type]
+
+    async def compute():
+        try:
+            post = await model.objects.select_related(
+                'journalist__user', 'publisher__user').aget(id=post_id)
+        except model.DoesNotExist as e:
+            raise Http404 from e
+        return dict(serializer_class(post).data)
+
+    return await aget_or_compute(post_type, post_id, 'json', compute)
@@ -0,0 +1,380 @@
+"""Transactional outbox for publishing side effects (emails, tweets, feeds)"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from ..models import Article, Newsletter, OutboxEvent, Publisher
+from .feed import fan_out
+from .mailer import deliver_to_subscribers
+from .twitter_api import RateLimited, TweetRejected, post_tweet
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 3600
+# How long a claimed event is hidden from other workers
+LEASE_SECONDS = 300
+TWEET_LENGTH = 280
+
+POST_MODELS = {
+    'article': Article,
+    'newsletter': Newsletter,
+}
+
+
+class OutboxError(Exception):
+    """
+    Raised by a handler when an event should be retried later.
+    """
+
+
+def enqueue(kind, payload, idempotency_key):
+    """
+    Queue an outbox event unless one with the same key already exists.
+
+    Call inside the transaction that makes the change the event reports,
+    so the event is committed if and only if the change is.
+
+    Returns:
+        OutboxEvent: The new or existing event.
+    """
+    event, _ = OutboxEvent.objects.get_or_create(
+        idempotency_key=idempotency_key,
+        defaults={'kind': kind, 'payload': payload}
+    )
+    return event
+
+
+def enqueue_publication(post_type, post, publisher):
+    """
+    Queue the subscriber email, tweet and feed fan-out for a newly
+    approved post.
+    """
+    payload = {
+        'post_type': post_type,
+        'post_id': post.id,
+        'publisher_id': publisher.id,
+    }
+    enqueue('email', payload, f"{post_type}:{post.id}:email")
+    enqueue('tweet', payload, f"{post_type}:{post.id}:tweet")
+    enqueue('feed', payload, f"{post_type}:{post.id}:feed")
+
+
+def enqueue_digest(post_type, post_ids, publisher):
+    """
+    Queue one subscriber email and one tweet announcing a batch of newly
+    approved posts, plus the feed fan-out of each post.
+
+    Feed events are inserted together and keyed like the ones
+    ``enqueue_publication`` queues, so no post is fanned out twice.
+    """
+    payload = {
+        'post_type': post_type,
+        'post_ids': list(post_ids),
+        'publisher_id': publisher.id,
+    }
+    # A post is only approved once, so its batch is named after it
+    key = f"{post_type}:{post_ids[0]}:digest"
+    enqueue('email', payload, f"{key}:email")
+    enqueue('tweet', payload, f"{key}:tweet")
+    OutboxEvent.objects.bulk_create([
+        OutboxEvent(kind='feed', idempotency_key=f"{post_type}:{post_id}:feed",
+                    payload={'post_type': post_type, 'post_id': post_id,
+                             'publisher_id': publisher.id})
+        for post_id in post_ids
+    ], ignore_conflicts=True)
+
+
+def _load(payload):
+    """
+    Fetch the post and publisher an event refers to.
+    """
+    post = POST_MODELS[payload['post_type']].objects.get(
+        id=payload['post_id'])
+    publisher = Publisher.objects.select_related('user').get(
+        id=payload['publisher_id'])
+    return post, publisher
+
+
+def _load_digest(payload):
+    """
+    Fetch the still published posts and the publisher of a digest event.
+    """
+    posts = list(POST_MODELS[payload['post_type']].objects.published()
+                 .filter(id__in=payload['post_ids']).order_by('id')
+                 .only('id', 'title'))
+    if not posts:
+        raise ObjectDoesNotExist("No post of the digest exists")
+    publisher = Publisher.objects.select_related('user').get(
+        id=payload['publisher_id'])
+    return posts, publisher
+
+
+def _publication_email(payload):
+    post, publisher = _load(payload)
+
+    if payload['post_type'] == 'article':
+        subject = f"New Article Published: {post.title}"
+        message = (f"A new article has been published by"
+                   f"{publisher.user.username}.\n\nTitle:"
+                   f"{post.title}\n\n{post.content[:200]}...")
+    else:
+        subject = f"New Newsletter: {post.title}"
+        message = (f"{publisher.user.username} just released a new"
+                   f"newsletter.\n\nTitle:"
+                   f"{post.title}\n\n{post.content[:200]}...")
+    return subject, message
+
+
+def _digest_email(payload):
+    posts, publisher = _load_digest(payload)
+    noun = payload['post_type'] + ('s' if len(posts) > 1 else '')
+    subject = f"{len(posts)} new {noun} from {publisher.user.username}"
+    message = (f"{publisher.user.username} just published:\n\n"
+               + "\n".join(f"- {post.title}" for post in posts))
+    return subject, message
+
+
+def handle_email(payload, checkpoint=None):
+    """
+    Email the publisher's subscribers about a published post, or a digest
+    of several posts approved together.
+
+    Progress is kept in ``payload['resume_after']`` and saved with
+    ``checkpoint`` after every batch and when the connection drops, so a
+    retry carries on after the last recipient emailed instead of emailing
+    everyone again (if the worker died, after the last completed batch).
+    """
+    if 'post_ids' in payload:
+        subject, message = _digest_email(payload)
+    else:
+        subject, message = _publication_email(payload)
+
+    def record_progress(stats):
+        payload['resume_after'] = stats.last_id
+        if checkpoint:
+            checkpoint()
+
+    stats = deliver_to_subscribers(payload['publisher_id'], subject, message,
+                                   after_id=payload.get('resume_after', 0),
+                                   on_batch=record_progress)
+    payload['delivery'] = stats.as_dict()
+
+
+def handle_tweet(payload, checkpoint=None):  # pylint: disable=unused-argument
+    """
+    Tweet about a published post.
+
+    Raises ``RateLimited`` without calling the API when the rate window
+    is used up; the event then waits in the outbox until it resets. A
+    digest is announced in one tweet, so a batch costs a single request
+    of the rate limit.
+    """
+    if 'post_ids' in payload:
+        posts, publisher = _load_digest(payload)
+        text = (f"{len(posts)} new posts by {publisher}: "
+                + "; ".join(post.title for post in posts))
+        if len(text) > TWEET_LENGTH:
+            text = text[:TWEET_LENGTH - 1] + "\u2026"
+    else:
+        post, publisher = _load(payload)
+        text = f"New Post by {publisher}: {post.title}"
+    tweet = post_tweet(text)
+    payload['tweet_id'] = tweet['id']
+
+
+def handle_feed(payload, checkpoint=None):  # pylint: disable=unused-argument
+    """
+    Add a published post to its subscribers' feeds.
+    """
+    post, _ = _load(payload)
+    payload['feeds'] = fan_out(payload['post_type'], post)
+
+
+HANDLERS = {
+    'email': handle_email,
+    'tweet': handle_tweet,
+    'feed': handle_feed,
+}
+
+
+def backoff(attempts):
+    """
+    Delay before retrying an event that has failed ``attempts`` times.
+    """
+    return timedelta(seconds=min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1),
+                                 BACKOFF_MAX_SECONDS))
+
+
+def process_event(event, max_attempts=MAX_ATTEMPTS, savepoint=True):
+    """
+    Run the handler for one event and record the outcome.
+
+    Handlers may update ``event.payload`` in place (e.g. progress or
+    delivery figures); it is saved whether or not the handler succeeds.
+    Handlers that make progress in steps call the checkpoint they are
+    given after each one, which saves the payload straight away and
+    renews the event's lease.
+
+    Args:
+        event (OutboxEvent): The event to process.
+        max_attempts (int): Attempts before the event is marked failed.
+        savepoint (bool): Run the handler in a savepoint, so a failure
+        cannot break the caller's transaction. Leased events are handled
+        outside any transaction and skip it, so no transaction stays open
+        while the handler waits on the network.
+
+    Returns:
+        bool: True if the handler succeeded.
+    """
+    def checkpoint():
+        OutboxEvent.objects.filter(id=event.id).update(
+            payload=event.payload,
+            available_at=timezone.now() + timedelta(seconds=LEASE_SECONDS))
+
+    event.attempts += 1
+    try:
+        if savepoint:
+            with transaction.atomic():
+                HANDLERS[event.kind](event.payload, checkpoint)
+        else:
+            HANDLERS[event.kind](event.payload, checkpoint)
+    except ObjectDoesNotExist:
+        # The post or publisher was deleted, nothing left to announce
+        event.last_error = "Post no longer exists"
+    except RateLimited as e:
+        # Waiting for the rate window is not a failure, keep the attempt
+        event.attempts -= 1
+        event.last_error = str(e)
+        event.available_at = datetime.fromtimestamp(e.retry_at,
+                                                    tz=dt_timezone.utc)
+        logger.info("Outbox event %s deferred: %s",
+                    event.idempotency_key, e)
+        event.save(update_fields=['attempts', 'last_error', 'available_at',
+                                  'payload'])
+        return False
+    except Exception as e:  # pylint: disable=broad-except
+        event.last_error = str(e)[:1000]
+        if event.attempts >= max_attempts or isinstance(e, TweetRejected):
+            event.status = 'failed'
+            logger.error("Outbox event %s failed permanently: %s",
+                         event.idempotency_key, e)
+        else:
+            event.available_at = timezone.now() + backoff(event.attempts)
+            logger.warning("Outbox event %s failed, retrying: %s",
+                           event.idempotency_key, e)
+        event.save(update_fields=['attempts', 'last_error', 'status',
+                                  'available_at', 'payload'])
+        return False
+
+    event.status = 'done'
+    event.processed_at = timezone.now()
+    event.save(update_fields=['attempts', 'last_error', 'status',
+                              'processed_at', 'payload'])
+    return True
+
+
+def _due_events(kinds=None):
+    events = OutboxEvent.objects.select_for_update(
+        skip_locked=True
+    ).filter(status='pending', available_at__lte=timezone.now())
+    if kinds:
+        events = events.filter(kind__in=kinds)
+    return events.order_by('id')
+
+
+def drain(batch_size=100, max_attempts=MAX_ATTEMPTS, kinds=None):
+    """
+    Process one batch of due events, one after the other.
+
+    The batch is leased with ``claim`` so several workers can drain the
+    outbox at once without handling the same event twice. Handlers then
+    run outside any transaction, so no row lock is held while they wait
+    on SMTP or Twitter, and each event's outcome is committed as soon as
+    it is handled: a crash mid-batch never repeats the emails and tweets
+    already sent.
+
+    Args:
+        batch_size (int): Maximum number of events to process.
+        max_attempts (int): Attempts before an event is marked failed.
+        kinds (list): Only process these event kinds, or all if None.
+
+    Returns:
+        tuple: (succeeded, failed) counts for the batch.
+    """
+    succeeded = failed = 0
+    for event in claim(batch_size, kinds):
+        if process_event(event, max_attempts, savepoint=False):
+            succeeded += 1
+        else:
+            failed += 1
+    return succeeded, failed
+
+
+def claim(batch_size=100, kinds=None, lease=LEASE_SECONDS):
+    """
+    Lease a batch of due events to this worker.
+
+    The events' ``available_at`` is pushed ``lease`` seconds ahead in the
+    same short transaction that locks them, so they can be processed
+    outside it without other workers picking them up. An event whose
+    worker dies is simply due again once the lease runs out.
+
+    Returns:
+        list: The claimed events.
+    """
+    with transaction.atomic():
+        events = list(_due_events(kinds)[:batch_size])
+        if events:
+            OutboxEvent.objects.filter(
+                id__in=[event.id for event in events]
+            ).update(available_at=timezone.now() + timedelta(seconds=lease))
+    return events
+
+
+def _process_in_thread(event, max_attempts):
+    try:
+        return process_event(event, max_attempts, savepoint=False)
+    finally:
+        # Worker threads keep their own connection, tidy it like a request
+        close_old_connections()
+
+
+async def adrain(batch_size=100, max_attempts=MAX_ATTEMPTS, kinds=None,
+                 concurrency=10):
+    """
+    Process one batch of due events, up to ``concurrency`` at a time.
+
+    Handlers spend most of their time waiting on SMTP and the Twitter API,
+    so a slow recipient or tweet no longer holds up the rest of the batch.
+    Each handler runs in a pool of ``concurrency`` threads, each with its
+    own database connection; events are leased with ``claim`` instead of
+    staying row-locked.
+
+    Args:
+        batch_size (int): Maximum number of events to process.
+        max_attempts (int): Attempts before an event is marked failed.
+        kinds (list): Only process these event kinds, or all if None.
+        concurrency (int): Events handled at the same time.
+
+    Returns:
+        tuple: (succeeded, failed) counts for the batch.
+    """
+    events = await sync_to_async(claim)(batch_size, kinds)
+    if not events:
+        return 0, 0
+
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = await asyncio.gather(*(
+            loop.run_in_executor(executor, _process_in_thread, event,
+                                 max_attempts)
+            for event in events
+        ))
+    succeeded = sum(results)
+    return succeeded, len(results) - succeeded
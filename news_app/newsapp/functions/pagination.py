@@ -0,0 +1,169 @@
+"""Keyset (cursor) pagination helpers for the REST API"""
+import base64
+import binascii
+import json
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    """
+    Raised when a cursor supplied by the client cannot be decoded.
+    """
+
+
+class CursorPage:
+    """
+    A single page of results produced by ``paginate_by_cursor``.
+
+    Attributes:
+        items (list): The model instances on this page.
+        next_cursor (str): Cursor for the following (older, or newer when
+        oldest first) page, or None.
+        prev_cursor (str): Cursor for the preceding page, or None.
+    """
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+
+def encode_cursor(item, direction):
+    """
+    Build an opaque cursor pointing at ``item``.
+
+    Args:
+        item (Model): Row with ``created_at`` and ``id`` attributes.
+        direction (str): 'n' to read past the item, 'p' to read before it.
+
+    Returns:
+        str: URL-safe cursor string.
+    """
+    raw = json.dumps([item.created_at.isoformat(), item.id, direction])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by ``encode_cursor``.
+
+    Returns:
+        tuple: (created_at, id, direction)
+
+    Raises:
+        InvalidCursor: If the cursor is malformed.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, pk, direction = json.loads(
+            base64.urlsafe_b64decode(padded.encode()))
+        created_at = parse_datetime(created_at)
+        pk = int(pk)
+    except (binascii.Error, ValueError, TypeError, UnicodeDecodeError) as e:
+        raise InvalidCursor(cursor) from e
+
+    if created_at is None or direction not in ('n', 'p'):
+        raise InvalidCursor(cursor)
+    return created_at, pk, direction
+
+
+def parse_page_size(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """
+    Clamp a client supplied page size to ``1..maximum``.
+    """
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, maximum))
+
+
+def _page_query(queryset, cursor, page_size, oldest_first=False):
+    """
+    The slice of ``queryset`` to read for a page, and the cursor direction.
+    """
+    forward, backward = ('-created_at', '-id'), ('created_at', 'id')
+    past, before = 'lt', 'gt'
+    if oldest_first:
+        forward, backward = backward, forward
+        past, before = before, past
+
+    if not cursor:
+        return queryset.order_by(*forward)[:page_size + 1], None
+
+    created_at, pk, direction = decode_cursor(cursor)
+    lookup, order = (past, forward) if direction == 'n' else (before,
+                                                              backward)
+    return queryset.filter(
+        Q(**{f'created_at__{lookup}': created_at})
+        | Q(created_at=created_at, **{f'id__{lookup}': pk})
+    ).order_by(*order)[:page_size + 1], direction
+
+
+def _build_page(rows, direction, page_size):
+    """
+    Turn the rows read by ``_page_query`` into a ``CursorPage``.
+    """
+    has_more = len(rows) > page_size
+    if direction is None:
+        items = rows[:page_size]
+        return CursorPage(
+            items,
+            next_cursor=encode_cursor(items[-1], 'n') if has_more else None,
+        )
+
+    if direction == 'n':
+        items = rows[:page_size]
+        return CursorPage(
+            items,
+            next_cursor=encode_cursor(items[-1], 'n') if has_more else None,
+            prev_cursor=encode_cursor(items[0], 'p') if items else None,
+        )
+
+    items = list(reversed(rows[:page_size]))
+    return CursorPage(
+        items,
+        next_cursor=encode_cursor(items[-1], 'n') if items else None,
+        prev_cursor=encode_cursor(items[0], 'p') if has_more else None,
+    )
+
+
+def paginate_by_cursor(queryset, cursor=None, page_size=DEFAULT_PAGE_SIZE,
+                       oldest_first=False):
+    """
+    Slice ``queryset`` newest-first (or oldest-first) on
+    ``(created_at, id)``.
+
+    Only ``page_size + 1`` rows are read per call, so the cost of a page
+    does not grow with the size of the table.
+
+    Args:
+        queryset (QuerySet): Rows to paginate.
+        cursor (str): Cursor from a previous page, or None for the first page.
+        page_size (int): Number of rows per page.
+        oldest_first (bool): Read in ascending order, e.g. for work queues.
+
+    Returns:
+        CursorPage: The requested page.
+
+    Raises:
+        InvalidCursor: If ``cursor`` cannot be decoded.
+    """
+    rows, direction = _page_query(queryset, cursor, page_size, oldest_first)
+    return _build_page(list(rows), direction, page_size)
+
+
+async def apaginate_by_cursor(queryset, cursor=None,
+                              page_size=DEFAULT_PAGE_SIZE):
+    """
+    ``paginate_by_cursor`` for async views, reading the rows with
+    ``aiterator``.
+    """
+    rows, direction = _page_query(queryset, cursor, page_size)
+    return _build_page([row async for row in rows.aiterator()], direction,
+                       page_size)
+
@@ -0,0 +1,116 @@
+"""Group setup and per-user role resolution"""
+import time
+from django.contrib.auth.models import Group, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from ..models import Editor, Journalist, Publisher, Reader
+
+# Role groups in the order home() picks the primary role
+ROLE_GROUPS = ('Publisher', 'Journalist', 'Editor', 'Reader')
+
+SESSION_KEY = 'group_roles'
+
+
+def ensure_group_permissions():
+    """
+    Ensures the user's group permissions are implemented
+
+    Runs once per migrate from ``signals.groups_permissions`` rather than
+    on every request.
+    """
+    journalist_group, _ = Group.objects.get_or_create(name='Journalist')
+    editor_group, _ = Group.objects.get_or_create(name='Editor')
+    reader_group, _ = Group.objects.get_or_create(name='Reader')
+    publisher_group, _ = Group.objects.get_or_create(name='Publisher')
+
+    # Attaching permissions to Journalist
+    journalist_ct = ContentType.objects.get_for_model(Journalist)
+    journalist_perms = Permission.objects.filter(
+        content_type=journalist_ct,
+        codename__in=['can_update', 'can_create', 'can_remove',
+                      'can_view', 'join_publisher']
+    )
+    journalist_group.permissions.add(*journalist_perms)
+
+    # Attach permissions defined to Editor model
+    editor_ct = ContentType.objects.get_for_model(Editor)
+    editor_perms = Permission.objects.filter(
+        content_type=editor_ct,
+        codename__in=['can_update', 'can_remove',
+                      'can_view', 'join_publisher', 'can_publish']
+    )
+    editor_group.permissions.add(*editor_perms)
+
+    # Attach permissions defined to Reader model
+    reader_ct = ContentType.objects.get_for_model(Reader)
+    reader_perms = Permission.objects.filter(
+        content_type=reader_ct,
+        codename__in=['can_subscribe']
+    )
+    reader_group.permissions.add(*reader_perms)
+
+    # Attach permissions defined to Publisher model
+    publisher_ct = ContentType.objects.get_for_model(Publisher)
+    publisher_perms = Permission.objects.filter(
+        content_type=publisher_ct,
+        codename__in=['can_publish', 'can_view']
+    )
+    publisher_group.permissions.add(*publisher_perms)
+
+
+def _version_key(user_id):
+    return f'newsapp:roles_version:{user_id}'
+
+
+def roles_version(user_id):
+    """
+    Current role version for a user.
+
+    A missing key (first use or cache eviction) gets a fresh version, which
+    makes any copy cached in a session stale rather than wrongly valid.
+    """
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        version = time.time_ns()
+        cache.set(_version_key(user_id), version, None)
+    return version
+
+
+def invalidate_user_roles(user_id):
+    """
+    Mark every cached copy of a user's roles as stale.
+    """
+    cache.set(_version_key(user_id), time.time_ns(), None)
+
+
+def get_user_roles(request):
+    """
+    Return the names of the role groups the logged-in user belongs to.
+
+    Roles are read from the database once and then kept in the session
+    until the user's group membership changes.
+
+    Args:
+        request (HttpRequest): The request object.
+
+    Returns:
+        list: Group names, ordered as in ``ROLE_GROUPS``.
+    """
+    user = request.user
+    version = roles_version(user.id)
+    cached = request.session.get(SESSION_KEY)
+    if cached and cached.get('version') == version:
+        return cached['roles']
+
+    names = set(user.groups.filter(name__in=ROLE_GROUPS)
+                .values_list('name', flat=True))
+    roles = [name for name in ROLE_GROUPS if name in names]
+    request.session[SESSION_KEY] = {'version': version, 'roles': roles}
+    return roles
+
+
+def forget_user_roles(request):
+    """
+    Drop the roles cached in this session.
+    """
+    request.session.pop(SESSION_KEY, None)
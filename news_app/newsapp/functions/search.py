@@ -0,0 +1,668 @@
+"""Full-text search over approved articles and newsletters"""
+import heapq
+import json
+import logging
+import math
+import os
+import pickle
+import re
+import threading
+import time
+import zlib
+from collections import Counter, namedtuple
+from django.conf import settings
+from django.db.models.expressions import RawSQL
+from ..models import Article, Newsletter
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are not locked across processes
+    fcntl = None
+
+try:
+    import snowballstemmer
+except ImportError:
+    snowballstemmer = None
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+POST_TYPES = ('article', 'newsletter')
+POST_MODELS = {
+    'article': Article,
+    'newsletter': Newsletter,
+}
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have he her his i in is it its
+of on or our she so that the their them they this to was we were will
+with you your
+""".split())
+
+TOKEN_RE = re.compile(r"\w+")
+
+SearchHit = namedtuple('SearchHit', ['post_type', 'post_id', 'score'])
+SearchResults = namedtuple('SearchResults', ['hits', 'total'])
+
+
+def _light_stem(word):
+    """
+    Strip common English suffixes when snowballstemmer is not installed.
+    """
+    for suffix, replacement in (('ies', 'y'), ('ing', ''), ('ed', ''),
+                                ('ly', ''), ('es', ''), ('s', '')):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)] + replacement
+    return word
+
+
+if snowballstemmer is not None:
+    _stemmer = snowballstemmer.stemmer('english')
+    stem = _stemmer.stemWord
+else:
+    stem = _light_stem
+
+
+def tokenize(text):
+    """
+    Split text into lowercase, stemmed terms without stopwords.
+    """
+    return [stem(word) for word in TOKEN_RE.findall(text.lower())
+            if word not in STOPWORDS]
+
+
+def doc_key(post_type, post_id):
+    """
+    Pack a post into one int: the id and a bit for the post type.
+    """
+    return post_id * 2 + POST_TYPES.index(post_type)
+
+
+def split_key(key):
+    """
+    Reverse ``doc_key``.
+    """
+    return POST_TYPES[key % 2], key // 2
+
+
+def post_terms(post):
+    """
+    Term frequencies of a post; the title counts twice.
+    """
+    return Counter(tokenize(f"{post.title} {post.title} {post.content}"))
+
+
+class InvertedIndex:
+    """
+    In-memory inverted index ranked with BM25.
+
+    Attributes:
+        postings (dict): term -> {doc key: term frequency}.
+        lengths (dict): doc key -> number of terms in the document.
+        doc_terms (dict): doc key -> distinct terms, so a document can be
+        removed without scanning the whole vocabulary.
+    """
+
+    def __init__(self):
+        self.postings = {}
+        self.lengths = {}
+        self.doc_terms = {}
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def add(self, key, terms):
+        """
+        Add or replace a document given its term frequencies.
+        """
+        self.remove(key)
+        for term, frequency in terms.items():
+            self.postings.setdefault(term, {})[key] = frequency
+        length = sum(terms.values())
+        self.lengths[key] = length
+        self.doc_terms[key] = tuple(terms)
+        self.total_length += length
+
+    def remove(self, key):
+        """
+        Drop a document; unknown keys are ignored.
+        """
+        length = self.lengths.pop(key, None)
+        if length is None:
+            return
+        self.total_length -= length
+        for term in self.doc_terms.pop(key):
+            docs = self.postings[term]
+            del docs[key]
+            if not docs:
+                del self.postings[term]
+
+    def search(self, query, post_type=None, limit=20, offset=0):
+        """
+        Rank documents matching any query term.
+
+        Args:
+            query (str): Free text.
+            post_type (str): Only return this type, or both if None.
+            limit (int): Number of hits to return.
+            offset (int): Number of hits to skip.
+
+        Returns:
+            SearchResults: Hits, best first, and the number of matches.
+        """
+        if not self.lengths:
+            return SearchResults([], 0)
+
+        count = len(self.lengths)
+        average = self.total_length / count
+        lengths = self.lengths
+        wanted = None if post_type is None else POST_TYPES.index(post_type)
+        scores = {}
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+            for key, frequency in docs.items():
+                if wanted is not None and key % 2 != wanted:
+                    continue
+                norm = K1 * (1 - B + B * lengths[key] / average)
+                scores[key] = (scores.get(key, 0.0)
+                               + idf * frequency * (K1 + 1)
+                               / (frequency + norm))
+
+        best = heapq.nlargest(offset + limit, scores.items(),
+                              key=lambda item: item[1])
+        hits = [SearchHit(*split_key(key), round(score, 4))
+                for key, score in best[offset:]]
+        return SearchResults(hits, len(scores))
+
+    def dumps(self):
+        """
+        Serialize the index as compressed bytes.
+        """
+        return zlib.compress(pickle.dumps(
+            (SNAPSHOT_VERSION, self.postings, self.lengths, self.doc_terms),
+            protocol=pickle.HIGHEST_PROTOCOL))
+
+    @classmethod
+    def loads(cls, data):
+        """
+        Rebuild an index from ``dumps`` output.
+        """
+        version, *tables = pickle.loads(zlib.decompress(data))
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported search index version {version}")
+        index = cls()
+        index.postings, index.lengths, index.doc_terms = tables
+        index.total_length = sum(index.lengths.values())
+        return index
+
+
+def _header(generation):
+    return json.dumps({'generation': generation}).encode() + b'\n'
+
+
+def _read_header(stream):
+    """
+    Generation stamp at the start of a snapshot or journal, and where the
+    data after it starts. Files written before stamps were added are
+    generation 0.
+    """
+    first = stream.readline()
+    if first.startswith(b'{"generation"'):
+        return json.loads(first)['generation'], len(first)
+    stream.seek(0)
+    return 0, 0
+
+
+class IndexStore:
+    """
+    An index kept on disk as a snapshot plus an append-only journal.
+
+    Every process serving searches holds the index in memory. Changes are
+    appended to the journal and each process replays new journal lines
+    before answering a query, so all workers converge without reloading
+    the snapshot.
+
+    Both files start with a generation stamp. ``rebuild`` and ``compact``
+    never truncate the journal: they swap in a new one under a newer
+    generation, and a process notices the new stamp rather than relying
+    on the file getting shorter, which appends can hide. A journal older
+    than the loaded snapshot has been folded into it and is skipped.
+
+    Compaction is slow on a large index, so appends only report that it
+    is due; the outbox worker runs it (see ``compact_index``).
+
+    Attributes:
+        max_journal_bytes (int): Journal size past which it is due for
+            compaction, or None to never compact it.
+    """
+
+    def __init__(self, path, max_journal_bytes=None):
+        self.path = path
+        self.snapshot_path = os.path.join(path, 'index.bin')
+        self.journal_path = os.path.join(path, 'journal.log')
+        self.max_journal_bytes = max_journal_bytes
+        self.index = InvertedIndex()
+        self.generation = 0
+        self.snapshot_mtime = None
+        self.journal_generation = None
+        self.journal_inode = None
+        self.journal_offset = 0
+        self.lock = threading.Lock()
+
+    def _stat(self, path):
+        try:
+            return os.stat(path)
+        except FileNotFoundError:
+            return None
+
+    def _load_snapshot(self):
+        stat = self._stat(self.snapshot_path)
+        if stat is None:
+            self.index, self.generation = InvertedIndex(), 0
+        else:
+            with open(self.snapshot_path, 'rb') as snapshot:
+                self.generation, _ = _read_header(snapshot)
+                self.index = InvertedIndex.loads(snapshot.read())
+        self.snapshot_mtime = stat and stat.st_mtime_ns
+        # Replay whichever journal is current from its start
+        self.journal_generation = self.journal_inode = None
+
+    def refresh(self):
+        """
+        Pick up a new snapshot and any journal lines written since the
+        last call.
+        """
+        with self.lock:
+            snapshot = self._stat(self.snapshot_path)
+            if (snapshot and snapshot.st_mtime_ns) != self.snapshot_mtime:
+                self._load_snapshot()
+            journal = self._stat(self.journal_path)
+            if journal is None or (journal.st_ino == self.journal_inode
+                                   and journal.st_size <= self.journal_offset):
+                return
+            with open(self.journal_path, 'rb') as lines:
+                generation, start = _read_header(lines)
+                if generation < self.generation:
+                    # Already in the snapshot; its successor is on the way
+                    return
+                if generation != self.journal_generation:
+                    # A new journal, replayed on top of what we have: a
+                    # rebuild starts it before its snapshot is written
+                    self.journal_generation = generation
+                    self.journal_offset = start
+                self.journal_inode = os.fstat(lines.fileno()).st_ino
+                lines.seek(self.journal_offset)
+                data = lines.read()
+            # Only apply whole lines; a partial one is read next time
+            complete = data.rfind(b'\n') + 1
+            for line in data[:complete].splitlines():
+                self._apply(json.loads(line))
+            self.journal_offset += complete
+
+    def _apply(self, entry):
+        if entry['op'] == 'add':
+            self.index.add(entry['key'], entry['terms'])
+        else:
+            self.index.remove(entry['key'])
+
+    def _open_journal(self):
+        """
+        Open the journal for appending and lock it. A rebuild or compaction
+        may swap in a new journal while we wait for the lock, so retry
+        until the locked file is still the current one.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        if not os.path.exists(self.journal_path):
+            self._create_journal()
+        while True:
+            # pylint: disable-next=consider-using-with
+            journal = open(self.journal_path, 'a', encoding='utf-8')
+            if not fcntl:
+                return journal
+            fcntl.flock(journal, fcntl.LOCK_EX)
+            current = self._stat(self.journal_path)
+            if current and current.st_ino == os.fstat(journal.fileno()).st_ino:
+                return journal
+            journal.close()
+
+    def _create_journal(self):
+        """
+        Create a missing journal under the snapshot's generation; a
+        journal older than the snapshot would be skipped.
+        """
+        generation = 0
+        try:
+            with open(self.snapshot_path, 'rb') as snapshot:
+                generation, _ = _read_header(snapshot)
+        except FileNotFoundError:
+            pass
+        temporary = f"{self.journal_path}.{os.getpid()}.new"
+        with open(temporary, 'wb') as journal:
+            journal.write(_header(generation))
+        try:
+            # Unlike a rename, never replaces a journal another process
+            # has just created and written to
+            os.link(temporary, self.journal_path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(temporary)
+
+    def _replace(self, path, *chunks):
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, 'wb') as new:
+            for chunk in chunks:
+                new.write(chunk)
+        os.replace(temporary, path)
+
+    def _start_journal(self, generation):
+        self._replace(self.journal_path, _header(generation))
+
+    def append(self, *entries):
+        """
+        Record changes in the journal, with one write.
+
+        Returns:
+            bool: Whether the journal is now due for compaction.
+        """
+        lines = ''.join(json.dumps(entry, separators=(',', ':')) + '\n'
+                        for entry in entries)
+        with self._open_journal() as journal:
+            journal.write(lines)
+            journal.flush()
+            return self._over_limit(journal.tell())
+
+    def _over_limit(self, size):
+        # Compacting while unlocked appends go on could lose them
+        return bool(fcntl and self.max_journal_bytes is not None
+                    and size > self.max_journal_bytes)
+
+    def compaction_due(self):
+        """
+        Whether the journal has grown past ``max_journal_bytes``.
+        """
+        journal = self._stat(self.journal_path)
+        return journal is not None and self._over_limit(journal.st_size)
+
+    def compact(self, min_bytes=0):
+        """
+        Fold the journal into a new snapshot and start an empty journal,
+        so processes starting later do not replay every change since the
+        last rebuild.
+
+        Appends wait on the journal lock meanwhile, so none are lost.
+
+        Args:
+            min_bytes (int): Skip it if the journal is no larger, e.g.
+                because another process has just compacted it.
+
+        Returns:
+            bool: Whether the journal was compacted.
+        """
+        with self._open_journal() as journal:
+            if journal.tell() <= min_bytes:
+                return False
+            self.refresh()
+            generation = max(time.time_ns(), self.generation + 1)
+            with self.lock:
+                self._replace(self.snapshot_path, _header(generation),
+                              self.index.dumps())
+                self._start_journal(generation)
+                # The index in memory is the snapshot just written
+                self.generation = generation
+                self.snapshot_mtime = os.stat(self.snapshot_path).st_mtime_ns
+        logger.info("Search journal compacted into generation %s", generation)
+        return True
+
+    def rebuild(self, documents):
+        """
+        Replace the index with ``documents``, an iterable of
+        ``(key, terms)``, and save it as the new snapshot.
+
+        A new journal is started first, so changes committed while the
+        rebuild reads the database are replayed on top of the snapshot.
+        """
+        generation = max(time.time_ns(), self.generation + 1)
+        with self._open_journal():
+            self._start_journal(generation)
+        index = InvertedIndex()
+        for key, terms in documents:
+            index.add(key, terms)
+        self._replace(self.snapshot_path, _header(generation), index.dumps())
+        with self.lock:
+            self._load_snapshot()
+        return len(index)
+
+
+_stores = {}
+
+
+def index_path_setting():
+    """
+    Directory holding the index files (``NEWSAPP_SEARCH_INDEX_PATH``).
+    """
+    return str(settings.NEWSAPP_SEARCH_INDEX_PATH)
+
+
+def journal_max_setting():
+    """
+    Journal size, in bytes, past which it is folded into the snapshot
+    (``NEWSAPP_SEARCH_JOURNAL_MAX_BYTES``).
+    """
+    return getattr(settings, 'NEWSAPP_SEARCH_JOURNAL_MAX_BYTES',
+                   16 * 1024 * 1024)
+
+
+def get_store():
+    """
+    The index store for the configured path, loaded on first use.
+    """
+    path = index_path_setting()
+    if path not in _stores:
+        _stores[path] = IndexStore(path, journal_max_setting())
+    return _stores[path]
+
+
+def iter_documents(chunk_size=2000):
+    """
+    Yield ``(key, terms)`` for every approved post.
+    """
+    for post_type, model in POST_MODELS.items():
+        last_id = 0
+        while True:
+            posts = list(model.objects.published().filter(id__gt=last_id)
+                         .order_by('id').only('id', 'title', 'content')
+                         [:chunk_size])
+            if not posts:
+                break
+            for post in posts:
+                yield doc_key(post_type, post.id), post_terms(post)
+            last_id = posts[-1].id
+
+
+class IndexBackend:
+    """
+    The in-process inverted index.
+    """
+
+    def search(self, query, post_type=None, limit=20, offset=0):
+        store = get_store()
+        store.refresh()
+        return store.index.search(query, post_type, limit, offset)
+
+    def index_post(self, post_type, post):
+        if not post.approved:
+            self.unindex_post(post_type, post.id)
+            return
+        terms = post_terms(post)
+        get_store().append({'op': 'add', 'key': doc_key(post_type, post.id),
+                            'terms': terms})
+
+    def unindex_post(self, post_type, post_id):
+        get_store().append({'op': 'remove',
+                            'key': doc_key(post_type, post_id)})
+
+    def index_posts(self, post_type, posts):
+        get_store().append(*(
+            {'op': 'add', 'key': doc_key(post_type, post.id),
+             'terms': post_terms(post)} if post.approved else
+            {'op': 'remove', 'key': doc_key(post_type, post.id)}
+            for post in posts))
+
+    def rebuild(self):
+        count = get_store().rebuild(iter_documents())
+        logger.info("Search index rebuilt with %s posts", count)
+        return count
+
+    def compact(self, force=False):
+        store = get_store()
+        if force:
+            return store.compact()
+        return store.compaction_due() and store.compact(store.max_journal_bytes)
+
+
+class FulltextBackend:
+    """
+    MariaDB/MySQL FULLTEXT indexes, kept up to date by the database.
+    """
+
+    MATCH = "MATCH (title, content) AGAINST (%s IN NATURAL LANGUAGE MODE)"
+
+    def search(self, query, post_type=None, limit=20, offset=0):
+        hits = []
+        total = 0
+        for name, model in POST_MODELS.items():
+            if post_type not in (None, name):
+                continue
+            matches = model.objects.published().annotate(
+                score=RawSQL(self.MATCH, [query])
+            ).filter(score__gt=0)
+            total += matches.count()
+            hits += [SearchHit(name, post_id, round(score, 4))
+                     for post_id, score in matches.order_by('-score')
+                     .values_list('id', 'score')[:offset + limit]]
+        hits.sort(key=lambda hit: hit.score, reverse=True)
+        return SearchResults(hits[offset:offset + limit], total)
+
+    def index_post(self, post_type, post):
+        pass
+
+    def unindex_post(self, post_type, post_id):
+        pass
+
+    def index_posts(self, post_type, posts):
+        pass
+
+    def rebuild(self):
+        return sum(model.objects.published().count()
+                   for model in POST_MODELS.values())
+
+    def compact(self, force=False):
+        return False
+
+
+BACKENDS = {
+    'index': IndexBackend,
+    'fulltext': FulltextBackend,
+}
+
+
+def get_backend():
+    """
+    The backend named by ``NEWSAPP_SEARCH_BACKEND``.
+    """
+    return BACKENDS[getattr(settings, 'NEWSAPP_SEARCH_BACKEND', 'index')]()
+
+
+def search(query, post_type=None, limit=20, offset=0):
+    """
+    Search approved posts with the configured backend.
+
+    Args:
+        query (str): Free text.
+        post_type (str): 'article', 'newsletter' or None for both.
+        limit (int): Number of hits to return.
+        offset (int): Number of hits to skip.
+
+    Returns:
+        SearchResults: Hits, best first, and the number of matches.
+    """
+    if not query.strip():
+        return SearchResults([], 0)
+    return get_backend().search(query, post_type, limit, offset)
+
+
+def index_post(post_type, post):
+    """
+    Add, update or (if no longer approved) remove a post.
+    """
+    get_backend().index_post(post_type, post)
+
+
+def index_posts(post_type, posts):
+    """
+    ``index_post`` for many posts, e.g. after a bulk approval.
+    """
+    get_backend().index_posts(post_type, posts)
+
+
+def unindex_post(post_type, post_id):
+    """
+    Remove a post from the index.
+    """
+    get_backend().unindex_post(post_type, post_id)
+
+
+def rebuild_index():
+    """
+    Rebuild the index from the database.
+
+    Returns:
+        int: Number of posts indexed.
+    """
+    return get_backend().rebuild()
+
+
+def compact_index(force=False):
+    """
+    Fold the search journal into the snapshot once it passes
+    ``NEWSAPP_SEARCH_JOURNAL_MAX_BYTES``.
+
+    Run by the outbox worker between batches, so no request waits on it.
+
+    Args:
+        force (bool): Compact however small the journal is.
+
+    Returns:
+        bool: Whether the journal was compacted.
+    """
+    return get_backend().compact(force)
+
+
+def load_hits(hits):
+    """
+    Fetch the posts for a page of hits, one query per post type.
+
+    Returns:
+        list: ``(hit, post)`` pairs in hit order, skipping posts that
+        were deleted or unapproved since they were indexed.
+    """
+    ids = {}
+    for hit in hits:
+        ids.setdefault(hit.post_type, []).append(hit.post_id)
+    posts = {
+        post_type: POST_MODELS[post_type].objects.published().select_related(
+            'journalist__user', 'publisher__user').in_bulk(post_ids)
+        for post_type, post_ids in ids.items()
+    }
+    return [(hit, posts[hit.post_type][hit.post_id]) for hit in hits
+            if hit.post_id in posts[hit.post_type]]
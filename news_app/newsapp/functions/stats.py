@@ -0,0 +1,189 @@
+"""Post and subscriber counters kept on publishers and journalists"""
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Sum, Value, When
+from ..models import Article, Journalist, Newsletter, Publisher, Subscription
+
+POST_MODELS = {
+    'article': Article,
+    'newsletter': Newsletter,
+}
+
+COUNTER_FIELDS = ('articles_approved', 'articles_pending',
+                  'newsletters_approved', 'newsletters_pending',
+                  'subscribers')
+
+# Publishers or journalists recounted per transaction
+RECOUNT_BATCH_SIZE = 500
+
+# Changes collected by an enclosing ``batched_counts`` block
+_pending_changes = ContextVar('pending_changes', default=None)
+
+
+def post_counter(post_type, approved):
+    """
+    Name of the counter a post is counted in, e.g. 'articles_pending'.
+    """
+    return f"{post_type}s_{'approved' if approved else 'pending'}"
+
+
+def add_counts(model, changes):
+    """
+    Add to the counters of several rows with one ``UPDATE``.
+
+    Each counter is set to ``F(counter) + CASE id WHEN ... END``, so the
+    change is applied by the database and concurrent updates never
+    overwrite each other.
+
+    Args:
+        model (Model): Publisher or Journalist.
+        changes (dict): ``{pk: Counter({counter: delta})}``.
+    """
+    changes = {pk: deltas for pk, deltas in changes.items()
+               if pk is not None and any(deltas.values())}
+    if not changes:
+        return
+    if len(changes) == 1:
+        [(pk, deltas)] = changes.items()
+        model.objects.filter(pk=pk).update(**{
+            field: F(field) + delta for field, delta in deltas.items()
+            if delta})
+        return
+    values = {}
+    for field in {field for deltas in changes.values() for field in deltas}:
+        whens = [When(pk=pk, then=Value(deltas[field]))
+                 for pk, deltas in changes.items() if deltas[field]]
+        if whens:
+            values[field] = F(field) + Case(*whens, default=Value(0),
+                                            output_field=IntegerField())
+    model.objects.filter(pk__in=changes).update(**values)
+
+
+def _apply(model, changes):
+    """
+    Apply counter changes now, or leave them for the enclosing
+    ``batched_counts`` block.
+    """
+    batch = _pending_changes.get()
+    if batch is None:
+        add_counts(model, changes)
+        return
+    for pk, deltas in changes.items():
+        batch[model][pk].update(deltas)
+
+
+@contextmanager
+def batched_counts():
+    """
+    Collect the counter changes made inside the block, including those of
+    the delete signals, and apply them with one ``UPDATE`` per model at
+    the end, so deleting a batch of posts does not update the same
+    publisher once per post.
+    """
+    if _pending_changes.get() is not None:
+        yield
+        return
+    batch = defaultdict(lambda: defaultdict(Counter))
+    token = _pending_changes.set(batch)
+    try:
+        yield
+    finally:
+        _pending_changes.reset(token)
+    for model, changes in batch.items():
+        add_counts(model, changes)
+
+
+def count_posts(post_type, rows):
+    """
+    Move posts in or out of their publisher's and journalist's totals.
+
+    Args:
+        post_type (str): 'article' or 'newsletter'.
+        rows (iterable): ``(publisher_id, journalist_id, approved, delta)``
+        per post, delta being 1 for a new post and -1 for a removed one.
+        An approval is -1 pending and +1 approved.
+    """
+    publishers = defaultdict(Counter)
+    journalists = defaultdict(Counter)
+    for publisher_id, journalist_id, approved, delta in rows:
+        field = post_counter(post_type, approved)
+        publishers[publisher_id][field] += delta
+        journalists[journalist_id][field] += delta
+    _apply(Publisher, publishers)
+    _apply(Journalist, journalists)
+
+
+def count_subscription(subscription, delta):
+    """
+    Add ``delta`` to the subscriber count of what ``subscription`` follows.
+    """
+    if subscription.publisher_id:
+        _apply(Publisher, {subscription.publisher_id:
+                           Counter(subscribers=delta)})
+    if subscription.journalist_id:
+        _apply(Journalist, {subscription.journalist_id:
+                            Counter(subscribers=delta)})
+
+
+def published_count(post_type):
+    """
+    Number of approved posts, summed from the publishers' counters
+    instead of counting the posts table.
+    """
+    total = Publisher.objects.aggregate(
+        total=Sum(post_counter(post_type, True)))['total']
+    return total or 0
+
+
+def _fresh_counts(owner, ids):
+    """
+    Count the posts and subscriptions of publishers or journalists.
+
+    Returns:
+        dict: ``{pk: {counter: value}}`` for every id.
+    """
+    counts = {pk: dict.fromkeys(COUNTER_FIELDS, 0) for pk in ids}
+    for post_type, model in POST_MODELS.items():
+        rows = (model.objects.filter(**{f'{owner}_id__in': ids})
+                .order_by().values(f'{owner}_id')
+                .annotate(approved_total=Count('id', filter=Q(approved=True)),
+                          pending_total=Count('id', filter=Q(approved=False))))
+        for row in rows:
+            totals = counts[row[f'{owner}_id']]
+            totals[post_counter(post_type, True)] = row['approved_total']
+            totals[post_counter(post_type, False)] = row['pending_total']
+    rows = (Subscription.objects.filter(**{f'{owner}_id__in': ids})
+            .order_by().values(f'{owner}_id').annotate(total=Count('id')))
+    for row in rows:
+        counts[row[f'{owner}_id']]['subscribers'] = row['total']
+    return counts
+
+
+def recount(model, ids):
+    """
+    Recompute the counters of some publishers or journalists and fix the
+    ones that drifted.
+
+    The rows are locked while their posts are counted, so a post saved
+    meanwhile waits and then adjusts the corrected value.
+
+    Args:
+        model (Model): Publisher or Journalist.
+        ids (list): Primary keys to recount.
+
+    Returns:
+        int: Rows whose counters were wrong.
+    """
+    owner = model.__name__.lower()
+    with transaction.atomic():
+        stored = {row['id']: row for row in
+                  model.objects.select_for_update().filter(id__in=ids)
+                  .values('id', *COUNTER_FIELDS)}
+        fresh = _fresh_counts(owner, list(stored))
+        drifted = [model(id=pk, **counts) for pk, counts in fresh.items()
+                   if any(stored[pk][field] != value
+                          for field, value in counts.items())]
+        model.objects.bulk_update(drifted, COUNTER_FIELDS)
+    return len(drifted)
@@ -0,0 +1,139 @@
+"""Local stand-ins for SMTP and the Twitter API, for benchmarks and tests"""
+import json
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _StubServer:
+    """
+    Runs a server on a free localhost port in a background thread.
+
+    Use as a context manager; ``port`` is set once it is entered.
+
+    Attributes:
+        delay (float): Seconds each message or tweet takes, to mimic a
+        remote service.
+        received (int): Messages or tweets accepted so far.
+    """
+
+    server_class = None
+    handler_class = None
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.received = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def port(self):
+        """
+        Port the server listens on.
+        """
+        return self._server.server_address[1]
+
+    def record(self):
+        """
+        Wait ``delay`` and count one message or tweet.
+        """
+        if self.delay:
+            time.sleep(self.delay)
+        with self._lock:
+            self.received += 1
+            return self.received
+
+    def __enter__(self):
+        self._server = self.server_class(('127.0.0.1', 0), self.handler_class)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        threading.Thread(target=self._server.serve_forever,
+                         daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """
+    Just enough SMTP for ``smtplib`` without TLS or authentication.
+    """
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.reply('220 stub ESMTP')
+        while line := self.rfile.readline():
+            command = line.decode(errors='replace').strip().upper()
+            if command.startswith('EHLO'):
+                self.reply('250-stub')
+                self.reply('250 8BITMIME')
+            elif command.startswith('DATA'):
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in (b'.\r\n', b'.\n', b''):
+                    pass
+                self.server.stub.record()
+                self.reply('250 OK')
+            elif command.startswith('QUIT'):
+                self.reply('221 Bye')
+                return
+            else:
+                # HELO, MAIL, RCPT, RSET, NOOP
+                self.reply('250 OK')
+
+
+class StubSMTPServer(_StubServer):
+    """
+    SMTP server that accepts every message and discards it.
+
+    Point ``EMAIL_HOST``/``EMAIL_PORT`` at it with ``EMAIL_USE_TLS`` off
+    and no ``EMAIL_HOST_PASSWORD``.
+    """
+
+    server_class = socketserver.ThreadingTCPServer
+    handler_class = _SMTPHandler
+
+
+class _TwitterHandler(BaseHTTPRequestHandler):
+    """
+    Answers ``POST /2/tweets`` like the Twitter API v2.
+    """
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path.split('?')[0] != '/2/tweets':
+            self.send_error(404)
+            return
+        tweet_id = self.server.stub.record()
+        text = json.loads(body or b'{}').get('text', '')
+        payload = json.dumps(
+            {'data': {'id': str(tweet_id), 'text': text}}).encode()
+        self.send_response(201)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+
+class FakeTwitterServer(_StubServer):
+    """
+    HTTP server standing in for api.twitter.com; set ``TWITTER_API_URL``
+    to ``url``.
+    """
+
+    server_class = ThreadingHTTPServer
+    handler_class = _TwitterHandler
+
+    @property
+    def url(self):
+        """
+        Base URL to use as ``TWITTER_API_URL``.
+        """
+        return f'http://127.0.0.1:{self.port}'
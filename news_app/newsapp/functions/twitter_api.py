@@ -1,42 +1,358 @@
 """Twitter API Tweepy (V2 OAuth 2.0 User Context)"""
+import json
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from itertools import count
+import requests
+from requests.adapters import HTTPAdapter
 from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
 import tweepy
 
+logger = logging.getLogger(__name__)
+
+TWITTER_HOST = "https://api.twitter.com"
+
+# Shared by every process using the cache, set when the API says the
+# rate window is used up
+PAUSE_KEY = 'newsapp:twitter:paused_until'
+
+
+def client_setting():
+    """
+    Dotted path of the API client class (``NEWSAPP_TWITTER_CLIENT``).
+    """
+    return getattr(settings, 'NEWSAPP_TWITTER_CLIENT', 'tweepy.Client')
+
+
+def pool_size_setting():
+    """
+    Clients kept per process (``NEWSAPP_TWITTER_POOL_SIZE``).
+    """
+    return getattr(settings, 'NEWSAPP_TWITTER_POOL_SIZE', 4)
+
+
+def rate_limit_setting():
+    """
+    Tweets allowed per window, as ``(limit, window_seconds)``
+    (``NEWSAPP_TWEET_RATE_LIMIT`` and ``NEWSAPP_TWEET_RATE_WINDOW``).
+    """
+    return (getattr(settings, 'NEWSAPP_TWEET_RATE_LIMIT', 17),
+            getattr(settings, 'NEWSAPP_TWEET_RATE_WINDOW', 24 * 60 * 60))
+
+
+class RateLimited(Exception):
+    """
+    Raised instead of sending a tweet that would exceed the rate limit.
+
+    Attributes:
+        retry_at (float): Unix time at which a tweet can be sent again.
+    """
+
+    def __init__(self, retry_at):
+        super().__init__(f"Rate limited until {time.ctime(retry_at)}")
+        self.retry_at = retry_at
+
+
+class TweetRejected(Exception):
+    """
+    Raised when the API refuses a tweet for good (403 Forbidden), e.g. a
+    duplicate or a restriction of the access level.
+    """
+
+
+class RedirectAdapter(HTTPAdapter):
+    """
+    Transport adapter that sends Twitter API requests to another base URL,
+    such as a local fake endpoint for benchmarks and tests.
+    """
+
+    def __init__(self, base_url):
+        super().__init__()
+        self.base_url = base_url.rstrip('/')
+
+    def send(self, request, *args, **kwargs):  # pylint: disable=arguments-differ
+        request.url = self.base_url + request.url[len(TWITTER_HOST):]
+        return super().send(request, *args, **kwargs)
+
+
+class TokenBucket:
+    """
+    Allows ``limit`` tweets per ``window`` seconds, refilling steadily.
+
+    The bucket starts full, so a burst of up to ``limit`` tweets goes out
+    at once and later ones are spaced ``window / limit`` seconds apart.
+
+    Attributes:
+        limit (int): Bucket capacity.
+        window (float): Seconds in which ``limit`` tokens are refilled.
+    """
+
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self.rate = limit / window
+        self.tokens = float(limit)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """
+        Take a token if one is available.
+
+        Returns:
+            float: 0 if a token was taken, otherwise the seconds until
+            one will be.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.limit,
+                              self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+
+class ClientPool:
+    """
+    Thread-safe pool of API clients, created on demand up to ``size``.
+
+    Reusing clients keeps their HTTP connections alive between tweets
+    instead of building a new client and TLS session every time.
+    """
+
+    def __init__(self, factory, size):
+        self.factory = factory
+        self.size = size
+        self.created = 0
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def client(self):
+        """
+        Borrow a client, waiting for one if ``size`` are in use.
+        """
+        try:
+            client = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self.created < self.size
+                if create:
+                    self.created += 1
+            if create:
+                try:
+                    client = self.factory()
+                except Exception:
+                    with self._lock:
+                        self.created -= 1
+                    raise
+            else:
+                client = self._idle.get()
+        try:
+            yield client
+        finally:
+            self._idle.put(client)
+
+
+def build_client():
+    """
+    A new client of the configured class, using the project credentials.
+
+    Clients return the raw ``requests.Response`` so the rate limit
+    headers can be read.
+    """
+    client = import_string(client_setting())(
+        bearer_token=settings.TWITTER_BEARER_TOKEN,
+        consumer_key=settings.TWITTER_CONSUMER_KEY,
+        consumer_secret=settings.TWITTER_CONSUMER_SECRET,
+        access_token=settings.TWITTER_ACCESS_TOKEN,
+        access_token_secret=settings.TWITTER_ACCESS_TOKEN_SECRET,
+        return_type=requests.Response,
+    )
+    api_url = getattr(settings, 'TWITTER_API_URL', '')
+    if api_url and hasattr(client, 'session'):
+        client.session.mount(TWITTER_HOST, RedirectAdapter(api_url))
+    return client
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def _pool_and_bucket():
+    """
+    The process-wide client pool and rate limiter.
+    """
+    with _shared_lock:
+        if not _shared:
+            _shared['pool'] = ClientPool(build_client, pool_size_setting())
+            _shared['bucket'] = TokenBucket(*rate_limit_setting())
+        return _shared['pool'], _shared['bucket']
+
+
+@receiver(setting_changed)
+def reset_clients(setting, **kwargs):  # pylint: disable=unused-argument
+    """
+    Rebuild the pool and limiter when Twitter settings change (tests).
+    """
+    if setting.startswith(('TWITTER_', 'NEWSAPP_TWITTER_', 'NEWSAPP_TWEET_')):
+        with _shared_lock:
+            _shared.clear()
+
+
+def _pause(until):
+    # The API's window is authoritative; the local bucket is left alone so
+    # tweets flow again as soon as it resets
+    cache.set(PAUSE_KEY, until, max(1, int(until - time.time()) + 1))
+
+
+def _reset_time(response):
+    """
+    When the API's rate limit window resets (``x-rate-limit-reset``), as
+    a Unix time, or None if the response does not say.
+    """
+    try:
+        return int(response.headers['x-rate-limit-reset'])
+    except (AttributeError, KeyError, ValueError):
+        return None
+
+
+def post_tweet(text):
+    """
+    Post a tweet with a pooled client, within the rate limit.
+
+    The local token bucket spaces tweets out; the API's own
+    ``x-rate-limit-*`` headers and 429 responses pause every process
+    sharing the cache until the window resets.
+
+    Args:
+        text (str): The tweet.
+
+    Returns:
+        dict: The created tweet's ``id`` and ``text``.
+
+    Raises:
+        RateLimited: If the tweet has to wait; nothing was sent.
+        TweetRejected: If the API refused the tweet for good.
+        tweepy.TweepyException: For other API or network errors, which
+        are worth retrying.
+    """
+    pool, bucket = _pool_and_bucket()
+    paused_until = cache.get(PAUSE_KEY)
+    if paused_until and paused_until > time.time():
+        raise RateLimited(paused_until)
+    wait = bucket.take()
+    if wait:
+        raise RateLimited(time.time() + wait)
+
+    with pool.client() as client:
+        try:
+            response = client.create_tweet(text=text)
+        except tweepy.TooManyRequests as e:
+            retry_at = _reset_time(e.response)
+            if retry_at is None:
+                retry_at = time.time() + bucket.window / bucket.limit
+            _pause(retry_at)
+            raise RateLimited(retry_at) from e
+        except tweepy.Forbidden as e:
+            raise TweetRejected(str(e)) from e
+
+    if response.headers.get('x-rate-limit-remaining') == '0':
+        retry_at = _reset_time(response)
+        if retry_at is not None:
+            _pause(retry_at)
+    return response.json()['data']
+
 
 class Tweet:
     """
     Modern Tweet class using Tweepy Client (Twitter API v2)
     Works with OAuth 2.0 User Context.
-    """
 
-    def __init__(self):
-        self.client = tweepy.Client(
-            bearer_token=settings.TWITTER_BEARER_TOKEN,
-            consumer_key=settings.TWITTER_CONSUMER_KEY,
-            consumer_secret=settings.TWITTER_CONSUMER_SECRET,
-            access_token=settings.TWITTER_ACCESS_TOKEN,
-            access_token_secret=settings.TWITTER_ACCESS_TOKEN_SECRET
-        )
+    Tweets go through the shared client pool and rate limiter; the outbox
+    calls ``post_tweet`` directly so it can reschedule rate limited tweets.
+    """
 
     def make_tweet(self, text: str):
         """
         Post a tweet using Twitter API v2 create_tweet.
-        Automatically handles rate-limit or permission errors.
+        Returns the tweet data, or None if it was rate limited or refused.
         """
         try:
-            response = self.client.create_tweet(text=text)
+            data = post_tweet(text)
+        except RateLimited as e:
+            logger.warning("Tweet not sent: %s", e)
+        except TweetRejected as e:
+            # Happens on free-tier access restrictions
+            logger.warning("Tweet blocked by API restrictions: %s (%s)",
+                           text, e)
+        except tweepy.TweepyException as e:
+            logger.error("Error posting tweet: %s", e)
+        else:
+            logger.info("Tweet posted successfully: %s", data['id'])
+            return data
+        return None
 
-            # Successful response
-            if response.data and "id" in response.data:
-                print(f"Tweet posted successfully: {response.data['id']}")
-                return response.data
 
-        except tweepy.Forbidden as e:
-            # Happens on free-tier access restrictions
-            print(f"[Tweet blocked by API restrictions]: {text}")
-            print(str(e))
+class FakeClient:
+    """
+    Offline stand-in for ``tweepy.Client``, enabled with
+    ``NEWSAPP_TWITTER_CLIENT = 'newsapp.functions.twitter_api.FakeClient'``.
 
-        except tweepy.TweepyException as e:
-            print(f"Error posting tweet: {str(e)}")
+    Attributes:
+        sent (list): Texts of the tweets "posted" so far.
+        rate_limited_until (float): Answer 429 until this Unix time.
+        error (Exception): Raised by the next ``create_tweet`` calls.
+    """
 
-        return None
+    sent = []
+    rate_limited_until = None
+    error = None
+    _ids = count(1)
+    _lock = threading.Lock()
+
+    def __init__(self, **credentials):
+        self.credentials = credentials
+
+    @classmethod
+    def reset(cls):
+        """
+        Forget sent tweets and simulated failures.
+        """
+        cls.sent = []
+        cls.rate_limited_until = None
+        cls.error = None
+
+    @staticmethod
+    def _response(status, body, headers=None):
+        response = requests.Response()
+        response.status_code = status
+        response._content = json.dumps(body).encode()  # pylint: disable=protected-access
+        response.headers.update(headers or {})
+        return response
+
+    def create_tweet(self, text, **kwargs):  # pylint: disable=unused-argument
+        """
+        Record the tweet and answer like the API, or fail as configured.
+        """
+        if self.error is not None:
+            raise self.error
+        if self.rate_limited_until and time.time() < self.rate_limited_until:
+            # tweepy keeps the response; the reset time is only in its headers
+            raise tweepy.TooManyRequests(
+                self._response(429, {'title': 'Too Many Requests'},
+                               {'x-rate-limit-reset':
+                                str(int(self.rate_limited_until))}))
+        with self._lock:
+            tweet_id = str(next(self._ids))
+            FakeClient.sent.append(text)
+        return self._response(201, {'data': {'id': tweet_id, 'text': text}})
@@ -0,0 +1,282 @@
+"""Load test of the read API under WSGI and ASGI, and of the outbox drains"""
+import asyncio
+import io
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from newsapp.functions import outbox
+from newsapp.functions.stubs import FakeTwitterServer, StubSMTPServer
+from newsapp.models import (
+    Article, Journalist, OutboxEvent, Publisher, Subscription
+)
+
+PREFIX = 'benchmark-asgi'
+HOST = 'localhost'
+
+
+def percentile(values, fraction):
+    """
+    The value below which ``fraction`` of the sorted ``values`` fall.
+    """
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    """
+    Compare WSGI and ASGI under concurrent load.
+
+    The HTTP part drives Django's WSGI handler from a thread pool, like a
+    threaded WSGI server, and its ASGI handler from one event loop, with
+    the same number of requests in flight, and reports requests/sec and
+    p50/p99 latency for:
+
+    * WSGI serving the sync API view,
+    * ASGI serving the same sync view (run in a thread by Django),
+    * ASGI serving the async view.
+
+    The outbox part queues publication events and processes them with the
+    sync ``drain`` and the async ``adrain`` against a stub SMTP server and
+    a fake Twitter endpoint that answer after a configurable delay.
+
+    Benchmark rows are deleted afterwards. Use a file database (e.g.
+    ``DB_ENGINE=sqlite``), since requests run on several connections.
+
+    Usage:
+        python manage.py benchmark_asgi --requests 2000 --concurrency 32
+    """
+
+    help = "Compare WSGI and ASGI throughput and the outbox pipelines."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--posts', type=int, default=200,
+                            help="Approved posts to serve and announce.")
+        parser.add_argument('--subscribers', type=int, default=3,
+                            help="Emails sent per announced post.")
+        parser.add_argument('--smtp-delay', type=float, default=0.02,
+                            help="Seconds the stub SMTP server takes per "
+                                 "message.")
+        parser.add_argument('--twitter-delay', type=float, default=0.1,
+                            help="Seconds the fake Twitter API takes per "
+                                 "tweet.")
+        parser.add_argument('--skip-http', action='store_true')
+        parser.add_argument('--skip-outbox', action='store_true')
+
+    def handle(self, *args, **options):
+        try:
+            posts = self.seed(options['posts'], options['subscribers'])
+            if not options['skip_http']:
+                self.benchmark_http(options)
+            if not options['skip_outbox']:
+                self.benchmark_outbox(posts, options)
+        finally:
+            self.cleanup()
+
+    # ---------------------- FIXTURES ----------------------
+    def seed(self, count, subscribers):
+        if User.objects.filter(username__startswith=PREFIX).exists():
+            raise CommandError(f"Leftover {PREFIX} users, delete them first")
+        publisher = Publisher.objects.create(
+            user=User.objects.create_user(username=f'{PREFIX}-publisher'))
+        journalist = Journalist.objects.create(
+            user=User.objects.create_user(username=f'{PREFIX}-journalist'),
+            publisher=publisher)
+        posts = Article.objects.bulk_create([
+            Article(title=f"Benchmark article {i}",
+                    content="Lorem ipsum dolor sit amet. " * 20,
+                    journalist=journalist, publisher=publisher,
+                    approved=True)
+            for i in range(count)
+        ])
+        Subscription.objects.bulk_create([
+            Subscription(
+                user=User.objects.create_user(
+                    username=f'{PREFIX}-reader{i}',
+                    email=f'reader{i}@benchmark.invalid'),
+                type='publisher', publisher=publisher)
+            for i in range(subscribers)
+        ])
+        self.publisher = publisher
+        return list(Article.objects.filter(
+            id__in=[post.id for post in posts]))
+
+    def cleanup(self):
+        Session.objects.filter(
+            session_key__in=getattr(self, 'session_keys', [])).delete()
+        OutboxEvent.objects.filter(
+            idempotency_key__in=getattr(self, 'event_keys', [])).delete()
+        User.objects.filter(username__startswith=PREFIX).delete()
+
+    def session_cookie(self):
+        client = Client()
+        client.force_login(User.objects.get(username=f'{PREFIX}-reader0'))
+        cookie = client.cookies['sessionid'].value
+        self.session_keys = [cookie]
+        return f'sessionid={cookie}'
+
+    # ---------------------- HTTP ----------------------
+    def benchmark_http(self, options):
+        cookie = self.session_cookie()
+        total, concurrency = options['requests'], options['concurrency']
+        self.stdout.write(f"{total} requests, {concurrency} in flight")
+
+        sync_path = reverse('news_app:api_articles')
+        async_path = reverse('news_app:api_articles_async')
+        with override_settings(ALLOWED_HOSTS=[HOST]):
+            self.report("WSGI sync view",
+                        self.wsgi_load(sync_path, cookie, total, concurrency))
+            self.report("ASGI sync view", asyncio.run(
+                self.asgi_load(sync_path, cookie, total, concurrency)))
+            self.report("ASGI async view", asyncio.run(
+                self.asgi_load(async_path, cookie, total, concurrency)))
+
+    def report(self, label, result):
+        seconds, latencies = result
+        latencies.sort()
+        self.stdout.write(
+            f"  {label:<16} {len(latencies) / seconds:8.1f} req/s  "
+            f"p50 {percentile(latencies, 0.5) * 1000:7.1f}ms  "
+            f"p99 {percentile(latencies, 0.99) * 1000:7.1f}ms")
+
+    def wsgi_load(self, path, cookie, total, concurrency):
+        handler = WSGIHandler()
+
+        def request(_):
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': path,
+                'QUERY_STRING': '', 'SERVER_NAME': HOST,
+                'SERVER_PORT': '80', 'HTTP_HOST': HOST,
+                'HTTP_COOKIE': cookie, 'wsgi.url_scheme': 'http',
+                'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+            }
+            statuses = []
+            started = time.perf_counter()
+            response = handler(environ,
+                               lambda status, headers: statuses.append(status))
+            b''.join(response)
+            response.close()
+            if not statuses[0].startswith('200'):
+                raise CommandError(f"WSGI {path}: {statuses[0]}")
+            return time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(request, range(total)))
+        return time.perf_counter() - started, latencies
+
+    async def asgi_load(self, path, cookie, total, concurrency):
+        handler = ASGIHandler()
+        semaphore = asyncio.Semaphore(concurrency)
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'},
+            'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': path, 'raw_path': path.encode(), 'query_string': b'',
+            'root_path': '', 'server': (HOST, 80),
+            'client': ('127.0.0.1', 50000),
+            'headers': [(b'host', HOST.encode()),
+                        (b'cookie', cookie.encode())],
+        }
+
+        async def request():
+            body_sent = False
+            statuses = []
+
+            async def receive():
+                nonlocal body_sent
+                if not body_sent:
+                    body_sent = True
+                    return {'type': 'http.request', 'body': b'',
+                            'more_body': False}
+                # The client never disconnects; Django cancels this wait
+                await asyncio.Future()
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.append(message['status'])
+
+            async with semaphore:
+                started = time.perf_counter()
+                await handler(dict(scope), receive, send)
+                if statuses[0] != 200:
+                    raise CommandError(f"ASGI {path}: {statuses[0]}")
+                return time.perf_counter() - started
+
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(request() for _ in range(total)))
+        return time.perf_counter() - started, list(latencies)
+
+    # ---------------------- OUTBOX ----------------------
+    def benchmark_outbox(self, posts, options):
+        for post in posts:
+            outbox.enqueue_publication('article', post, self.publisher)
+        events = OutboxEvent.objects.filter(
+            payload__post_id__in=[post.id for post in posts],
+            kind__in=['email', 'tweet'])
+        self.event_keys = list(OutboxEvent.objects.filter(
+            payload__post_id__in=[post.id for post in posts]
+        ).values_list('idempotency_key', flat=True))
+        count = events.count()
+        self.stdout.write(
+            f"{count} outbox events, SMTP {options['smtp_delay']}s/message, "
+            f"Twitter {options['twitter_delay']}s/tweet")
+
+        with StubSMTPServer(options['smtp_delay']) as smtp, \
+                FakeTwitterServer(options['twitter_delay']) as twitter, \
+                override_settings(
+                    EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                    EMAIL_HOST='127.0.0.1', EMAIL_PORT=smtp.port,
+                    EMAIL_USE_TLS=False, EMAIL_USE_SSL=False,
+                    EMAIL_HOST_PASSWORD='', TWITTER_API_URL=twitter.url,
+                    TWITTER_CONSUMER_KEY='benchmark',
+                    TWITTER_CONSUMER_SECRET='benchmark',
+                    TWITTER_ACCESS_TOKEN='benchmark',
+                    TWITTER_ACCESS_TOKEN_SECRET='benchmark',
+                    NEWSAPP_TWITTER_CLIENT='tweepy.Client',
+                    NEWSAPP_TWEET_RATE_LIMIT=1000000):
+            kinds = ['email', 'tweet']
+            self.report_drain("sync drain", count, self.run_drain(
+                lambda: outbox.drain(batch_size=count, kinds=kinds)))
+
+            self.reset(events)
+            concurrency = options['concurrency']
+            self.report_drain(f"async x{concurrency}", count, self.run_drain(
+                lambda: asyncio.run(outbox.adrain(
+                    batch_size=count, kinds=kinds,
+                    concurrency=concurrency))))
+            self.stdout.write(f"  stubs received {smtp.received} emails, "
+                              f"{twitter.received} tweets")
+
+    def reset(self, events):
+        for event in events:
+            event.payload.pop('resume_after', None)
+            event.payload.pop('delivery', None)
+            event.status = 'pending'
+            event.attempts = 0
+            event.last_error = ''
+            event.available_at = timezone.now()
+            event.save()
+
+    def run_drain(self, drain):
+        started = time.perf_counter()
+        failed = 0
+        while True:
+            done, batch_failed = drain()
+            failed += batch_failed
+            if not done and not batch_failed:
+                break
+        return time.perf_counter() - started, failed
+
+    def report_drain(self, label, count, result):
+        seconds, failed = result
+        self.stdout.write(f"  {label:<16} {count / seconds:8.1f} events/s  "
+                          f"{seconds:6.2f}s  ({failed} failed)")
@@ -0,0 +1,173 @@
+"""Latency of the read API with a new database connection per request
+and with persistent connections"""
+import io
+import sys
+import time
+from contextlib import contextmanager
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from newsapp.functions.instrumentation import (
+    install_connection_timer, registry
+)
+from newsapp.models import Article, Journalist, Publisher
+from .benchmark_asgi import percentile
+
+PREFIX = 'benchmark-connections'
+HOST = 'localhost'
+
+# (label, CONN_MAX_AGE, CONN_HEALTH_CHECKS)
+MODES = (
+    ("new connection", 0, False),
+    ("persistent", 300, True),
+)
+
+
+class Command(BaseCommand):
+    """
+    Serve ``api_articles`` through Django's WSGI handler, as a sync worker
+    does, once with ``CONN_MAX_AGE = 0`` (a connection per request, the
+    default) and once with the persistent, health-checked connections of
+    ``settings_production``, and report p50/p95 latency, connections
+    opened, time spent opening them and the connection reuse ratio.
+
+    Run it against MariaDB to measure the real handshake. On SQLite
+    opening a connection costs next to nothing, so ``--handshake-ms``
+    adds a delay to every new connection to stand in for the network
+    round trips.
+
+    Usage:
+        python manage.py benchmark_connections --requests 1000
+        DB_ENGINE=sqlite python manage.py benchmark_connections \\
+            --handshake-ms 3
+    """
+
+    help = "Compare per-request and persistent database connections."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=100,
+                            help="Approved posts to serve.")
+        parser.add_argument('--handshake-ms', type=float, default=0,
+                            help="Delay added to each new connection.")
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith=PREFIX).exists():
+            raise CommandError(f"Leftover {PREFIX} users, delete them first")
+        install_connection_timer()
+        try:
+            cookie = self.seed(options['posts'])
+            self.stdout.write(f"{options['requests']} sequential requests "
+                              f"to api_articles")
+            with override_settings(ALLOWED_HOSTS=[HOST]), \
+                    self.handshake(options['handshake_ms'] / 1000):
+                for label, max_age, health_checks in MODES:
+                    with self.connections(max_age, health_checks):
+                        self.run(label, cookie, options['requests'])
+        finally:
+            Session.objects.filter(
+                session_key__in=getattr(self, 'session_keys', [])).delete()
+            User.objects.filter(username__startswith=PREFIX).delete()
+
+    def seed(self, count):
+        publisher = Publisher.objects.create(
+            user=User.objects.create_user(username=f'{PREFIX}-publisher'))
+        journalist = Journalist.objects.create(
+            user=User.objects.create_user(username=f'{PREFIX}-journalist'),
+            publisher=publisher)
+        Article.objects.bulk_create([
+            Article(title=f"Benchmark article {i}",
+                    content="Lorem ipsum dolor sit amet. " * 20,
+                    journalist=journalist, publisher=publisher,
+                    approved=True)
+            for i in range(count)
+        ])
+        client = Client()
+        client.force_login(journalist.user)
+        cookie = client.cookies['sessionid'].value
+        self.session_keys = [cookie]
+        return f'sessionid={cookie}'
+
+    @contextmanager
+    def connections(self, max_age, health_checks):
+        """
+        Switch every alias to ``max_age`` and ``health_checks``. Both are
+        read when a connection opens, so open ones are closed first.
+        """
+        saved = {}
+        connections.close_all()
+        for alias in connections:
+            settings_dict = connections.settings[alias]
+            saved[alias] = (settings_dict['CONN_MAX_AGE'],
+                            settings_dict['CONN_HEALTH_CHECKS'])
+            settings_dict['CONN_MAX_AGE'] = max_age
+            settings_dict['CONN_HEALTH_CHECKS'] = health_checks
+        try:
+            yield
+        finally:
+            connections.close_all()
+            for alias, (max_age, health_checks) in saved.items():
+                settings_dict = connections.settings[alias]
+                settings_dict['CONN_MAX_AGE'] = max_age
+                settings_dict['CONN_HEALTH_CHECKS'] = health_checks
+
+    @contextmanager
+    def handshake(self, seconds):
+        """
+        Make every new connection take ``seconds`` longer.
+        """
+        wrapper = type(connections['default'])
+        original = wrapper.get_new_connection
+
+        def get_new_connection(self, conn_params):
+            time.sleep(seconds)
+            return original(self, conn_params)
+
+        if seconds:
+            wrapper.get_new_connection = get_new_connection
+        try:
+            yield
+        finally:
+            wrapper.get_new_connection = original
+
+    def run(self, label, cookie, total):
+        handler = WSGIHandler()
+        path = reverse('news_app:api_articles')
+        before = registry.connection_totals()
+        latencies = []
+        for _ in range(total):
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': path,
+                'QUERY_STRING': '', 'SERVER_NAME': HOST,
+                'SERVER_PORT': '80', 'HTTP_HOST': HOST,
+                'HTTP_COOKIE': cookie, 'wsgi.url_scheme': 'http',
+                'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+            }
+            statuses = []
+            started = time.perf_counter()
+            # The handler's request_started/finished signals close or keep
+            # the connection according to CONN_MAX_AGE
+            response = handler(environ,
+                               lambda status, headers: statuses.append(status))
+            b''.join(response)
+            response.close()
+            latencies.append(time.perf_counter() - started)
+            if not statuses[0].startswith('200'):
+                raise CommandError(f"{path}: {statuses[0]}")
+
+        after = registry.connection_totals()
+        opened = after['opened'] - before['opened']
+        connect_ms = (after['connect_seconds']
+                      - before['connect_seconds']) * 1000
+        latencies.sort()
+        self.stdout.write(
+            f"  {label:<15} p50 {percentile(latencies, 0.5) * 1000:6.2f}ms  "
+            f"p95 {percentile(latencies, 0.95) * 1000:6.2f}ms  "
+            f"{opened:5d} connections "
+            f"({connect_ms / max(opened, 1):.2f}ms each)  "
+            f"reuse {1 - opened / total:6.1%}")
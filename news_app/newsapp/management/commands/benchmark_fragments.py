@@ -0,0 +1,118 @@
+"""Render time of the article list with and without cached rows"""
+import time
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.urls import reverse
+from newsapp.functions.fragments import listing_context
+from newsapp.models import Article, Editor, Journalist, Newsletter, Publisher
+from .benchmark_asgi import percentile
+
+PREFIX = 'benchmark-fragments'
+CACHE_ALIAS = 'benchmark-fragments'
+
+# (label, cache backend holding the rows)
+MODES = (
+    ("uncached", 'django.core.cache.backends.dummy.DummyCache'),
+    ("cached", 'django.core.cache.backends.locmem.LocMemCache'),
+)
+
+
+class Command(BaseCommand):
+    """
+    Render ``article_list.html`` for a reader, an editor and a publisher
+    over the same posts, once with every row rendered on each request
+    (a dummy row cache, as before rows were cached) and once with the
+    rows served from a warm cache, and report the render time per 1,000
+    rows.
+
+    The posts are read from the database once and reused, so the timings
+    cover building the context and rendering the template only. Rows go
+    to a private local-memory cache, never the configured one.
+
+    Usage:
+        python manage.py benchmark_fragments --rows 1000 --repeat 20
+    """
+
+    help = "Compare article list render time with and without cached rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000,
+                            help="Articles and newsletters, together.")
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith=PREFIX).exists():
+            raise CommandError(f"Leftover {PREFIX} users, delete them first")
+        try:
+            viewers, publisher = self.seed(options['rows'])
+            articles = list(Article.objects.filter(publisher=publisher)
+                            .for_listing())
+            newsletters = list(Newsletter.objects.filter(publisher=publisher)
+                               .for_listing())
+            rows = len(articles) + len(newsletters)
+            self.stdout.write(f"{rows} rows, p50/p95 of {options['repeat']} "
+                              f"renders, per 1000 rows")
+            for label, backend in MODES:
+                with override_settings(
+                        CACHES={**settings.CACHES,
+                                CACHE_ALIAS: {
+                                    'BACKEND': backend,
+                                    'LOCATION': CACHE_ALIAS,
+                                    'OPTIONS': {'MAX_ENTRIES': 4 * rows},
+                                }},
+                        NEWSAPP_OBJECT_CACHE=CACHE_ALIAS):
+                    for role, user in viewers:
+                        timings = self.run(user, articles, newsletters,
+                                           options['repeat'])
+                        scale = 1000 / rows * 1000
+                        self.stdout.write(
+                            f"  {label:<9} {role:<10} "
+                            f"p50 {percentile(timings, 0.5) * scale:8.2f}ms  "
+                            f"p95 {percentile(timings, 0.95) * scale:8.2f}ms")
+        finally:
+            User.objects.filter(username__startswith=PREFIX).delete()
+
+    def seed(self, count):
+        publisher = Publisher.objects.create(
+            user=User.objects.create_user(username=f'{PREFIX}-publisher'))
+        journalist = Journalist.objects.create(
+            user=User.objects.create_user(username=f'{PREFIX}-journalist'),
+            publisher=publisher)
+        editor = Editor.objects.create(
+            user=User.objects.create_user(username=f'{PREFIX}-editor'),
+            publisher=publisher)
+        reader = User.objects.create_user(username=f'{PREFIX}-reader')
+        # Four articles to a newsletter, one post in five pending
+        posts = {Article: [], Newsletter: []}
+        for i in range(count):
+            model = Newsletter if i % 5 == 4 else Article
+            posts[model].append(model(
+                title=f"Benchmark post {i}", content="Lorem ipsum",
+                journalist=journalist, publisher=publisher,
+                approved=i % 5 != 0))
+        for model, objects in posts.items():
+            model.objects.bulk_create(objects)
+        viewers = [('reader', reader), ('editor', editor.user),
+                   ('publisher', publisher.user)]
+        return viewers, publisher
+
+    def run(self, user, articles, newsletters, repeat):
+        request = RequestFactory().get(reverse('news_app:article_list'))
+        timings = []
+        # One extra, untimed render fills the cache
+        for attempt in range(repeat + 1):
+            # A fresh user per render, as each request loads one
+            request.user = User.objects.get(pk=user.pk)
+            started = time.perf_counter()
+            render_to_string('newsapp/article_list.html',
+                             listing_context(request.user, articles,
+                                             newsletters),
+                             request=request)
+            if attempt:
+                timings.append(time.perf_counter() - started)
+        timings.sort()
+        return timings
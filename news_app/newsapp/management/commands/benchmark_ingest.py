@@ -0,0 +1,96 @@
+"""Compare one-request-per-article creation with the bulk import"""
+import json
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from newsapp.functions.ingest import import_posts
+from newsapp.models import (
+    Article, ArticleImportSerializer, Journalist, Publisher
+)
+
+PREFIX = 'benchmark-ingest'
+
+
+class Command(BaseCommand):
+    """
+    Create the same articles three ways and report rows/sec:
+
+    * one POST to ``api_create_article`` per article, as the wire-service
+      importer does today,
+    * one NDJSON POST to the bulk endpoint,
+    * ``import_posts`` directly, as ``import_articles`` does.
+
+    Requests go through Django's full handler in-process, so the figures
+    leave out the network. Benchmark rows are deleted afterwards.
+
+    Usage:
+        python manage.py benchmark_ingest --rows 2000
+    """
+
+    help = "Compare per-request article creation with the bulk import."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2000)
+        parser.add_argument('--single-rows', type=int, default=300,
+                            help="Rows created one request at a time.")
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith=PREFIX).exists():
+            raise CommandError(f"Leftover {PREFIX} users, delete them first")
+        try:
+            publisher = Publisher.objects.create(
+                user=User.objects.create_user(username=f'{PREFIX}-publisher'))
+            journalist = Journalist.objects.create(
+                user=User.objects.create_user(username=f'{PREFIX}-journalist'),
+                publisher=publisher)
+            self.benchmark(journalist, options)
+        finally:
+            User.objects.filter(username__startswith=PREFIX).delete()
+
+    def benchmark(self, journalist, options):
+        rows = [{'title': f"Wire story {i}",
+                 'content': "Lorem ipsum dolor sit amet. " * 40}
+                for i in range(options['rows'])]
+        client = Client()
+        client.force_login(journalist.user)
+
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            path = reverse('news_app:api_create_article')
+            single = rows[:options['single_rows']]
+            started = time.perf_counter()
+            for row in single:
+                response = client.post(path, row,
+                                       content_type='application/json')
+                if response.status_code != 201:
+                    raise CommandError(f"Create: {response.status_code}")
+            per_request = self.report("one request each", len(single),
+                                      time.perf_counter() - started)
+
+            body = b''.join(json.dumps(row).encode() + b'\n' for row in rows)
+            started = time.perf_counter()
+            response = client.post(reverse('news_app:api_import_articles'),
+                                   body, content_type='application/x-ndjson')
+            if response.status_code != 201:
+                raise CommandError(f"Bulk: {response.status_code}")
+            bulk = self.report("bulk endpoint", len(rows),
+                               time.perf_counter() - started)
+
+        started = time.perf_counter()
+        import_posts(body.splitlines(), 'ndjson', ArticleImportSerializer,
+                     journalist)
+        direct = self.report("import_posts", len(rows),
+                             time.perf_counter() - started)
+
+        self.stdout.write(f"Bulk endpoint x{bulk / per_request:.1f}, "
+                          f"import_posts x{direct / per_request:.1f} the "
+                          f"per-request rate")
+        Article.objects.filter(journalist=journalist).delete()
+
+    def report(self, label, count, seconds):
+        rate = count / seconds
+        self.stdout.write(f"  {label:<18} {rate:8.0f} rows/s  "
+                          f"({count} rows in {seconds:.2f}s)")
+        return rate
@@ -0,0 +1,107 @@
+"""Micro-benchmark of the DRF serializers against their fast path"""
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from newsapp.functions.fast_serializers import dumps, fast_serializer, orjson
+from newsapp.models import (
+    Article, ArticleSerializer, Journalist, Newsletter, NewsletterSerializer,
+    Publisher
+)
+
+
+class Rollback(Exception):
+    """
+    Raised to discard the benchmark rows.
+    """
+
+
+class Command(BaseCommand):
+    """
+    Serialize a list of posts through DRF and through the fast path,
+    check the bytes match and report the timings.
+
+    Rows are created inside a transaction that is rolled back, so the
+    command can run against any database.
+
+    Usage:
+        python manage.py benchmark_serializers --rows 1000 --repeat 20
+    """
+
+    help = "Compare DRF and fast-path serialization of article lists."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options['rows'], options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, rows):
+        publisher = Publisher.objects.create(
+            user=User.objects.create_user(username='benchmark-publisher'))
+        journalist = Journalist.objects.create(
+            user=User.objects.create_user(username='benchmark-journalist'),
+            publisher=publisher)
+        for model in (Article, Newsletter):
+            model.objects.bulk_create([
+                model(title=f"Benchmark post {i}",
+                      content="Lorem ipsum dolor sit amet. " * 20,
+                      journalist=journalist, publisher=publisher,
+                      approved=True)
+                for i in range(rows)
+            ])
+
+    def time(self, function, repeat):
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = function()
+            best = min(best, time.perf_counter() - started)
+        return best, result
+
+    def run(self, rows, repeat):
+        self.seed(rows)
+        self.stdout.write(f"{rows} rows, best of {repeat}, "
+                          f"orjson {'on' if orjson else 'off'}")
+
+        for model, serializer_class in ((Article, ArticleSerializer),
+                                        (Newsletter, NewsletterSerializer)):
+            queryset = model.objects.published().order_by('id')
+            fast = fast_serializer(serializer_class)
+
+            drf_seconds, drf_body = self.time(
+                lambda: JSONRenderer().render(
+                    serializer_class(queryset, many=True).data), repeat)
+            fast_seconds, fast_body = self.time(
+                lambda: dumps(fast.many(fast.rows(queryset))), repeat)
+
+            if drf_body != fast_body:
+                raise CommandError(
+                    f"{serializer_class.__name__}: output differs")
+            self.report(f"{serializer_class.__name__} query+render",
+                        drf_seconds, fast_seconds)
+
+            # Serialization alone, with the rows already fetched
+            instances = list(queryset)
+            tuples = list(fast.rows(queryset))
+            drf_seconds, _ = self.time(
+                lambda: JSONRenderer().render(
+                    serializer_class(instances, many=True).data), repeat)
+            fast_seconds, _ = self.time(
+                lambda: dumps(fast.many(tuples)), repeat)
+            self.report(f"{serializer_class.__name__} render",
+                        drf_seconds, fast_seconds)
+            self.stdout.write(f"  {len(fast_body)} identical bytes")
+
+    def report(self, label, drf_seconds, fast_seconds):
+        self.stdout.write(
+            f"{label:<34} DRF {drf_seconds * 1000:8.2f}ms  "
+            f"fast {fast_seconds * 1000:8.2f}ms  "
+            f"x{drf_seconds / fast_seconds:5.1f}")
@@ -0,0 +1,248 @@
+"""Throughput of the production gunicorn setup as workers are added"""
+import http.client
+import importlib.util
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+from newsapp.models import Article, Journalist, Publisher
+from .benchmark_asgi import percentile
+
+PREFIX = 'benchmark-serving'
+HOST = '127.0.0.1'
+CONFIG = os.path.join(settings.BASE_DIR, 'gunicorn.conf.py')
+
+
+def default_workers():
+    """
+    1, 2, 4, ... up to the number of cores, and the number of cores.
+    """
+    cores = os.cpu_count() or 1
+    counts = {cores}
+    count = 1
+    while count < cores:
+        counts.add(count)
+        count *= 2
+    return sorted(counts)
+
+
+def drive(port, path, cookie, connections_count, start, deadline):
+    """
+    Keep ``connections_count`` keep-alive connections busy with GETs of
+    ``path`` until ``deadline`` and time the responses received after
+    ``start``. Runs in a load generator process.
+
+    Returns:
+        tuple: (latencies in seconds, number of failed requests)
+    """
+    def loop():
+        latencies, errors = [], 0
+        conn = http.client.HTTPConnection(HOST, port, timeout=30)
+        while time.time() < deadline:
+            began = time.time()
+            try:
+                conn.request('GET', path, headers={'Cookie': cookie})
+                response = conn.getresponse()
+                response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection(HOST, port, timeout=30)
+                ok = False
+            if began >= start:
+                if ok:
+                    latencies.append(time.time() - began)
+                else:
+                    errors += 1
+        conn.close()
+        return latencies, errors
+
+    with ThreadPoolExecutor(connections_count) as pool:
+        results = [pool.submit(loop) for _ in range(connections_count)]
+    latencies, errors = [], 0
+    for future in results:
+        result = future.result()
+        latencies.extend(result[0])
+        errors += result[1]
+    return latencies, errors
+
+
+class Command(BaseCommand):
+    """
+    Start gunicorn with ``gunicorn.conf.py`` and the production settings,
+    as the Docker image does, once per worker count, load ``api_articles``
+    over HTTP for a fixed time and report requests/sec, p50/p95 latency
+    and the speed-up over the first worker count.
+
+    Load comes from several client processes with keep-alive connections.
+    They share the machine with the server, so throughput stops growing
+    before the last core; the trend between worker counts is what to
+    compare. Threads per worker stay fixed (``--threads``) so only the
+    number of processes changes.
+
+    The benchmark rows are deleted afterwards. gunicorn must be
+    installed, and the database must be one the server processes can
+    open too (MariaDB or a SQLite file).
+
+    Usage:
+        python manage.py benchmark_serving --workers 1,2,4,8 --duration 10
+        DB_ENGINE=sqlite python manage.py benchmark_serving
+    """
+
+    help = "Measure throughput as gunicorn workers are added."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', default=None,
+                            help="Comma-separated worker counts (default "
+                                 "1, 2, 4, ... up to the core count).")
+        parser.add_argument('--threads', type=int, default=2,
+                            help="Threads per worker.")
+        parser.add_argument('--duration', type=float, default=10,
+                            help="Seconds of measured load per run.")
+        parser.add_argument('--warmup', type=float, default=2,
+                            help="Seconds of unmeasured load per run.")
+        parser.add_argument('--clients', type=int, default=None,
+                            help="Load generator processes (default: "
+                                 "one per core).")
+        parser.add_argument('--connections', type=int, default=None,
+                            help="Open connections in total (default: "
+                                 "twice the largest workers * threads).")
+        parser.add_argument('--posts', type=int, default=100,
+                            help="Approved posts to serve.")
+        parser.add_argument('--port', type=int, default=8765)
+
+    def handle(self, *args, **options):
+        if importlib.util.find_spec('gunicorn') is None:
+            raise CommandError("gunicorn is not installed "
+                               "(pip install -r requirements.txt)")
+        if User.objects.filter(username__startswith=PREFIX).exists():
+            raise CommandError(f"Leftover {PREFIX} users, delete them first")
+        workers = ([int(count) for count in options['workers'].split(',')]
+                   if options['workers'] else default_workers())
+        clients = options['clients'] or os.cpu_count() or 1
+        total = (options['connections']
+                 or 2 * max(workers) * options['threads'])
+        cache_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = cache_dir.name
+        try:
+            cookie = self.seed(options['posts'])
+            # The load generators are forked and must not inherit it
+            connections.close_all()
+            self.stdout.write(
+                f"{os.cpu_count()} cores, {options['threads']} threads per "
+                f"worker, {total} connections from {clients} client "
+                f"processes, {options['duration']:g}s per run")
+            baseline = None
+            for count in workers:
+                rate = self.run(count, cookie, clients, total, options)
+                baseline = baseline or rate
+                self.stdout.write(f"    speed-up x{rate / baseline:.2f}")
+        finally:
+            Session.objects.filter(
+                session_key__in=getattr(self, 'session_keys', [])).delete()
+            User.objects.filter(username__startswith=PREFIX).delete()
+            cache_dir.cleanup()
+
+    def seed(self, count):
+        publisher = Publisher.objects.create(
+            user=User.objects.create_user(username=f'{PREFIX}-publisher'))
+        journalist = Journalist.objects.create(
+            user=User.objects.create_user(username=f'{PREFIX}-journalist'),
+            publisher=publisher)
+        Article.objects.bulk_create([
+            Article(title=f"Benchmark article {i}",
+                    content="Lorem ipsum dolor sit amet. " * 20,
+                    journalist=journalist, publisher=publisher,
+                    approved=True)
+            for i in range(count)
+        ])
+        client = Client()
+        client.force_login(journalist.user)
+        cookie = client.cookies['sessionid'].value
+        self.session_keys = [cookie]
+        return f'sessionid={cookie}'
+
+    def start_server(self, workers, threads, port):
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': 'news_app.settings_production',
+            'DJANGO_ALLOWED_HOSTS': HOST,
+            'WEB_CONCURRENCY': str(workers),
+            'GUNICORN_THREADS': str(threads),
+            'GUNICORN_BIND': f'{HOST}:{port}',
+            'GUNICORN_ACCESS_LOG': os.devnull,
+            # The session cookie was signed with this process's key
+            'DJANGO_SECRET_KEY': settings.SECRET_KEY,
+            # Without REDIS_URL the workers share a file cache
+            'CACHE_DIR': os.getenv('CACHE_DIR') or self.cache_dir,
+        }
+        # A file rather than a pipe, which would block a chatty server
+        self.server_log = tempfile.TemporaryFile()
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--config', CONFIG],
+            env=env, stdout=subprocess.DEVNULL, stderr=self.server_log)
+        waited = time.monotonic() + 30
+        while time.monotonic() < waited:
+            if server.poll() is not None:
+                self.server_log.seek(0)
+                raise CommandError("gunicorn exited:\n"
+                                   + self.server_log.read().decode())
+            try:
+                socket.create_connection((HOST, port), timeout=1).close()
+                return server
+            except OSError:
+                time.sleep(0.2)
+        self.stop_server(server)
+        raise CommandError(f"gunicorn did not listen on {HOST}:{port}")
+
+    def stop_server(self, server):
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            server.wait()
+        self.server_log.close()
+
+    def run(self, workers, cookie, clients, total, options):
+        path = reverse('news_app:api_articles')
+        server = self.start_server(workers, options['threads'],
+                                   options['port'])
+        try:
+            start = time.time() + options['warmup']
+            deadline = start + options['duration']
+            shares = [total // clients + (i < total % clients)
+                      for i in range(clients)]
+            with ProcessPoolExecutor(clients) as pool:
+                results = [pool.submit(drive, options['port'], path, cookie,
+                                       share, start, deadline)
+                           for share in shares if share]
+                latencies, errors = [], 0
+                for future in results:
+                    result = future.result()
+                    latencies.extend(result[0])
+                    errors += result[1]
+        finally:
+            self.stop_server(server)
+
+        if not latencies:
+            raise CommandError(f"{path}: no successful responses")
+        latencies.sort()
+        rate = len(latencies) / options['duration']
+        self.stdout.write(
+            f"  {workers:3d} workers {rate:9.1f} req/s  "
+            f"p50 {percentile(latencies, 0.5) * 1000:7.2f}ms  "
+            f"p95 {percentile(latencies, 0.95) * 1000:7.2f}ms  "
+            f"{errors} errors")
+        return rate
@@ -0,0 +1,64 @@
+"""Worker that processes queued publishing side effects"""
+import asyncio
+import time
+from django.core.management.base import BaseCommand
+from newsapp.functions import outbox, search
+
+
+class Command(BaseCommand):
+    """
+    Drain the outbox, sending subscriber emails and tweets with retries.
+
+    Between batches it also compacts the search journal once it is due,
+    so web requests never do.
+
+    Usage:
+        python manage.py drain_outbox            # run until stopped
+        python manage.py drain_outbox --once     # process due events and exit
+        python manage.py drain_outbox --concurrency 20   # overlap slow I/O
+    """
+
+    help = "Process queued emails and tweets for published posts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help="Exit once no due events remain.")
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--max-attempts', type=int,
+                            default=outbox.MAX_ATTEMPTS)
+        parser.add_argument('--interval', type=float, default=2.0,
+                            help="Seconds to sleep when the outbox is empty.")
+        parser.add_argument('--kind', action='append',
+                            choices=list(outbox.HANDLERS),
+                            help="Only process this kind (repeatable).")
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help="Events handled at once; above 1 the "
+                                 "async pipeline is used.")
+
+    def handle(self, *args, **options):
+        while True:
+            succeeded, failed = self.drain(options)
+            if search.compact_index():
+                self.stdout.write("Compacted the search journal")
+            if succeeded or failed:
+                self.stdout.write(
+                    f"Processed {succeeded + failed} events "
+                    f"({succeeded} ok, {failed} failed)")
+                continue
+            if options['once']:
+                return
+            time.sleep(options['interval'])
+
+    def drain(self, options):
+        """
+        Process one batch with the sync or async pipeline.
+        """
+        batch = {
+            'batch_size': options['batch_size'],
+            'max_attempts': options['max_attempts'],
+            'kinds': options['kind'],
+        }
+        if options['concurrency'] > 1:
+            return asyncio.run(outbox.adrain(
+                concurrency=options['concurrency'], **batch))
+        return outbox.drain(**batch)
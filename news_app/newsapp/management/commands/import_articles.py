@@ -0,0 +1,84 @@
+"""Bulk import articles or newsletters from an NDJSON or CSV file"""
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from newsapp.functions.ingest import (
+    IMPORT_CHUNK_SIZE, IMPORT_FORMATS, import_posts
+)
+from newsapp.models import (
+    ArticleImportSerializer, Journalist, NewsletterImportSerializer
+)
+
+SERIALIZERS = {
+    'article': ArticleImportSerializer,
+    'newsletter': NewsletterImportSerializer,
+}
+
+
+class Command(BaseCommand):
+    """
+    Import posts for a journalist, like the bulk API endpoints.
+
+    Rows need a title and content; NDJSON has one JSON object per line and
+    CSV a header row. The format follows the file extension unless
+    ``--format`` is given. Invalid rows are listed by number and skipped.
+
+    Usage:
+        python manage.py import_articles wire.ndjson --journalist reuters
+        cat wire.csv | python manage.py import_articles - --format csv \\
+            --journalist reuters --type newsletter
+    """
+
+    help = "Import articles or newsletters from an NDJSON or CSV file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or - for stdin.")
+        parser.add_argument('--journalist', required=True,
+                            help="Username of the author.")
+        parser.add_argument('--type', choices=list(SERIALIZERS),
+                            default='article')
+        parser.add_argument('--format', choices=list(IMPORT_FORMATS))
+        parser.add_argument('--chunk-size', type=int,
+                            default=IMPORT_CHUNK_SIZE,
+                            help="Rows validated and committed together.")
+        parser.add_argument('--batch-size', type=int,
+                            help="Rows per INSERT statement.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or path.rsplit('.', 1)[-1].lower()
+        if fmt not in IMPORT_FORMATS:
+            raise CommandError("Pass --format ndjson or --format csv")
+
+        journalist = (Journalist.objects.select_related('publisher')
+                      .filter(user__username=options['journalist']).first())
+        if journalist is None:
+            raise CommandError(f"No journalist {options['journalist']!r}")
+        if journalist.publisher is None:
+            raise CommandError(f"{journalist} has no publisher")
+
+        started = time.perf_counter()
+        if path == '-':
+            report = self.run(sys.stdin.buffer, fmt, journalist, options)
+        else:
+            try:
+                with open(path, 'rb') as stream:
+                    report = self.run(stream, fmt, journalist, options)
+            except OSError as e:
+                raise CommandError(e) from e
+        seconds = time.perf_counter() - started
+
+        for error in report.errors:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        if report.failed > len(report.errors):
+            self.stderr.write(
+                f"... and {report.failed - len(report.errors)} more")
+        self.stdout.write(
+            f"{report.created} {options['type']}s created, "
+            f"{report.failed} rows rejected in {seconds:.2f}s "
+            f"({report.rows / seconds if seconds else 0:.0f} rows/s)")
+
+    def run(self, stream, fmt, journalist, options):
+        return import_posts(stream, fmt, SERIALIZERS[options['type']],
+                            journalist, chunk_size=options['chunk_size'],
+                            batch_size=options['batch_size'])
@@ -0,0 +1,44 @@
+"""Rebuild the full-text search index from the database"""
+import time
+from django.core.management.base import BaseCommand
+from newsapp.functions import search
+
+
+class Command(BaseCommand):
+    """
+    Index every approved article and newsletter from scratch, or fold the
+    journal of changes into the snapshot.
+
+    Usage:
+        python manage.py rebuild_search_index
+        python manage.py rebuild_search_index --query "election results"
+        python manage.py rebuild_search_index --compact
+    """
+
+    help = "Rebuild the search index for approved articles and newsletters."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--compact', action='store_true',
+                            help="Compact the journal instead of "
+                                 "rebuilding.")
+        parser.add_argument('--query',
+                            help="Run this query afterwards and report "
+                                 "its latency.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['compact']:
+            search.compact_index(force=True)
+            self.stdout.write(f"Compacted the journal in "
+                              f"{time.perf_counter() - started:.2f}s")
+        else:
+            count = search.rebuild_index()
+            self.stdout.write(f"Indexed {count} posts in "
+                              f"{time.perf_counter() - started:.2f}s")
+
+        if options['query']:
+            search.search(options['query'])  # warm up
+            started = time.perf_counter()
+            results = search.search(options['query'])
+            self.stdout.write(f"{results.total} matches in "
+                              f"{(time.perf_counter() - started) * 1000:.2f}ms")
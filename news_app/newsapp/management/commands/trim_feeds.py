@@ -0,0 +1,31 @@
+"""Cap personal feeds at their maximum length"""
+import time
+from django.core.management.base import BaseCommand
+from newsapp.functions.feed import trim_feeds
+
+
+class Command(BaseCommand):
+    """
+    Delete the oldest entries of every feed holding more than
+    ``NEWSAPP_FEED_MAX_LENGTH``.
+
+    Fan-out only ever adds entries, so run this periodically, e.g. hourly
+    from cron, to keep feeds and their index small.
+
+    Usage:
+        python manage.py trim_feeds
+        python manage.py trim_feeds --max-length 200
+    """
+
+    help = "Delete feed entries beyond each reader's maximum feed length."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-length', type=int,
+                            help="Entries kept per feed (defaults to "
+                                 "NEWSAPP_FEED_MAX_LENGTH).")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        deleted = trim_feeds(max_length=options['max_length'])
+        self.stdout.write(f"Deleted {deleted} feed entries in "
+                          f"{time.perf_counter() - started:.2f}s")
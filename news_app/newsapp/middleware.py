@@ -0,0 +1,167 @@
+'''Request instrumentation middleware'''
+import cProfile
+import io
+import logging
+import pstats
+import time
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from .functions.instrumentation import (
+    RequestStats, duplicate_warning_setting, enabled_setting, instrument,
+    install_connection_timer, install_template_timer, registry
+)
+from .routers import read_from_replica, replicas_setting
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+logger = logging.getLogger('newsapp.requests')
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_LINES = 60
+
+# Cookie holding the time until which a user reads from the primary
+PRIMARY_COOKIE = 'newsapp_primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def sticky_seconds_setting():
+    """
+    Seconds a user keeps reading from the primary after writing
+    (``NEWSAPP_REPLICA_STICKY_SECONDS``); cover the replication lag.
+    """
+    return getattr(settings, 'NEWSAPP_REPLICA_STICKY_SECONDS', 10)
+
+
+def is_internal(request):
+    """
+    Check whether a request comes from one of ``INTERNAL_IPS``.
+    """
+    return request.META.get('REMOTE_ADDR') in settings.INTERNAL_IPS
+
+
+class InstrumentationMiddleware:
+    """
+    Record wall time, SQL queries, database connections opened and
+    template render time per URL name.
+
+    Opt-in with ``NEWSAPP_INSTRUMENTATION``; when it is off Django drops
+    the middleware at startup, so it costs nothing. Every request adds to
+    the totals served by ``views.metrics`` and is logged as one structured
+    record on the ``newsapp.requests`` logger, as a warning when it runs
+    ``NEWSAPP_DUPLICATE_QUERY_WARNING`` or more duplicate queries.
+
+    Requests from ``INTERNAL_IPS`` carrying an ``X-Profile`` header are
+    profiled and answered with the report instead of the page:
+    ``X-Profile: 1`` uses cProfile, ``X-Profile: pyinstrument`` the
+    sampling profiler when it is installed.
+
+    Place it first in ``MIDDLEWARE`` so the session and authentication
+    queries are counted too.
+    """
+
+    def __init__(self, get_response):
+        if not enabled_setting():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        install_template_timer()
+        install_connection_timer()
+
+    def __call__(self, request):
+        if PROFILE_HEADER in request.headers and is_internal(request):
+            return self.profile(request)
+
+        stats = RequestStats(request.method)
+        started = time.perf_counter()
+        with instrument(stats):
+            response = self.get_response(request)
+        stats.wall_seconds = time.perf_counter() - started
+
+        match = request.resolver_match
+        stats.view = (match.view_name if match and match.view_name
+                      else '<unresolved>')
+        stats.status = response.status_code
+        registry.observe(stats)
+
+        fields = stats.as_dict()
+        fields['path'] = request.path
+        if stats.duplicates >= duplicate_warning_setting():
+            fields['repeated_sql'] = stats.repeated_sql()
+            level = logging.WARNING
+        else:
+            level = logging.INFO
+        logger.log(level, "%s %s %s", request.method, request.path,
+                   response.status_code, extra={'fields': fields})
+        return response
+
+    def profile(self, request):
+        """
+        Run the request under a profiler and return the report.
+        """
+        mode = request.headers[PROFILE_HEADER].lower()
+        if mode == 'pyinstrument' and pyinstrument is not None:
+            profiler = pyinstrument.Profiler()
+            profiler.start()
+            response = self.get_response(request)
+            profiler.stop()
+            report = profiler.output_text(unicode=True)
+        else:
+            profiler = cProfile.Profile()
+            response = profiler.runcall(self.get_response, request)
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats(
+                'cumulative').print_stats(PROFILE_LINES)
+            report = stream.getvalue()
+        return HttpResponse(report, content_type='text/plain; charset=utf-8',
+                            headers={'X-Profiled-Status':
+                                     str(response.status_code)})
+
+
+class ReplicaMiddleware:
+    """
+    Serve GET and HEAD requests from a read replica (see
+    ``routers.ReplicaRouter``).
+
+    A request that writes, and every POST, sets a cookie that keeps the
+    user's requests on the primary for ``NEWSAPP_REPLICA_STICKY_SECONDS``,
+    so right after ``create_post`` or ``publish_post`` they see their own
+    change however far the replicas lag. A cookie rather than a session
+    key, because the session is itself read through the router and
+    checking it would cost a query.
+
+    Django drops the middleware at startup when ``NEWSAPP_READ_REPLICAS``
+    is empty.
+    """
+
+    def __init__(self, get_response):
+        if not replicas_setting():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method in SAFE_METHODS and not self.pinned(request):
+            with read_from_replica() as outcome:
+                response = self.get_response(request)
+            wrote = outcome['wrote']
+        else:
+            response = self.get_response(request)
+            wrote = request.method not in SAFE_METHODS
+
+        if wrote:
+            seconds = sticky_seconds_setting()
+            until = int(time.time() + seconds)
+            response.set_cookie(PRIMARY_COOKIE, str(until), max_age=seconds,
+                                httponly=True, samesite='Lax')
+        return response
+
+    def pinned(self, request):
+        """
+        Whether the user wrote recently enough to read from the primary.
+        """
+        try:
+            return float(request.COOKIES[PRIMARY_COOKIE]) > time.time()
+        except (KeyError, ValueError):
+            return False
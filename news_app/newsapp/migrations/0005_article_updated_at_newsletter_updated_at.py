@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsapp', '0004_alter_editor_options_alter_publisher_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='newsletter',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsapp', '0006_outboxevent'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='publisher',
+            name='fanout_on_read',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='outboxevent',
+            name='kind',
+            field=models.CharField(choices=[('email', 'Email'), ('tweet', 'Tweet'), ('feed', 'Feed')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('published_at', models.DateTimeField()),
+                ('article', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='newsapp.article')),
+                ('newsletter', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='newsapp.newsletter')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-published_at'], name='feed_user_published_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'article'), name='unique_feed_article'), models.UniqueConstraint(fields=('user', 'newsletter'), name='unique_feed_newsletter')],
+            },
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:14
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_subscriptions(apps, schema_editor):
+    """
+    Keep the oldest of any duplicate subscriptions so the unique
+    constraints can be created.
+    """
+    Subscription = apps.get_model('newsapp', 'Subscription')
+    for field in ('publisher', 'journalist'):
+        duplicates = (Subscription.objects.filter(**{f'{field}__isnull': False})
+                      .values('user', field)
+                      .annotate(rows=Count('id'), keep=Min('id'))
+                      .filter(rows__gt=1)
+                      .values_list('user', field, 'keep'))
+        for user_id, target_id, keep in duplicates:
+            Subscription.objects.filter(
+                user_id=user_id, **{f'{field}_id': target_id}
+            ).exclude(id=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsapp', '0007_publisher_fanout_on_read_alter_outboxevent_kind_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_subscriptions,
+                             migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['approved', '-created_at', '-id'], name='article_approved_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['publisher', 'approved'], name='article_publisher_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='newsletter',
+            index=models.Index(fields=['approved', '-created_at', '-id'], name='newsletter_approved_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='newsletter',
+            index=models.Index(fields=['publisher', 'approved'], name='newsletter_publisher_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resettoken',
+            index=models.Index(fields=['token', 'used'], name='resettoken_token_used_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['type', 'publisher'], name='subscription_type_pub_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(fields=['type', 'journalist'], name='subscription_type_jour_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='subscription',
+            constraint=models.UniqueConstraint(fields=('user', 'publisher'), name='unique_publisher_subscription'),
+        ),
+        migrations.AddConstraint(
+            model_name='subscription',
+            constraint=models.UniqueConstraint(fields=('user', 'journalist'), name='unique_journalist_subscription'),
+        ),
+    ]
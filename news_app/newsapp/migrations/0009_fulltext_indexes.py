@@ -0,0 +1,32 @@
+from django.db import migrations
+
+TABLES = ('newsapp_article', 'newsapp_newsletter')
+
+
+def create_fulltext_indexes(apps, schema_editor):
+    """
+    FULLTEXT indexes for the 'fulltext' search backend, MariaDB/MySQL only.
+    """
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    for table in TABLES:
+        schema_editor.execute(
+            f"CREATE FULLTEXT INDEX {table}_fulltext ON {table} (title, content)")
+
+
+def drop_fulltext_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    for table in TABLES:
+        schema_editor.execute(f"DROP INDEX {table}_fulltext ON {table}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsapp', '0008_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fulltext_indexes, drop_fulltext_indexes),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsapp', '0009_fulltext_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['approved', 'updated_at'], name='article_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='newsletter',
+            index=models.Index(fields=['approved', 'updated_at'], name='newsletter_updated_idx'),
+        ),
+    ]
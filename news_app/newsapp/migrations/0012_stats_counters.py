@@ -0,0 +1,93 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:06
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_rows(model, owner, **filters):
+    """
+    Per-owner row count, for use in ``update``.
+    """
+    counts = (model.objects.filter(**{owner: OuterRef('pk')}, **filters)
+              .order_by().values(owner).annotate(total=Count('id')))
+    return Coalesce(Subquery(counts.values('total')), Value(0))
+
+
+def fill_counters(apps, schema_editor):
+    """
+    Count the existing posts and subscriptions of every publisher and
+    journalist.
+    """
+    Article = apps.get_model('newsapp', 'Article')
+    Newsletter = apps.get_model('newsapp', 'Newsletter')
+    Subscription = apps.get_model('newsapp', 'Subscription')
+    for owner in ('publisher', 'journalist'):
+        apps.get_model('newsapp', owner).objects.update(
+            articles_approved=count_rows(Article, owner, approved=True),
+            articles_pending=count_rows(Article, owner, approved=False),
+            newsletters_approved=count_rows(Newsletter, owner, approved=True),
+            newsletters_pending=count_rows(Newsletter, owner, approved=False),
+            subscribers=count_rows(Subscription, owner),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsapp', '0011_moderation_claims'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='journalist',
+            name='articles_approved',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='journalist',
+            name='articles_pending',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='journalist',
+            name='newsletters_approved',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='journalist',
+            name='newsletters_pending',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='journalist',
+            name='subscribers',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='publisher',
+            name='articles_approved',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='publisher',
+            name='articles_pending',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='publisher',
+            name='newsletters_approved',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='publisher',
+            name='newsletters_pending',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='publisher',
+            name='subscribers',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
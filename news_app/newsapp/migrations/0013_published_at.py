@@ -0,0 +1,45 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:43
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_published_at(apps, schema_editor):
+    """
+    Use the last change of each approved post as its publish time, the
+    closest record of its approval there is.
+    """
+    for name in ('Article', 'Newsletter'):
+        apps.get_model('newsapp', name).objects.filter(
+            approved=True).update(published_at=F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsapp', '0012_stats_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='published_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='newsletter',
+            name='published_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_published_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['publisher', '-published_at', '-id'], name='article_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='newsletter',
+            index=models.Index(fields=['publisher', '-published_at', '-id'], name='newsletter_published_idx'),
+        ),
+    ]
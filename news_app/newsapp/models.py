@@ -2,6 +2,7 @@
 from django.contrib.auth.models import User
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
 
 
@@ -13,6 +14,12 @@ class Publisher(models.Model):
         user (User): One-to-one relationship with Django's User model.
         published_at (DateTimeField): Timestamp when the
         publisher profile was created.
+        fanout_on_read (bool): Set once the publisher has too many
+        subscribers to copy posts into every feed; readers then pull
+        its posts when the feed is read.
+        articles_approved, articles_pending (int): Article totals.
+        newsletters_approved, newsletters_pending (int): Newsletter totals.
+        subscribers (int): Readers following the publisher.
 
     Meta:
         permissions (list): Custom permissions for publishers.
@@ -20,6 +27,13 @@ class Publisher(models.Model):
 
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     published_at = models.DateTimeField(auto_now_add=True)
+    fanout_on_read = models.BooleanField(default=False)
+    # Kept up to date by functions.stats; repaired by recount_stats
+    articles_approved = models.IntegerField(default=0)
+    articles_pending = models.IntegerField(default=0)
+    newsletters_approved = models.IntegerField(default=0)
+    newsletters_pending = models.IntegerField(default=0)
+    subscribers = models.IntegerField(default=0)
 
     def __str__(self):
         return self.user.username  # pylint: disable=no-member
@@ -50,6 +64,9 @@ class Journalist(models.Model):
         Publisher the journalist belongs to.
         created_at (DateTimeField): Timestamp when the
         journalist profile was created.
+        articles_approved, articles_pending (int): Article totals.
+        newsletters_approved, newsletters_pending (int): Newsletter totals.
+        subscribers (int): Readers following the journalist.
 
     Meta:
         permissions (list): Custom permissions for journalists.
@@ -63,6 +80,12 @@ class Journalist(models.Model):
         null=True, blank=True
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    # Kept up to date by functions.stats; repaired by recount_stats
+    articles_approved = models.IntegerField(default=0)
+    articles_pending = models.IntegerField(default=0)
+    newsletters_approved = models.IntegerField(default=0)
+    newsletters_pending = models.IntegerField(default=0)
+    subscribers = models.IntegerField(default=0)
 
     def __str__(self):
         return self.user.username  # pylint: disable=no-member
@@ -155,7 +178,94 @@ class Reader(models.Model):
         ]
 
 
-class Article(models.Model):
+class PostQuerySet(models.QuerySet):
+    """
+    Queryset shared by Article and Newsletter.
+
+    Listing pages and API endpoints should start from one of these methods
+    so that a page of N posts costs a constant number of queries.
+    """
+
+    LISTING_FIELDS = (
+        'id', 'title', 'approved', 'created_at', 'updated_at',
+        'journalist__user__username', 'publisher__user__username',
+    )
+    API_FIELDS = (
+        'id', 'title', 'content', 'journalist', 'publisher',
+        'approved', 'created_at', 'updated_at',
+    )
+    QUEUE_FIELDS = (
+        'id', 'title', 'created_at', 'journalist__user__username',
+        'claimed_by__username', 'claimed_at',
+    )
+
+    def published(self):
+        """
+        Approved posts.
+
+        Compares with ``= true`` explicitly: Django renders
+        ``approved=True`` as a bare ``WHERE approved``, which neither
+        SQLite nor MariaDB can match against the ``approved`` indexes.
+        """
+        return self.filter(approved=models.Value(True))
+
+    def pending(self):
+        """
+        Posts awaiting approval, written so the indexes apply as in
+        ``published``.
+        """
+        return self.filter(approved=models.Value(False))
+
+    def for_listing(self):
+        """
+        Rows for the list templates: author and publisher users are joined
+        in and the post body is left out.
+        """
+        return self.select_related(
+            'journalist__user', 'publisher__user'
+        ).only(*self.LISTING_FIELDS)
+
+    def for_api(self):
+        """
+        Rows for the serializers, which only need the foreign key ids.
+        """
+        return self.only(*self.API_FIELDS)
+
+    def for_queue(self):
+        """
+        Rows for the moderation queue: author and claimant usernames are
+        joined in and the post body is left out.
+        """
+        return self.select_related(
+            'journalist__user', 'claimed_by'
+        ).only(*self.QUEUE_FIELDS)
+
+
+class TracksApproval:
+    """
+    Model mixin remembering the ``approved`` value a post was loaded with,
+    so the counters can tell an approval from any other save, and
+    stamping ``published_at`` when a post is first saved approved.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        post = super().from_db(db, field_names, values)
+        if 'approved' in field_names:
+            post.approved_in_db = post.approved
+        return post
+
+    def save(self, *args, **kwargs):
+        if (self.approved and not getattr(self, 'approved_in_db', False)
+                and self.published_at is None):
+            self.published_at = timezone.now()
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'],
+                                           'published_at'}
+        super().save(*args, **kwargs)
+
+
+class Article(TracksApproval, models.Model):
     """
     Represents a news article in the application.
 
@@ -167,6 +277,10 @@ class Article(models.Model):
         approved (bool): Indicates whether the article is approved for
         publishing.
         created_at (DateTimeField): Timestamp when the article was created.
+        updated_at (DateTimeField): Timestamp of the last change.
+        published_at (DateTimeField): When the post was approved.
+        claimed_by (User): Editor or publisher reviewing the pending post.
+        claimed_at (DateTimeField): When the review was claimed.
     """
 
     title = models.CharField(max_length=255)
@@ -183,6 +297,35 @@ class Article(models.Model):
     content = models.TextField()
     approved = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    published_at = models.DateTimeField(null=True, blank=True)
+    claimed_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name="+"
+    )
+    claimed_at = models.DateTimeField(null=True, blank=True)
+
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Public listings and keyset pages: approved posts, newest first
+            models.Index(fields=['approved', '-created_at', '-id'],
+                         name='article_approved_idx'),
+            # A publisher's pending and approved posts; oldest first, it is
+            # also the moderation queue's keyset
+            models.Index(fields=['publisher', 'approved', 'created_at', 'id'],
+                         name='article_queue_idx'),
+            # Conditional GET validators and incremental exports
+            models.Index(fields=['approved', 'updated_at'],
+                         name='article_updated_idx'),
+            # Feeds read on demand: a publisher's approved posts, newest
+            # first; pending ones have no publish time and sort last
+            models.Index(fields=['publisher', '-published_at', '-id'],
+                         name='article_published_idx'),
+        ]
 
     def __str__(self):  # pylint: disable=no-member
         return self.title
@@ -196,9 +339,28 @@ class ArticleSerializer(serializers.ModelSerializer):
         model = Article
         fields = ['title', 'content', 'journalist',
                   'publisher', 'approved', 'created_at']
+        # Set from the authenticated journalist when a post is created
+        read_only_fields = ['journalist', 'publisher']
+
+
+class ArticleImportSerializer(ArticleSerializer):
+    """
+    Serializer for bulk imported articles, which always belong to the
+    importing journalist and wait for approval
+    """
+    class Meta(ArticleSerializer.Meta):
+        fields = ['title', 'content']
+
+
+class ArticleExportSerializer(ArticleSerializer):
+    """
+    Serializer for article exports, adds the keys needed for syncing
+    """
+    class Meta(ArticleSerializer.Meta):
+        fields = ['id'] + ArticleSerializer.Meta.fields + ['updated_at']
 
 
-class Newsletter(models.Model):
+class Newsletter(TracksApproval, models.Model):
     """
     Represents a Newsletter published by a journalist.
 
@@ -209,6 +371,10 @@ class Newsletter(models.Model):
         content (TextField): Body text of the newsletter.
         approved (bool): Indicates whether the newsletter is approved.
         created_at (DateTimeField): Timestamp when the newsletter was created.
+        updated_at (DateTimeField): Timestamp of the last change.
+        published_at (DateTimeField): When the post was approved.
+        claimed_by (User): Editor or publisher reviewing the pending post.
+        claimed_at (DateTimeField): When the review was claimed.
     """
 
     title = models.CharField(max_length=255)
@@ -225,6 +391,35 @@ class Newsletter(models.Model):
     content = models.TextField()
     approved = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    published_at = models.DateTimeField(null=True, blank=True)
+    claimed_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True, blank=True,
+        related_name="+"
+    )
+    claimed_at = models.DateTimeField(null=True, blank=True)
+
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Public listings and keyset pages: approved posts, newest first
+            models.Index(fields=['approved', '-created_at', '-id'],
+                         name='newsletter_approved_idx'),
+            # A publisher's pending and approved posts; oldest first, it is
+            # also the moderation queue's keyset
+            models.Index(fields=['publisher', 'approved', 'created_at', 'id'],
+                         name='newsletter_queue_idx'),
+            # Conditional GET validators and incremental exports
+            models.Index(fields=['approved', 'updated_at'],
+                         name='newsletter_updated_idx'),
+            # Feeds read on demand: a publisher's approved posts, newest
+            # first; pending ones have no publish time and sort last
+            models.Index(fields=['publisher', '-published_at', '-id'],
+                         name='newsletter_published_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -238,6 +433,25 @@ class NewsletterSerializer(serializers.ModelSerializer):
         model = Newsletter
         fields = ['title', 'content', 'journalist',
                   'publisher', 'approved', 'created_at']
+        # Set from the authenticated journalist when a post is created
+        read_only_fields = ['journalist', 'publisher']
+
+
+class NewsletterImportSerializer(NewsletterSerializer):
+    """
+    Serializer for bulk imported newsletters, which always belong to the
+    importing journalist and wait for approval
+    """
+    class Meta(NewsletterSerializer.Meta):
+        fields = ['title', 'content']
+
+
+class NewsletterExportSerializer(NewsletterSerializer):
+    """
+    Serializer for newsletter exports, adds the keys needed for syncing
+    """
+    class Meta(NewsletterSerializer.Meta):
+        fields = ['id'] + NewsletterSerializer.Meta.fields + ['updated_at']
 
 
 class Subscription(models.Model):
@@ -279,6 +493,24 @@ class Subscription(models.Model):
     )
     subscription_date = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            # One row per followed publisher or journalist, so concurrent
+            # get_or_create calls cannot insert duplicates. The other
+            # column is NULL and NULLs never collide, so each constraint
+            # only applies to its own subscription type.
+            models.UniqueConstraint(fields=['user', 'publisher'],
+                                    name='unique_publisher_subscription'),
+            models.UniqueConstraint(fields=['user', 'journalist'],
+                                    name='unique_journalist_subscription'),
+        ]
+        indexes = [
+            models.Index(fields=['type', 'publisher'],
+                         name='subscription_type_pub_idx'),
+            models.Index(fields=['type', 'journalist'],
+                         name='subscription_type_jour_idx'),
+        ]
+
     def __str__(self):  # pylint: disable=no-member
         if self.type == 'publisher' and self.publisher:
             return (f"Subscribed to"
@@ -316,3 +548,115 @@ class ResetToken(models.Model):
     token = models.CharField(max_length=500)
     expiry_date = models.DateTimeField()
     used = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['token', 'used'],
+                         name='resettoken_token_used_idx'),
+        ]
+
+
+class OutboxEvent(models.Model):
+    """
+    Represents a side effect queued when a post is published.
+
+    Events are written in the same transaction as the approval and
+    processed later by ``manage.py drain_outbox``.
+
+    Attributes:
+        kind (str): Handler to run ('email' or 'tweet').
+        payload (dict): Arguments for the handler.
+        idempotency_key (str): Unique key so an event is only queued once.
+        status (str): 'pending', 'done' or 'failed'.
+        attempts (int): Number of times the handler has been tried.
+        available_at (DateTimeField): Earliest time of the next attempt.
+        last_error (TextField): Error message of the last failed attempt.
+        created_at (DateTimeField): Timestamp when the event was queued.
+        processed_at (DateTimeField): Timestamp when the event finished.
+    """
+
+    KIND_CHOICES = [
+        ('email', 'Email'),
+        ('tweet', 'Tweet'),
+        ('feed', 'Feed'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    payload = models.JSONField(default=dict)
+    idempotency_key = models.CharField(max_length=255, unique=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES,
+                              default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.kind} {self.idempotency_key} ({self.status})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at'],
+                         name='outbox_status_available_idx'),
+        ]
+
+
+class FeedEntry(models.Model):
+    """
+    Represents a published post in a reader's personal feed.
+
+    Entries are written when a post is approved, one per subscriber, so
+    reading a feed is a single range scan on (user, published_at).
+
+    Attributes:
+        user (User): The reader who owns the feed.
+        article (Article): The article, if the entry is an article.
+        newsletter (Newsletter): The newsletter, if the entry is one.
+        published_at (DateTimeField): When the post was approved.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    article = models.ForeignKey(
+        Article,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='feed_entries'
+    )
+    newsletter = models.ForeignKey(
+        Newsletter,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='feed_entries'
+    )
+    published_at = models.DateTimeField()
+
+    @property
+    def post(self):
+        """
+        The article or newsletter this entry points to.
+        """
+        return self.article or self.newsletter
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'article'],
+                                    name='unique_feed_article'),
+            models.UniqueConstraint(fields=['user', 'newsletter'],
+                                    name='unique_feed_newsletter'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-published_at'],
+                         name='feed_user_published_idx'),
+        ]
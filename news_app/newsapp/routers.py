@@ -0,0 +1,79 @@
+'''Read replica routing'''
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Replica the current request reads from; None reads from the primary
+_read_alias = ContextVar('newsapp_read_alias', default=None)
+# Set once the current request has written, for read-your-writes
+_wrote = ContextVar('newsapp_wrote', default=False)
+
+
+def replicas_setting():
+    """
+    Database aliases that replicate ``default`` (``NEWSAPP_READ_REPLICAS``).
+    """
+    return getattr(settings, 'NEWSAPP_READ_REPLICAS', [])
+
+
+@contextmanager
+def read_from_replica():
+    """
+    Send the reads made inside the block to one replica, picked at random,
+    until something is written. Without replicas it changes nothing.
+
+    Yields:
+        dict: ``{'wrote': bool}``, filled in when the block exits.
+    """
+    replicas = replicas_setting()
+    outcome = {'wrote': False}
+    alias_token = _read_alias.set(random.choice(replicas) if replicas
+                                  else None)
+    wrote_token = _wrote.set(False)
+    try:
+        yield outcome
+    finally:
+        outcome['wrote'] = _wrote.get()
+        _read_alias.reset(alias_token)
+        _wrote.reset(wrote_token)
+
+
+class ReplicaRouter:
+    """
+    Route reads to a replica when it is safe and everything else to the
+    primary.
+
+    Reads only leave the primary inside ``read_from_replica``, which
+    ``ReplicaMiddleware`` opens for GET and HEAD requests of users who
+    have not written recently. Even then they stay on the primary once
+    the request has written, and inside a transaction, so
+    ``select_for_update`` and read-then-write code see current rows.
+    Management commands and the outbox worker always use the primary.
+    """
+
+    def db_for_read(self, model, **hints):  # pylint: disable=unused-argument
+        alias = _read_alias.get()
+        if alias is None or _wrote.get():
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):  # pylint: disable=unused-argument
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):  # pylint: disable=unused-argument
+        # Replicas hold the same rows as the primary
+        aliases = {DEFAULT_DB_ALIAS, *replicas_setting()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):  # pylint: disable=unused-argument
+        # Replicas receive the schema through replication
+        if db in replicas_setting():
+            return False
+        return None
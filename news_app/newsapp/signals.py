@@ -1,9 +1,19 @@
 '''Imported modules'''
-from django.db.models.signals import post_migrate
+import logging
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_migrate, post_save
+)
 from django.dispatch import receiver
 from django.contrib.auth.models import Group, Permission
 from django.contrib.contenttypes.models import ContentType
-from .models import User
+from .models import Article, Newsletter, Subscription, User
+from .functions.roles import ensure_group_permissions, invalidate_user_roles
+from .functions.object_cache import invalidate, invalidate_listing
+from .functions.search import index_post, unindex_post
+from .functions.stats import count_posts, count_subscription
+
+logger = logging.getLogger(__name__)
 
 
 @receiver(post_migrate)
@@ -11,7 +21,7 @@ def groups_permissions(sender, **kwargs):  # pylint: disable=unused-argument
     """
     Groups permissions
     """
-    print(sender.name)
+    logger.debug("Setting up groups after migrating %s", sender.name)
     if 'newsapp' in sender.name:
         readers, _ = Group.objects.get_or_create(name='Reader')
         publishers, _ = Group.objects.get_or_create(name='Publisher')
@@ -64,3 +74,103 @@ def groups_permissions(sender, **kwargs):  # pylint: disable=unused-argument
                                     can_update, can_remove, join_publisher)
         editors.permissions.add(can_view, can_update, can_remove,
                                 join_publisher)
+
+        # Model permissions used by the views' permission_required checks
+        ensure_group_permissions()
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set,
+                        **kwargs):  # pylint: disable=unused-argument
+    """
+    Invalidate cached roles when group membership changes
+    """
+    if not action.startswith('post_'):
+        return
+    if isinstance(instance, User):
+        invalidate_user_roles(instance.pk)
+    elif pk_set:
+        for user_id in pk_set:
+            invalidate_user_roles(user_id)
+    else:
+        # Group.user_set.clear() does not report the affected users
+        for user_id in instance.user_set.values_list('id', flat=True):
+            invalidate_user_roles(user_id)
+
+
+@receiver(post_save, sender=Article)
+@receiver(post_save, sender=Newsletter)
+def post_saved(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """
+    Update the search index and cached copies once the change is committed
+    """
+    post_type = sender.__name__.lower()
+    # Invalidate now for reads later in this transaction, and again on
+    # commit in case another request re-cached the old row meanwhile
+    for stale in (lambda: invalidate(post_type, instance.id),
+                  lambda: invalidate_listing(post_type)):
+        stale()
+        transaction.on_commit(stale)
+    transaction.on_commit(lambda: index_post(post_type, instance))
+
+
+@receiver(post_delete, sender=Article)
+@receiver(post_delete, sender=Newsletter)
+def post_deleted(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """
+    Remove a deleted post from the search index and cache once committed
+    """
+    post_type = sender.__name__.lower()
+    post_id = instance.id
+    for stale in (lambda: invalidate(post_type, post_id),
+                  lambda: invalidate_listing(post_type)):
+        stale()
+        transaction.on_commit(stale)
+    transaction.on_commit(lambda: unindex_post(post_type, post_id))
+
+
+@receiver(post_save, sender=Article)
+@receiver(post_save, sender=Newsletter)
+def post_counted(sender, instance, created, raw, **kwargs):  # pylint: disable=unused-argument
+    """
+    Count a new post, or move an approved one from pending to approved
+    """
+    if raw:
+        return
+    post_type = sender.__name__.lower()
+    owners = (instance.publisher_id, instance.journalist_id)
+    previous = getattr(instance, 'approved_in_db', None)
+    if created:
+        count_posts(post_type, [(*owners, instance.approved, 1)])
+    elif previous is not None and previous != instance.approved:
+        count_posts(post_type, [(*owners, previous, -1),
+                                (*owners, instance.approved, 1)])
+    instance.approved_in_db = instance.approved
+
+
+@receiver(post_delete, sender=Article)
+@receiver(post_delete, sender=Newsletter)
+def post_uncounted(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """
+    Take a deleted post out of its publisher's and journalist's totals
+    """
+    approved = getattr(instance, 'approved_in_db', instance.approved)
+    count_posts(sender.__name__.lower(), [
+        (instance.publisher_id, instance.journalist_id, approved, -1)])
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_counted(sender, instance, created, raw, **kwargs):  # pylint: disable=unused-argument
+    """
+    Count a new subscriber
+    """
+    if created and not raw:
+        count_subscription(instance, 1)
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_uncounted(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """
+    Take a cancelled subscription out of the subscriber count
+    """
+    count_subscription(instance, -1)
@@ -1,8 +1,23 @@
+import json
+from datetime import timedelta
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from django.contrib.auth.models import User, Group
-from newsapp.models import Article, Newsletter, Journalist, Publisher
+from django.utils import timezone
+from newsapp.models import (Article, ArticleSerializer, ArticleExportSerializer, Newsletter,
+                            NewsletterSerializer, NewsletterExportSerializer, Journalist,
+                            Publisher)
+from newsapp.functions import moderation
+from newsapp.functions.export import astream_export, stream_export
+from newsapp.functions.fast_serializers import dumps, fast_serializer
+from newsapp.functions.search import rebuild_index
+from newsapp.testing import JournalistAPIClientMixin, TemporarySearchIndexMixin
 from newsapp.signals import groups_permissions  # ensure groups/permissions are set up
 
 
@@ -85,3 +100,391 @@ class NewsAppAPITests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(Newsletter.objects.count(), 1)
         self.assertEqual(Newsletter.objects.first().title, "Test Newsletter")
+
+
+class ArticlePaginationAPITests(JournalistAPIClientMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        for i in range(5):
+            Article.objects.create(title=f"Article{i}", content="Content",
+                                   journalist=self.journalist,
+                                   publisher=self.publisher, approved=True)
+        Article.objects.create(title="Pending", content="Content",
+                               journalist=self.journalist,
+                               publisher=self.publisher, approved=False)
+
+    def test_first_page_has_next_link(self):
+        url = reverse('news_app:api_articles')
+        response = self.client.get(url, {'page_size': 2}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([a['title'] for a in response.data['articles']],
+                         ['Article4', 'Article3'])
+        self.assertIsNotNone(response.data['links']['next'])
+        self.assertIsNone(response.data['links']['prev'])
+        self.assertIsNone(response.data['count'])
+
+    def test_walk_forward_and_back(self):
+        url = reverse('news_app:api_articles')
+        seen = []
+        response = self.client.get(url, {'page_size': 2}, format='json')
+        while True:
+            seen.extend(a['title'] for a in response.data['articles'])
+            next_link = response.data['links']['next']
+            if not next_link:
+                break
+            response = self.client.get(next_link, format='json')
+        self.assertEqual(seen, [f"Article{i}" for i in range(4, -1, -1)])
+
+        response = self.client.get(response.data['links']['prev'], format='json')
+        self.assertEqual([a['title'] for a in response.data['articles']],
+                         ['Article2', 'Article1'])
+
+    def test_invalid_cursor(self):
+        url = reverse('news_app:api_articles')
+        response = self.client.get(url, {'cursor': 'not-a-cursor'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_optional_count(self):
+        url = reverse('news_app:api_articles')
+        response = self.client.get(url, {'count': 'true'}, format='json')
+        self.assertEqual(response.data['count'], 5)
+
+    def test_count_reads_publisher_counters(self):
+        Publisher.objects.filter(id=self.publisher.id).update(articles_approved=42)
+        url = reverse('news_app:api_articles')
+        response = self.client.get(url, {'count': 'true'}, format='json')
+        self.assertEqual(response.data['count'], 42)
+
+
+class ExportAPITests(JournalistAPIClientMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+
+        for i in range(3):
+            Article.objects.create(title=f"Article{i}", content="Content",
+                                   journalist=self.journalist,
+                                   publisher=self.publisher, approved=True)
+
+    def test_export_ndjson(self):
+        url = reverse('news_app:api_export_articles')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lines = b''.join(response.streaming_content).splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([r['title'] for r in rows], ['Article0', 'Article1', 'Article2'])
+        self.assertIn('updated_at', rows[0])
+
+    def test_export_json_array(self):
+        url = reverse('news_app:api_export_articles')
+        response = self.client.get(url, {'output': 'json'})
+        rows = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(rows), 3)
+
+    def test_export_updated_since(self):
+        cutoff = timezone.now()
+        Article.objects.filter(title='Article1').update(updated_at=cutoff + timedelta(seconds=5))
+        url = reverse('news_app:api_export_articles')
+        response = self.client.get(url, {'updated_since': cutoff.isoformat()})
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual([json.loads(line)['title'] for line in lines], ['Article1'])
+
+    def test_json_array_spans_chunks(self):
+        for queryset, count in ((Article.objects.all(), 3), (Article.objects.none(), 0)):
+            body = b''.join(stream_export(queryset, ArticleExportSerializer, 'json',
+                                          chunk_size=2))
+            self.assertEqual(len(json.loads(body)), count)
+
+
+class SearchAPITests(TemporarySearchIndexMixin, JournalistAPIClientMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        for i in range(3):
+            Article.objects.create(title=f"Drought update {i}", content="Dams are low",
+                                   journalist=self.journalist, publisher=self.publisher,
+                                   approved=True)
+        Newsletter.objects.create(title="Weekly digest", content="Drought and dams",
+                                  journalist=self.journalist, publisher=self.publisher,
+                                  approved=True)
+        rebuild_index()
+
+    def test_search_pages(self):
+        url = reverse('news_app:api_search')
+        response = self.client.get(url, {'q': 'drought', 'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 4)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(response.data['results'][0]['type'], 'article')
+        self.assertIsNotNone(response.data['links']['next'])
+
+    def test_search_by_type(self):
+        url = reverse('news_app:api_search')
+        response = self.client.get(url, {'q': 'drought', 'type': 'newsletter'})
+        self.assertEqual([r['title'] for r in response.data['results']], ['Weekly digest'])
+
+    def test_invalid_type(self):
+        response = self.client.get(reverse('news_app:api_search'), {'q': 'x', 'type': 'tweet'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class DetailAPITests(JournalistAPIClientMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.approved = Article.objects.create(title="Approved", content="Content",
+                                               journalist=self.journalist,
+                                               publisher=self.publisher, approved=True)
+        self.pending = Article.objects.create(title="Pending", content="Content",
+                                              journalist=self.journalist,
+                                              publisher=self.publisher)
+
+    def test_approved_article(self):
+        response = self.client.get(reverse('news_app:api_article_detail',
+                                           args=[self.approved.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['title'], 'Approved')
+
+    def test_pending_and_missing_articles_are_hidden(self):
+        for pk in (self.pending.id, 999999):
+            response = self.client.get(reverse('news_app:api_article_detail', args=[pk]))
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ConditionalGetTests(JournalistAPIClientMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.article = Article.objects.create(title="Polled", content="Content",
+                                              journalist=self.journalist,
+                                              publisher=self.publisher, approved=True)
+        self.url = reverse('news_app:api_articles')
+
+    def test_unchanged_list_returns_304(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        with mock.patch('newsapp.api_views.ArticleSerializer') as serializer:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        serializer.assert_not_called()
+
+    def test_edit_and_delete_change_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.article.title = "Edited"
+        self.article.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        etag = response['ETag']
+        self.article.delete()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_bulk_approval_changes_the_etag(self):
+        pending = Article.objects.create(title="Queued", content="Content",
+                                         journalist=self.journalist, publisher=self.publisher)
+        etag = self.client.get(self.url)['ETag']
+        moderation.moderate('article', [pending.id], self.publisher, self.publisher.user,
+                            'approve')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertContains(response, "Queued")
+
+    def test_not_modified_reads_no_posts(self):
+        etag = self.client.get(self.url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertFalse([query for query in queries
+                          if 'newsapp_article' in query['sql']])
+
+    def test_query_string_is_part_of_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, {'page_size': 5}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_detail_etag(self):
+        url = reverse('news_app:api_article_detail', args=[self.article.id])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+                         status.HTTP_304_NOT_MODIFIED)
+        self.article.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+                         status.HTTP_200_OK)
+
+
+class FastSerializerTests(JournalistAPIClientMixin, APITestCase):
+
+    TRICKY = ['Plain', 'Ünïcödé ✓ 📰', 'Quotes "and" \\backslashes\\', 'Line\nbreak\ttab\x01',
+              'Separators \u2028 and \u2029', '<script>&amp;</script>']
+
+    def setUp(self):
+        super().setUp()
+        for i, text in enumerate(self.TRICKY):
+            Article.objects.create(title=text, content=text * 3, journalist=self.journalist,
+                                   publisher=self.publisher, approved=i % 2 == 0)
+            Newsletter.objects.create(title=text, content=text, journalist=self.journalist,
+                                      publisher=self.publisher, approved=True)
+
+    def assert_identical(self):
+        for model, serializer_class in ((Article, ArticleSerializer),
+                                        (Article, ArticleExportSerializer),
+                                        (Newsletter, NewsletterSerializer),
+                                        (Newsletter, NewsletterExportSerializer)):
+            with self.subTest(serializer=serializer_class.__name__):
+                queryset = model.objects.order_by('id')
+                expected = JSONRenderer().render(serializer_class(queryset, many=True).data)
+                fast = fast_serializer(serializer_class)
+                self.assertEqual(dumps(fast.many(fast.rows(queryset))), expected)
+
+    def test_byte_identical_with_orjson(self):
+        self.assert_identical()
+
+    def test_byte_identical_without_orjson(self):
+        with mock.patch('newsapp.functions.fast_serializers.orjson', None):
+            self.assert_identical()
+
+    def test_byte_identical_in_other_timezone(self):
+        with timezone.override('Africa/Johannesburg'):
+            self.assert_identical()
+
+    def test_api_page_matches_drf_rendering(self):
+        response = self.client.get(reverse('news_app:api_newsletters'))
+        page = Newsletter.objects.order_by('-created_at', '-id')[:20]
+        self.assertEqual(json.loads(response.content)['newsletters'],
+                         json.loads(JSONRenderer().render(
+                             NewsletterSerializer(page, many=True).data)))
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+
+class AsyncAPITests(JournalistAPIClientMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.articles = [Article.objects.create(title=f"Async{i}", content="Content",
+                                                journalist=self.journalist,
+                                                publisher=self.publisher, approved=True)
+                         for i in range(5)]
+        self.pending = Article.objects.create(title="Pending", content="Content",
+                                              journalist=self.journalist,
+                                              publisher=self.publisher)
+        # The async views read the session, not DRF authentication
+        self.client.force_login(self.user)
+
+    def test_list_matches_sync_api(self):
+        params = {'page_size': 2}
+        for _ in range(3):
+            sync = self.client.get(reverse('news_app:api_articles'), params)
+            response = self.client.get(reverse('news_app:api_articles_async'), params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            body = json.loads(response.content)
+            self.assertEqual(body['articles'], json.loads(sync.content)['articles'])
+            self.assertEqual(response['ETag'], sync['ETag'])
+            if not body['links']['next']:
+                break
+            params['cursor'] = body['links']['next'].split('cursor=')[1].split('&')[0]
+        self.assertIsNone(body['links']['next'])
+
+    def test_unchanged_list_returns_304(self):
+        url = reverse('news_app:api_articles_async')
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_detail_and_export(self):
+        url = reverse('news_app:api_article_detail_async', args=[self.articles[0].id])
+        self.assertEqual(json.loads(self.client.get(url).content)['title'], 'Async0')
+        for pk in (self.pending.id, 999999):
+            url = reverse('news_app:api_article_detail_async', args=[pk])
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.get(reverse('news_app:api_export_articles_async'))
+
+        async def read():
+            return b''.join([chunk async for chunk in response.streaming_content])
+        lines = async_to_sync(read)().splitlines()
+        self.assertEqual([json.loads(line)['title'] for line in lines],
+                         [f"Async{i}" for i in range(5)])
+
+    def test_export_matches_sync_export(self):
+        async def read(fmt):
+            return b''.join([chunk async for chunk in astream_export(
+                Article.objects.all(), ArticleExportSerializer, fmt, chunk_size=2)])
+        for fmt in ('ndjson', 'json'):
+            self.assertEqual(async_to_sync(read)(fmt),
+                             b''.join(stream_export(Article.objects.all(),
+                                                    ArticleExportSerializer, fmt,
+                                                    chunk_size=2)))
+
+    def test_anonymous_and_post_are_rejected(self):
+        url = reverse('news_app:api_articles_async')
+        self.assertEqual(self.client.post(url).status_code,
+                         status.HTTP_405_METHOD_NOT_ALLOWED)
+        self.client.logout()
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+
+class BulkImportAPITests(JournalistAPIClientMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('news_app:api_import_articles')
+
+    def post(self, body, content_type='application/x-ndjson', url=None):
+        return self.client.generic('POST', url or self.url, body.encode(),
+                                   content_type=content_type)
+
+    def test_import_ndjson_reports_bad_rows(self):
+        body = ('{"title": "One", "content": "First"}\n'
+                'not json\n'
+                '\n'
+                '{"title": "", "content": "No title", "approved": true}\n'
+                '{"title": "Two", "content": "Second", "approved": true}\n')
+        response = self.post(body)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['rows'], 4)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([e['row'] for e in response.data['errors']], [2, 4])
+        self.assertIn('title', response.data['errors'][1]['errors'])
+
+        articles = Article.objects.order_by('id')
+        self.assertEqual([a.title for a in articles], ['One', 'Two'])
+        # Imports always belong to the journalist and wait for approval
+        self.assertFalse(any(a.approved for a in articles))
+        self.assertEqual({a.publisher_id for a in articles}, {self.publisher.id})
+
+    def test_import_csv_newsletters(self):
+        body = 'title,content\n' + ''.join(
+            f'"Letter {i}","Line one\nline two"\n' for i in range(5))
+        response = self.post(body, 'text/csv',
+                             reverse('news_app:api_import_newsletters'))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 5)
+        self.assertEqual(Newsletter.objects.get(title='Letter 3').content,
+                         "Line one\nline two")
+
+    def test_import_rejects_other_content_types(self):
+        response = self.post('{"title": "One", "content": "x"}',
+                             'application/json')
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    def test_import_requires_journalist(self):
+        self.client.force_authenticate(
+            user=User.objects.create_user(username='notajournalist'))
+        response = self.post('{"title": "One", "content": "x"}\n')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(Article.objects.exists())
+
+    def test_single_create_fetches_journalist_once(self):
+        url = reverse('news_app:api_create_article')
+        data = {"title": "Single", "content": "Body",
+                "journalist": self.journalist.id, "publisher": self.publisher.id}
+        # journalist with publisher, the insert, then the publisher's and
+        # journalist's counters
+        with self.assertNumQueries(4):
+            response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
@@ -0,0 +1,364 @@
+"""
+Query-count and wall-clock budgets for every page and API endpoint.
+
+The suite seeds a realistic newsroom (thousands of posts, hundreds of
+journalists) and fails when a view issues more queries or takes longer
+than its budget, so N+1 regressions cannot ship unnoticed. It also
+checks with EXPLAIN that the hot queries use the indexes declared for
+them in ``models.py``.
+
+Runs on SQLite:
+    DB_ENGINE=sqlite python manage.py test newsapp.test_performance
+
+Environment:
+    NEWSAPP_BENCH_SCALE: Multiplier for the seeded dataset (default 1).
+    NEWSAPP_BENCH_TIME_FACTOR: Multiplier for the time budgets (default 1).
+    NEWSAPP_BENCH_SEARCH_DOCS: Documents in the synthetic search corpus
+        (default 50000; try 1000000 to reproduce the production target).
+    NEWSAPP_BENCH_REPORT: Path of a JSON report to write, for comparing
+        results across commits.
+"""
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import tempfile
+import time
+from asgiref.sync import async_to_sync
+from django.db import connection
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from .functions.export import EXPORT_CHUNK_SIZE
+from .functions.roles import ensure_group_permissions
+from .functions.search import InvertedIndex, rebuild_index
+from .functions.seed import SEED_PASSWORD, seed_dataset
+from .models import (
+    Article, Journalist, Newsletter, Publisher, ResetToken, Subscription
+)
+
+SCALE = float(os.getenv('NEWSAPP_BENCH_SCALE', '1'))
+TIME_FACTOR = float(os.getenv('NEWSAPP_BENCH_TIME_FACTOR', '1'))
+REPORT_PATH = os.getenv('NEWSAPP_BENCH_REPORT')
+SEARCH_DOCS = int(os.getenv('NEWSAPP_BENCH_SEARCH_DOCS', '50000'))
+
+DATASET = {
+    'publishers': 5,
+    'journalists': int(200 * SCALE),
+    'editors': 20,
+    'readers': int(300 * SCALE),
+    'articles': int(2000 * SCALE),
+    'newsletters': int(500 * SCALE),
+    'subscriptions_per_reader': 3,
+}
+
+# (url name, role, url kwargs key, max queries, max seconds)
+# The url kwargs key names an object prepared in setUpTestData, or the
+# query string for the search pages.
+BUDGETS = [
+    ('news_app:welcome', None, None, 0, 0.5),
+    ('news_app:register', None, None, 0, 0.5),
+    ('news_app:login', None, None, 0, 0.5),
+    ('news_app:send_password_reset_page', None, None, 0, 0.5),
+    ('news_app:metrics', None, None, 0, 0.5),
+    ('news_app:choose_group', 'reader', None, 2, 0.5),
+    ('news_app:home', 'reader', None, 6, 0.5),
+    ('news_app:register_under_publisher', 'journalist', None, 7, 0.5),
+    ('news_app:publisher_team_view', 'publisher', None, 8, 1.0),
+    ('news_app:subscribe', 'reader', None, 6, 1.0),
+    ('news_app:subscribed_articles', 'reader', None, 3, 0.5),
+    ('news_app:feed', 'reader', None, 4, 0.5),
+    ('news_app:search', 'reader', 'search', 3, 0.5),
+    ('news_app:article_list', 'reader', None, 7, 5.0),
+    ('news_app:article_list', 'editor', None, 8, 5.0),
+    ('news_app:article_list', 'publisher', None, 7, 3.0),
+    ('news_app:view_mine', 'journalist', None, 7, 1.0),
+    ('news_app:view_mine', 'editor', None, 9, 2.0),
+    ('news_app:create_post', 'journalist', None, 6, 0.5),
+    ('news_app:view_article', 'journalist', 'article', 6, 0.5),
+    ('news_app:read_article', 'reader', 'article', 3, 0.5),
+    ('news_app:read_newsletter', 'reader', 'newsletter', 3, 0.5),
+    ('news_app:update_post', 'journalist', 'post', 7, 0.5),
+    ('news_app:update_newsletter', 'journalist', 'newsletter', 7, 0.5),
+    ('news_app:remove_post', 'journalist', 'post', 5, 0.5),
+    ('news_app:moderate_posts', 'editor', None, 6, 0.5),
+    ('news_app:moderate_posts', 'publisher', None, 6, 0.5),
+    ('news_app:api_articles', 'reader', None, 4, 0.5),
+    ('news_app:api_newsletters', 'reader', None, 4, 0.5),
+    ('news_app:api_article_detail', 'reader', 'published_article', 3, 0.5),
+    ('news_app:api_newsletter_detail', 'reader', 'published_newsletter', 3,
+     0.5),
+    ('news_app:api_export_articles', 'reader', None, None, 5.0),
+    ('news_app:api_export_newsletters', 'reader', None, None, 2.0),
+    ('news_app:api_search', 'reader', 'search', 3, 0.5),
+    ('news_app:api_articles_async', 'reader', None, 4, 0.5),
+    ('news_app:api_newsletters_async', 'reader', None, 4, 0.5),
+    ('news_app:api_article_detail_async', 'reader', 'published_article', 3,
+     0.5),
+    ('news_app:api_newsletter_detail_async', 'reader', 'published_newsletter',
+     3, 0.5),
+    ('news_app:api_export_articles_async', 'reader', None, None, 5.0),
+    ('news_app:api_export_newsletters_async', 'reader', None, None, 2.0),
+]
+
+
+async def consume(chunks):
+    """
+    Read an async streaming response to the end.
+    """
+    return b''.join([chunk async for chunk in chunks])
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Seeds one dataset for the class and checks each budget in a subTest.
+    """
+
+    results = []
+
+    @classmethod
+    def setUpClass(cls):
+        # The search pages read an index of the seeded posts, kept out of
+        # the real index directory; instrumentation is on so the metrics
+        # endpoint answers
+        directory = cls.enterClassContext(tempfile.TemporaryDirectory())
+        cls.enterClassContext(
+            override_settings(NEWSAPP_SEARCH_INDEX_PATH=directory,
+                              NEWSAPP_INSTRUMENTATION=True))
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        ensure_group_permissions()
+        started = time.perf_counter()
+        cls.users = seed_dataset(**DATASET)
+        cls.seed_seconds = time.perf_counter() - started
+
+        journalist = Journalist.objects.get(user=cls.users['journalist'])
+        article = Article.objects.filter(journalist=journalist).first()
+        if article is None:
+            article = Article.objects.create(
+                title='Budget article', content='Content',
+                journalist=journalist, publisher=journalist.publisher)
+        newsletter = Newsletter.objects.filter(journalist=journalist).first()
+        if newsletter is None:
+            newsletter = Newsletter.objects.create(
+                title='Budget newsletter', content='Content',
+                journalist=journalist, publisher=journalist.publisher)
+
+        cls.kwargs = {
+            'article': {'article_id': article.id},
+            'post': {'post_id': article.id},
+            'newsletter': {'newsletter_id': newsletter.id},
+            'published_article':
+                {'pk': Article.objects.published().order_by('id')[0].id},
+            'published_newsletter':
+                {'pk': Newsletter.objects.published().order_by('id')[0].id},
+        }
+        # Matches every seeded post, so each page is a full one
+        rebuild_index()
+        cls.query_strings = {
+            'search': {'q': 'body'},
+        }
+
+    @classmethod
+    def tearDownClass(cls):
+        if REPORT_PATH:
+            with open(REPORT_PATH, 'w', encoding='utf-8') as report:
+                json.dump({
+                    'vendor': connection.vendor,
+                    'python': platform.python_version(),
+                    'dataset': DATASET,
+                    'seed_seconds': round(cls.seed_seconds, 3),
+                    'results': cls.results,
+                }, report, indent=2)
+        super().tearDownClass()
+
+    def budget_for(self, max_queries):
+        """
+        Query budgets that still depend on the dataset size.
+        """
+        if max_queries is not None:
+            return max_queries
+        # Streaming exports read one chunk per query
+        return DATASET['articles'] // EXPORT_CHUNK_SIZE + 6
+
+    def measure(self, url_name, role, kwargs_key):
+        """
+        Request a URL as ``role`` and return (status, queries, seconds).
+        """
+        self.client.logout()
+        if role:
+            self.client.login(username=self.users[role].username,
+                               password=SEED_PASSWORD)
+        url = reverse(url_name, kwargs=self.kwargs.get(kwargs_key))
+
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            response = self.client.get(url,
+                                       self.query_strings.get(kwargs_key))
+            if response.streaming and response.is_async:
+                async_to_sync(consume)(response.streaming_content)
+            elif response.streaming:
+                b''.join(response.streaming_content)
+            seconds = time.perf_counter() - started
+        return response.status_code, len(ctx.captured_queries), seconds
+
+    def test_view_budgets(self):
+        for url_name, role, kwargs_key, max_queries, max_seconds in BUDGETS:
+            with self.subTest(url=url_name, role=role):
+                status_code, queries, seconds = self.measure(
+                    url_name, role, kwargs_key)
+                budget = self.budget_for(max_queries)
+                time_budget = max_seconds * TIME_FACTOR
+                self.results.append({
+                    'url': url_name,
+                    'role': role,
+                    'status': status_code,
+                    'queries': queries,
+                    'max_queries': budget,
+                    'seconds': round(seconds, 4),
+                    'max_seconds': time_budget,
+                })
+                self.assertLess(status_code, 500)
+                self.assertLessEqual(queries, budget)
+                self.assertLessEqual(seconds, time_budget)
+
+
+def index_queries(publisher, reader):
+    """
+    The hot queries of the app and the indexes each may use.
+
+    SQLite names the index behind a unique constraint
+    ``sqlite_autoindex_<table>_N`` rather than after the constraint.
+    """
+    return [
+        ('approved articles', ('article_approved_idx',),
+         Article.objects.published().order_by('-created_at', '-id')[:20]),
+        ('approved newsletters', ('newsletter_approved_idx',),
+         Newsletter.objects.published().order_by('-created_at', '-id')[:20]),
+        ('publisher pending articles', ('article_queue_idx',),
+         Article.objects.pending().filter(publisher=publisher)),
+        ('publisher pending newsletters', ('newsletter_queue_idx',),
+         Newsletter.objects.pending().filter(publisher=publisher)),
+        ('moderation queue page', ('article_queue_idx',),
+         Article.objects.pending().filter(publisher=publisher)
+         .order_by('created_at', 'id')[:51]),
+        ('pulled feed page', ('article_published_idx',),
+         Article.objects.published().filter(publisher=publisher)
+         .order_by(F('published_at').desc(nulls_last=True), '-id')[:20]),
+        ('publisher subscribers', ('subscription_type_pub_idx',),
+         Subscription.objects.filter(type='publisher', publisher=publisher)),
+        ('existing subscription', ('unique_publisher_subscription',
+                                   'sqlite_autoindex_newsapp_subscription'),
+         Subscription.objects.filter(user=reader, type='publisher',
+                                     publisher=publisher)),
+        ('reset token', ('resettoken_token_used_idx',),
+         ResetToken.objects.filter(token='token-42', used=False)),
+    ]
+
+
+class IndexUsageTests(TestCase):
+    """
+    Runs EXPLAIN on each hot query over the seeded dataset and checks the
+    planner picks the intended index.
+    """
+
+    results = []
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = seed_dataset(**DATASET)
+        expiry = timezone.now()
+        ResetToken.objects.bulk_create([
+            ResetToken(user=cls.users['reader'], token=f'token-{i}',
+                       expiry_date=expiry, used=i % 2 == 0)
+            for i in range(500)
+        ])
+        # Give the planner real statistics, as a long-running database has
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('ANALYZE')
+            else:
+                tables = [model._meta.db_table for model in
+                          (Article, Newsletter, Subscription, ResetToken)]
+                cursor.execute(f"ANALYZE TABLE {', '.join(tables)}")
+                cursor.fetchall()
+
+    @classmethod
+    def tearDownClass(cls):
+        if REPORT_PATH:
+            root, ext = os.path.splitext(REPORT_PATH)
+            with open(f'{root}.indexes{ext}', 'w', encoding='utf-8') as report:
+                json.dump({
+                    'vendor': connection.vendor,
+                    'dataset': DATASET,
+                    'results': cls.results,
+                }, report, indent=2)
+        super().tearDownClass()
+
+    def test_hot_queries_use_indexes(self):
+        publisher = Publisher.objects.order_by('id').first()
+        for label, indexes, queryset in index_queries(publisher,
+                                                      self.users['reader']):
+            with self.subTest(query=label):
+                plan = queryset.explain()
+                started = time.perf_counter()
+                list(queryset)
+                seconds = time.perf_counter() - started
+                self.results.append({
+                    'query': label,
+                    'indexes': indexes,
+                    'plan': plan,
+                    'seconds': round(seconds, 5),
+                })
+                self.assertTrue(any(index in plan for index in indexes),
+                                plan)
+
+
+class SearchLatencyTests(SimpleTestCase):
+    """
+    Query latency of the inverted index over a synthetic corpus whose
+    term frequencies follow Zipf's law, like real text.
+    """
+
+    VOCABULARY = 50000
+    TERMS_PER_DOC = 60
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        rng = random.Random(0)
+        words = [f'w{rank}' for rank in range(cls.VOCABULARY)]
+        cumulative = list(itertools.accumulate(
+            1 / (rank + 1) for rank in range(cls.VOCABULARY)))
+        cls.index = InvertedIndex()
+        for key in range(SEARCH_DOCS):
+            terms = {}
+            for word in rng.choices(words, cum_weights=cumulative,
+                                      k=cls.TERMS_PER_DOC):
+                terms[word] = terms.get(word, 0) + 1
+            cls.index.add(key, terms)
+        # Two- and three-word queries over the less common part of the
+        # vocabulary, where a search term actually narrows the results
+        cls.queries = [' '.join(rng.sample(words[100:5000], rng.randint(2, 3)))
+                       for _ in range(200)]
+
+    def test_query_latency(self):
+        timings = []
+        for query in self.queries:
+            started = time.perf_counter()
+            self.index.search(query)
+            timings.append((time.perf_counter() - started) * 1000)
+        median = statistics.median(timings)
+        p95 = statistics.quantiles(timings, n=20)[-1]
+        if REPORT_PATH:
+            root, ext = os.path.splitext(REPORT_PATH)
+            with open(f'{root}.search{ext}', 'w', encoding='utf-8') as report:
+                json.dump({'documents': SEARCH_DOCS, 'median_ms': median,
+                           'p95_ms': p95}, report, indent=2)
+        self.assertLess(median, 10 * TIME_FACTOR)
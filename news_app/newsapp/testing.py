@@ -0,0 +1,60 @@
+"""Fixtures shared by the test modules"""
+import tempfile
+from django.contrib.auth.models import User
+from django.test import override_settings
+from rest_framework.test import APIClient
+from .models import Journalist, Publisher
+
+PASSWORD = 'password123'
+
+
+def create_newsroom(prefix, writer=None):
+    """
+    A publisher and one of its journalists.
+
+    Args:
+        prefix (str): Starts the usernames, '<prefix>pub' for the
+            publisher and '<prefix>writer' for the journalist. Neither
+            has a password; tests log them in with ``force_login``.
+        writer (User): The journalist's user, instead of a new one.
+
+    Returns:
+        tuple: (publisher, journalist)
+    """
+    publisher = Publisher.objects.create(
+        user=User.objects.create_user(username=f'{prefix}pub'))
+    journalist = Journalist.objects.create(
+        user=writer or User.objects.create_user(username=f'{prefix}writer'),
+        publisher=publisher)
+    return publisher, journalist
+
+
+class TemporarySearchIndexMixin:
+    """
+    Keeps each test's search index in its own temporary directory, so
+    indexing on save never writes to the real one.
+    """
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(NEWSAPP_SEARCH_INDEX_PATH=directory.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+
+class JournalistAPIClientMixin:
+    """
+    Gives each test ``self.user``, a journalist (``self.journalist``) of
+    ``self.publisher``, and an API client authenticated as them.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='apiuser',
+                                             password=PASSWORD)
+        self.publisher, self.journalist = create_newsroom('api',
+                                                          writer=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
@@ -1,13 +1,56 @@
-from django.test import TestCase, Client
+import json
+import os
+import runpy
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from smtplib import SMTPRecipientsRefused, SMTPServerDisconnected
+from unittest import mock, skipUnless
+import tweepy
+from asgiref.sync import async_to_sync
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.test import (TestCase, TransactionTestCase, SimpleTestCase, Client, RequestFactory,
+                         override_settings)
+from django.template import engines
+from django.template.loaders.cached import Loader as CachedLoader
+from django.utils import timezone
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group, Permission
 from django.contrib.contenttypes.models import ContentType
-from .models import Publisher, Journalist, Article, Subscription
+from django.db import IntegrityError, connection, connections, transaction
+from django.test.utils import CaptureQueriesContext
+from .models import (Publisher, Journalist, Editor, Reader, Article, Newsletter,
+                     Subscription, OutboxEvent, FeedEntry, ArticleImportSerializer)
+from .middleware import PRIMARY_COOKIE, ReplicaMiddleware
+from .routers import ReplicaRouter, read_from_replica
 from .signals import groups_permissions
+from .testing import TemporarySearchIndexMixin, create_newsroom
+from .functions.feed import fan_out, read_feed
+from .functions.instrumentation import (JsonFormatter, RequestStats, install_connection_timer,
+                                        instrument, registry)
+from .functions.mailer import deliver_to_subscribers
+from .functions.roles import ensure_group_permissions
+from .functions import fragments, moderation, object_cache, outbox
+from .functions.ingest import import_posts
+from .functions.search import (IndexStore, InvertedIndex, load_hits, post_terms, search,
+                               tokenize)
+from .functions.twitter_api import (PAUSE_KEY, ClientPool, FakeClient, RateLimited,
+                                    TokenBucket, post_tweet)
 
 User = get_user_model()
 
+FAKE_TWITTER = 'newsapp.functions.twitter_api.FakeClient'
+
 
 # Groups & Permissions Tests
 class GroupsPermissionsTest(TestCase):
@@ -31,6 +74,11 @@ class GroupsPermissionsTest(TestCase):
         self.can_remove = Permission.objects.get(codename='can_remove', content_type=content_type)
         self.can_subscribe = Permission.objects.get(codename='can_subscribe', content_type=content_type)
 
+    def model_perms(self, model, codenames):
+        # Model permissions attached by ensure_group_permissions()
+        content_type = ContentType.objects.get_for_model(model)
+        return list(Permission.objects.filter(content_type=content_type, codename__in=codenames))
+
     def test_groups_created(self):
         self.assertIsNotNone(self.readers)
         self.assertIsNotNone(self.publishers)
@@ -47,17 +95,23 @@ class GroupsPermissionsTest(TestCase):
 
     def test_readers_permissions(self):
         perms = self.readers.permissions.all()
-        self.assertIn(self.can_subscribe, perms)
-        self.assertEqual(perms.count(), 1)
+        expected = [self.can_subscribe] + self.model_perms(Reader, ['can_subscribe'])
+        for perm in expected:
+            self.assertIn(perm, perms)
+        self.assertEqual(perms.count(), len(expected))
 
     def test_publishers_permissions(self):
         perms = self.publishers.permissions.all()
-        self.assertIn(self.can_publish, perms)
-        self.assertEqual(perms.count(), 1)
+        expected = [self.can_publish, self.can_view]
+        expected += self.model_perms(Publisher, ['can_publish', 'can_view'])
+        for perm in expected:
+            self.assertIn(perm, perms)
+        self.assertEqual(perms.count(), len(expected))
 
     def test_journalists_permissions(self):
         perms = self.journalists.permissions.all()
         expected = [self.can_create, self.can_view, self.can_update, self.can_remove, self.join_publisher]
+        expected += self.model_perms(Journalist, ['can_update', 'can_create', 'can_remove', 'can_view'])
         for perm in expected:
             self.assertIn(perm, perms)
         self.assertEqual(perms.count(), len(expected))
@@ -65,6 +119,7 @@ class GroupsPermissionsTest(TestCase):
     def test_editors_permissions(self):
         perms = self.editors.permissions.all()
         expected = [self.can_view, self.can_update, self.can_remove, self.join_publisher]
+        expected += self.model_perms(Editor, ['can_update', 'can_remove', 'can_view', 'can_publish'])
         for perm in expected:
             self.assertIn(perm, perms)
         self.assertEqual(perms.count(), len(expected))
@@ -139,3 +194,1131 @@ class NewsAppCRUDTests(TestCase):
         response = self.client.get(reverse('news_app:view_mine'))
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, 'My Article')
+
+
+# Query count tests
+class ListingQueryCountTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='reader', password='password123')
+        publisher_user = User.objects.create_user(username='publisher', password='password123')
+        self.publisher = Publisher.objects.create(user=publisher_user)
+        self.client = Client()
+        self.client.login(username='reader', password='password123')
+
+    def add_articles(self, count):
+        for i in range(count):
+            author = User.objects.create_user(username=f'author{Journalist.objects.count()}')
+            journalist = Journalist.objects.create(user=author, publisher=self.publisher)
+            Article.objects.create(title=f'Article {i}', content='Content',
+                                   journalist=journalist, publisher=self.publisher,
+                                   approved=True)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_article_list_queries_do_not_grow_with_rows(self):
+        url = reverse('news_app:article_list')
+        self.add_articles(2)
+        small = self.count_queries(url)
+        self.add_articles(10)
+        self.assertEqual(self.count_queries(url), small)
+
+
+class PublisherTeamViewTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='teampub', password='password123')
+        self.publisher = Publisher.objects.create(user=self.user)
+        self.client = Client()
+        self.client.login(username='teampub', password='password123')
+
+    def add_journalist(self, approved=1, pending=1):
+        author = User.objects.create_user(username=f'teamwriter{Journalist.objects.count()}')
+        journalist = Journalist.objects.create(user=author, publisher=self.publisher)
+        for i in range(approved + pending):
+            Article.objects.create(title=f'{author.username} {i}', content='Content',
+                                   journalist=journalist, publisher=self.publisher,
+                                   approved=i < approved)
+        return journalist
+
+    def test_counts_and_recent_posts(self):
+        self.add_journalist(approved=3, pending=2)
+        response = self.client.get(reverse('news_app:publisher_team_view'), {'posts': 2})
+        self.assertEqual(response.status_code, 200)
+        journalist = response.context['journalists'][0]
+        self.assertEqual(journalist.articles_approved, 3)
+        self.assertEqual(journalist.articles_pending, 2)
+        self.assertEqual(journalist.newsletters_approved, 0)
+        self.assertEqual(len(journalist.recent_articles), 2)
+
+    def test_queries_do_not_grow_with_team(self):
+        url = reverse('news_app:publisher_team_view')
+        self.add_journalist()
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url)
+        for _ in range(5):
+            self.add_journalist()
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(url)
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+
+
+class RoleResolutionTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='roleuser', password='password123')
+        self.user.groups.add(Group.objects.get(name='Reader'))
+        self.client = Client()
+        self.client.login(username='roleuser', password='password123')
+
+    def test_groups_created_on_migrate(self):
+        reader = Group.objects.get(name='Reader')
+        self.assertTrue(reader.permissions.filter(codename='can_subscribe',
+                                                  content_type__app_label='newsapp').exists())
+
+    def test_home_skips_group_queries_once_cached(self):
+        url = reverse('news_app:home')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.context['group'], 'Reader')
+        sql = ' '.join(q['sql'] for q in ctx.captured_queries)
+        self.assertNotIn('auth_group', sql)
+        self.assertNotIn('auth_permission', sql)
+
+    def test_group_change_invalidates_cached_roles(self):
+        url = reverse('news_app:home')
+        self.assertEqual(self.client.get(url).context['group'], 'Reader')
+        self.user.groups.add(Group.objects.get(name='Publisher'))
+        self.assertEqual(self.client.get(url).context['group'], 'Publisher')
+
+
+@override_settings(NEWSAPP_TWITTER_CLIENT=FAKE_TWITTER)
+class PublishOutboxTests(TestCase):
+
+    def setUp(self):
+        FakeClient.reset()
+        self.publisher, self.journalist = create_newsroom('outbox')
+        self.user = self.publisher.user
+        self.user.groups.add(Group.objects.get(name='Publisher'))
+        self.article = Article.objects.create(title='Outbox Article', content='Content',
+                                              journalist=self.journalist,
+                                              publisher=self.publisher)
+        for i in range(3):
+            reader = User.objects.create_user(username=f'outboxreader{i}',
+                                              email=f'reader{i}@test.com')
+            Subscription.objects.create(user=reader, type='publisher', publisher=self.publisher)
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def publish(self):
+        return self.client.post(reverse('news_app:publish_post'),
+                                {'post_type': 'article', 'post_id': self.article.id},
+                                HTTP_ACCEPT='application/json')
+
+    def test_publish_queues_side_effects(self):
+        response = self.publish()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(sorted(OutboxEvent.objects.values_list('kind', flat=True)),
+                         ['email', 'feed', 'tweet'])
+
+    def test_publish_twice_is_idempotent(self):
+        self.publish()
+        self.publish()
+        self.assertEqual(OutboxEvent.objects.count(), 3)
+
+    def test_drain_sends_email_and_tweet(self):
+        self.publish()
+        call_command('drain_outbox', '--once', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual([len(m.to) for m in mail.outbox], [1, 1, 1])
+        self.assertEqual(FakeClient.sent, [f'New Post by {self.publisher}: Outbox Article'])
+        self.assertFalse(OutboxEvent.objects.exclude(status='done').exists())
+
+    def test_failed_tweet_is_retried_later(self):
+        FakeClient.error = tweepy.TweepyException("Service unavailable")
+        self.publish()
+        call_command('drain_outbox', '--once', stdout=StringIO())
+        event = OutboxEvent.objects.get(kind='tweet')
+        self.assertEqual(event.status, 'pending')
+        self.assertEqual(event.attempts, 1)
+        self.assertGreater(event.available_at, timezone.now())
+
+
+class MailerTests(TestCase):
+
+    def setUp(self):
+        publisher_user = User.objects.create_user(username='mailpub')
+        self.publisher = Publisher.objects.create(user=publisher_user)
+        for i in range(5):
+            reader = User.objects.create_user(username=f'mailreader{i}',
+                                              email=f'mailreader{i}@test.com')
+            Subscription.objects.create(user=reader, type='publisher', publisher=self.publisher)
+        no_email = User.objects.create_user(username='noemail')
+        Subscription.objects.create(user=no_email, type='publisher', publisher=self.publisher)
+
+    @override_settings(NEWSAPP_EMAIL_BATCH_SIZE=2)
+    def test_batches_reuse_one_connection_each(self):
+        stats = deliver_to_subscribers(self.publisher.id, 'Subject', 'Body')
+        self.assertEqual(stats.sent, 5)
+        self.assertEqual(stats.batches, 3)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertTrue(all(len(m.to) == 1 for m in mail.outbox))
+
+    @override_settings(NEWSAPP_EMAIL_BATCH_SIZE=2)
+    def test_resume_after_last_batch(self):
+        first_two = list(Subscription.objects.order_by('id').values_list('id', flat=True)[:2])
+        stats = deliver_to_subscribers(self.publisher.id, 'Subject', 'Body',
+                                       after_id=first_two[-1])
+        self.assertEqual(stats.sent, 3)
+
+    def test_refused_recipient_is_counted_not_fatal(self):
+        refused = SMTPRecipientsRefused({'mailreader0@test.com': (550, b'No such user')})
+        sent = [refused, 1, 1, 1, 1]
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                        side_effect=sent):
+            stats = deliver_to_subscribers(self.publisher.id, 'Subject', 'Body')
+        self.assertEqual((stats.sent, stats.failed), (4, 1))
+        self.assertIn('messages_per_second', stats.as_dict())
+
+    @override_settings(NEWSAPP_EMAIL_BATCH_SIZE=10)
+    def test_dropped_connection_keeps_progress(self):
+        progress = []
+        sent = [1, 1, SMTPServerDisconnected('Connection unexpectedly closed')]
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                        side_effect=sent), self.assertRaises(SMTPServerDisconnected):
+            deliver_to_subscribers(self.publisher.id, 'Subject', 'Body',
+                                   on_batch=lambda stats: progress.append(stats.last_id))
+        second = Subscription.objects.order_by('id').values_list('id', flat=True)[1]
+        self.assertEqual(progress, [second])
+        stats = deliver_to_subscribers(self.publisher.id, 'Subject', 'Body',
+                                       after_id=progress[-1])
+        self.assertEqual(stats.sent, 3)
+
+
+class FeedTests(TestCase):
+
+    def setUp(self):
+        self.publisher, self.journalist = create_newsroom('feed')
+        self.reader = User.objects.create_user(username='feedreader', password='password123')
+        self.reader.groups.add(Group.objects.get(name='Reader'))
+        Subscription.objects.create(user=self.reader, type='publisher', publisher=self.publisher)
+        # Following both the publisher and the journalist still gives one entry
+        Subscription.objects.create(user=self.reader, type='journalist', journalist=self.journalist)
+
+    def approve(self, title):
+        article = Article.objects.create(title=title, content='Content', approved=True,
+                                         journalist=self.journalist, publisher=self.publisher)
+        fan_out('article', article)
+        return article
+
+    def test_fan_out_writes_one_entry_per_subscriber(self):
+        article = self.approve('Feed Article')
+        fan_out('article', article)
+        self.assertEqual(list(FeedEntry.objects.values_list('user', 'article')),
+                         [(self.reader.id, article.id)])
+
+    def test_read_feed_is_newest_first(self):
+        first = self.approve('First')
+        second = self.approve('Second')
+        posts = [post for _, _, post in read_feed(self.reader)]
+        self.assertEqual(posts, [second, first])
+
+    @override_settings(NEWSAPP_FEED_MAX_LENGTH=2)
+    def test_feed_is_capped(self):
+        articles = [self.approve(f'Capped {i}') for i in range(3)]
+        # Fan-out leaves trimming to the periodic command
+        self.assertEqual(FeedEntry.objects.count(), 3)
+        call_command('trim_feeds', stdout=StringIO())
+        self.assertEqual(set(FeedEntry.objects.values_list('article', flat=True)),
+                         {articles[1].id, articles[2].id})
+
+    @override_settings(NEWSAPP_FEED_FANOUT_LIMIT=0)
+    def test_large_publisher_is_read_on_demand(self):
+        Subscription.objects.filter(type='journalist').delete()
+        article = self.approve('Popular')
+        self.publisher.refresh_from_db()
+        self.assertTrue(self.publisher.fanout_on_read)
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEqual([post for _, _, post in read_feed(self.reader)], [article])
+
+    def test_feed_view(self):
+        self.approve('Visible Article')
+        client = Client()
+        client.login(username='feedreader', password='password123')
+        response = client.get(reverse('news_app:feed'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Visible Article')
+
+    def page_through(self, size):
+        """Follow the feed view's "older" links, returning the post titles."""
+        client = Client()
+        client.login(username='feedreader', password='password123')
+        titles, query = [], ''
+        while True:
+            response = client.get(reverse('news_app:feed') + (query or f'?size={size}'))
+            items = response.context['items']
+            titles += [item['post'].title for item in items]
+            if not response.context['older']:
+                return titles
+            query = f"{response.context['older']}&size={size}"
+
+    def test_posts_approved_together_are_not_skipped(self):
+        # One bulk approval gives every post the same publish time
+        published_at = timezone.now()
+        for i in range(45):
+            model = Newsletter if i % 3 == 0 else Article
+            post = model.objects.create(title=f'Batch {i}', content='Content', approved=True,
+                                        journalist=self.journalist, publisher=self.publisher,
+                                        published_at=published_at)
+            fan_out(model.__name__.lower(), post)
+        titles = self.page_through(20)
+        self.assertEqual(len(titles), 45)
+        self.assertEqual(set(titles), {f'Batch {i}' for i in range(45)})
+
+    @override_settings(NEWSAPP_FEED_FANOUT_LIMIT=0)
+    def test_pulled_posts_keep_their_place_when_edited(self):
+        Subscription.objects.filter(type='journalist').delete()
+        first = self.approve('First')
+        second = self.approve('Second')
+        first.content = 'Corrected'
+        first.save()
+        self.assertEqual([post for _, _, post in read_feed(self.reader)], [second, first])
+
+
+class SubscriptionConstraintTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='uniquereader')
+        self.publisher = Publisher.objects.create(
+            user=User.objects.create_user(username='uniquepub'))
+
+    def test_duplicate_subscription_is_rejected(self):
+        Subscription.objects.create(user=self.user, type='publisher', publisher=self.publisher)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Subscription.objects.create(user=self.user, type='publisher',
+                                        publisher=self.publisher)
+
+    def test_get_or_create_returns_existing_row(self):
+        first, created = Subscription.objects.get_or_create(
+            user=self.user, type='publisher', publisher=self.publisher)
+        second, created_again = Subscription.objects.get_or_create(
+            user=self.user, type='publisher', publisher=self.publisher)
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(first, second)
+
+
+class InvertedIndexTests(TestCase):
+
+    def add(self, index, key, title, content):
+        index.add(key, post_terms(Article(title=title, content=content)))
+
+    def test_tokenize_stems_and_drops_stopwords(self):
+        self.assertEqual(tokenize('The elections'), tokenize('election'))
+
+    def test_title_matches_rank_first(self):
+        index = InvertedIndex()
+        self.add(index, 2, 'Weather report', 'Rain expected around the election')
+        self.add(index, 4, 'Election results', 'Counting continues')
+        self.add(index, 6, 'Sports', 'Nothing relevant here')
+        results = index.search('election')
+        self.assertEqual(results.total, 2)
+        self.assertEqual([hit.post_id for hit in results.hits], [2, 1])
+
+    def test_remove_and_snapshot_round_trip(self):
+        index = InvertedIndex()
+        self.add(index, 2, 'Budget speech', 'Taxes')
+        self.add(index, 4, 'Budget vote', 'Parliament')
+        index.remove(2)
+        restored = InvertedIndex.loads(index.dumps())
+        self.assertEqual([hit.post_id for hit in restored.search('budget').hits], [2])
+        self.assertEqual(restored.search('taxes').total, 0)
+
+    def test_journal_is_shared_between_processes(self):
+        with tempfile.TemporaryDirectory() as path:
+            writer, reader = IndexStore(path), IndexStore(path)
+            writer.append({'op': 'add', 'key': 2, 'terms': {'flood': 1}})
+            reader.refresh()
+            self.assertEqual(reader.index.search('flood').total, 1)
+            writer.append({'op': 'remove', 'key': 2})
+            reader.refresh()
+            self.assertEqual(reader.index.search('flood').total, 0)
+
+    def test_rebuild_is_noticed_when_the_new_journal_is_longer(self):
+        with tempfile.TemporaryDirectory() as path:
+            writer, reader = IndexStore(path), IndexStore(path)
+            writer.append({'op': 'add', 'key': 2, 'terms': {'flood': 1}})
+            reader.refresh()
+
+            def documents():
+                # Changes committed while the rebuild reads the database
+                # grow the new journal past the reader's old offset
+                writer.append(*({'op': 'add', 'key': key, 'terms': {'storm': 1}}
+                                for key in range(4, 40, 2)))
+                reader.refresh()
+                yield 2, {'flood': 1}
+
+            writer.rebuild(documents())
+            self.assertEqual(reader.index.search('storm').total, 18)
+            reader.refresh()
+            self.assertEqual(reader.index.search('storm').total, 18)
+            self.assertEqual(reader.index.search('flood').total, 1)
+
+    @skipUnless(os.name == 'posix', "Appends are only locked on POSIX")
+    def test_journal_is_compacted(self):
+        with tempfile.TemporaryDirectory() as path:
+            writer, reader = IndexStore(path, max_journal_bytes=200), IndexStore(path)
+            reader.refresh()
+            self.assertFalse(writer.append({'op': 'add', 'key': 2, 'terms': {'flood': 1}}))
+            for key in range(4, 42, 2):
+                writer.append({'op': 'add', 'key': key, 'terms': {'flood': 1}})
+            # Appending only reports it; the worker compacts
+            self.assertTrue(writer.append({'op': 'remove', 'key': 2}))
+            self.assertTrue(writer.compaction_due())
+            self.assertTrue(writer.compact(writer.max_journal_bytes))
+            self.assertFalse(writer.compaction_due())
+            self.assertLess(os.path.getsize(os.path.join(path, 'journal.log')), 250)
+            for store in (reader, IndexStore(path)):
+                store.refresh()
+                self.assertEqual(store.index.search('flood').total, 19)
+
+
+class SearchSignalTests(TemporarySearchIndexMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.publisher, self.journalist = create_newsroom('search')
+
+    def create(self, approved):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Article.objects.create(title='Harbour expansion', content='Cranes',
+                                          journalist=self.journalist,
+                                          publisher=self.publisher, approved=approved)
+
+    def test_only_approved_posts_are_searchable(self):
+        self.create(approved=False)
+        self.assertEqual(search('harbour').total, 0)
+        article = self.create(approved=True)
+        self.assertEqual([hit.post_id for hit in search('harbour').hits], [article.id])
+
+    def test_deleted_post_is_removed(self):
+        article = self.create(approved=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            article.delete()
+        self.assertEqual(search('harbour').total, 0)
+
+    def test_rebuild_command(self):
+        Article.objects.create(title='Harbour expansion', content='Cranes',
+                               journalist=self.journalist, publisher=self.publisher,
+                               approved=True)
+        self.assertEqual(search('harbour').total, 0)
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(search('harbour').total, 1)
+
+    def test_stale_hits_are_not_loaded(self):
+        article = self.create(approved=True)
+        # Unapproved without the signal that would unindex it
+        Article.objects.filter(id=article.id).update(approved=False)
+        results = search('harbour')
+        self.assertEqual(results.total, 1)
+        self.assertEqual(load_hits(results.hits), [])
+
+    @skipUnless(os.name == 'posix', "Appends are only locked on POSIX")
+    @override_settings(NEWSAPP_SEARCH_JOURNAL_MAX_BYTES=50)
+    def test_worker_compacts_the_journal(self):
+        self.create(approved=True)
+        journal = os.path.join(settings.NEWSAPP_SEARCH_INDEX_PATH, 'journal.log')
+        self.assertGreater(os.path.getsize(journal), 50)
+        call_command('drain_outbox', '--once', stdout=StringIO())
+        self.assertLess(os.path.getsize(journal), 50)
+        self.assertEqual(search('harbour').total, 1)
+
+
+class ObjectCacheTests(TestCase):
+
+    def setUp(self):
+        object_cache.get_cache().clear()
+        self.publisher, self.journalist = create_newsroom('cache')
+        self.article = Article.objects.create(title='Breaking', content='Story',
+                                              journalist=self.journalist,
+                                              publisher=self.publisher, approved=True)
+        self.url = reverse('news_app:read_article', args=[self.article.id])
+
+    def article_queries(self, **headers):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, **headers)
+        self.assertEqual(response.status_code, 200)
+        return [q for q in ctx.captured_queries if 'newsapp_article' in q['sql']]
+
+    def test_second_read_skips_database(self):
+        self.assertTrue(self.article_queries())
+        self.assertEqual(self.article_queries(), [])
+        self.assertTrue(self.article_queries(HTTP_ACCEPT='application/json'))
+        self.assertEqual(self.article_queries(HTTP_ACCEPT='application/json'), [])
+
+    def test_save_invalidates(self):
+        self.client.get(self.url)
+        self.article.title = 'Updated headline'
+        self.article.save()
+        self.assertContains(self.client.get(self.url), 'Updated headline')
+
+    def test_delete_invalidates(self):
+        self.client.get(self.url)
+        self.article.delete()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_concurrent_miss_waits_for_first_computation(self):
+        key = object_cache.entry_key('article', self.article.id, 'json')
+        cache = object_cache.get_cache()
+        cache.add(f'{key}:lock', 1)
+        timer = threading.Timer(0.05, lambda: cache.set(key, {'title': 'From leader'}))
+        timer.start()
+        compute = mock.Mock()
+        value = object_cache.get_or_compute('article', self.article.id, 'json', compute)
+        timer.join()
+        self.assertEqual(value, {'title': 'From leader'})
+        compute.assert_not_called()
+
+
+@override_settings(NEWSAPP_TWITTER_CLIENT=FAKE_TWITTER)
+class OutboxPipelineTests(TemporarySearchIndexMixin, TransactionTestCase):
+    """
+    The async drain handles events in worker threads with their own
+    connections, so the rows must be committed.
+    """
+
+    def setUp(self):
+        # Posts are indexed on commit, into a temporary index
+        super().setUp()
+        FakeClient.reset()
+        self.publisher, journalist = create_newsroom('pipeline')
+        for i in range(2):
+            reader = User.objects.create_user(username=f'pipelinereader{i}',
+                                              email=f'pipeline{i}@test.com')
+            Subscription.objects.create(user=reader, type='publisher', publisher=self.publisher)
+        for i in range(3):
+            article = Article.objects.create(title=f'Pipeline {i}', content='Content',
+                                             journalist=journalist, publisher=self.publisher,
+                                             approved=True)
+            outbox.enqueue_publication('article', article, self.publisher)
+
+    def test_claim_leases_events(self):
+        claimed = outbox.claim(batch_size=4, kinds=['email', 'tweet'])
+        self.assertEqual(len(claimed), 4)
+        self.assertEqual(len(outbox.claim(batch_size=10, kinds=['email', 'tweet'])), 2)
+        self.assertEqual(outbox.claim(kinds=['email', 'tweet']), [])
+        self.assertTrue(OutboxEvent.objects.filter(available_at__gt=timezone.now()).exists())
+
+    def test_async_drain_processes_events_concurrently(self):
+        call_command('drain_outbox', '--once', '--concurrency', '4',
+                     '--kind', 'email', '--kind', 'tweet', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 6)
+        self.assertEqual(len(FakeClient.sent), 3)
+        self.assertEqual(OutboxEvent.objects.filter(status='done').count(), 6)
+
+    def test_async_drain_schedules_retries(self):
+        FakeClient.error = tweepy.TweepyException("Service unavailable")
+        succeeded, failed = async_to_sync(outbox.adrain)(kinds=['tweet'])
+        self.assertEqual((succeeded, failed), (0, 3))
+        for event in OutboxEvent.objects.filter(kind='tweet'):
+            self.assertEqual((event.status, event.attempts), ('pending', 1))
+            self.assertLess(event.available_at,
+                            timezone.now() + outbox.backoff(1) + timedelta(seconds=5))
+
+
+@override_settings(NEWSAPP_TWITTER_CLIENT=FAKE_TWITTER)
+class TwitterClientTests(TestCase):
+
+    def setUp(self):
+        FakeClient.reset()
+        cache.delete(PAUSE_KEY)
+        self.addCleanup(cache.delete, PAUSE_KEY)
+        self.publisher, journalist = create_newsroom('tweet')
+        for i in range(3):
+            article = Article.objects.create(title=f'Tweet {i}', content='Content',
+                                             journalist=journalist, publisher=self.publisher,
+                                             approved=True)
+            outbox.enqueue('tweet', {'post_type': 'article', 'post_id': article.id,
+                                     'publisher_id': self.publisher.id},
+                           f'article:{article.id}:tweet')
+
+    def test_token_bucket_spaces_out_a_burst(self):
+        bucket = TokenBucket(2, 60)
+        self.assertEqual([bucket.take(), bucket.take()], [0.0, 0.0])
+        self.assertAlmostEqual(bucket.take(), 30, delta=1)
+
+    def test_pool_reuses_clients(self):
+        created = []
+        pool = ClientPool(lambda: created.append(object()) or created[-1], 2)
+        for _ in range(3):
+            with pool.client() as client:
+                self.assertIs(client, created[0])
+        self.assertEqual(len(created), 1)
+
+    @override_settings(NEWSAPP_TWEET_RATE_LIMIT=1)
+    def test_burst_beyond_the_limit_waits_in_the_outbox(self):
+        self.assertEqual(outbox.drain(), (1, 2))
+        self.assertEqual(len(FakeClient.sent), 1)
+        waiting = OutboxEvent.objects.filter(status='pending')
+        self.assertEqual(waiting.count(), 2)
+        for event in waiting:
+            self.assertEqual(event.attempts, 0)
+            self.assertGreater(event.available_at, timezone.now() + timedelta(hours=23))
+
+    def test_429_pauses_until_the_reset_time(self):
+        reset = timezone.now() + timedelta(minutes=10)
+        FakeClient.rate_limited_until = reset.timestamp()
+        self.assertEqual(outbox.drain(), (0, 3))
+        self.assertEqual(FakeClient.sent, [])
+        for event in OutboxEvent.objects.all():
+            self.assertEqual((event.status, event.attempts), ('pending', 0))
+            self.assertAlmostEqual(event.available_at, reset, delta=timedelta(seconds=1))
+
+        # Every process sharing the cache waits, without calling the API
+        FakeClient.rate_limited_until = None
+        with self.assertRaises(RateLimited):
+            post_tweet('Still paused')
+        cache.delete(PAUSE_KEY)
+        OutboxEvent.objects.update(available_at=timezone.now())
+        self.assertEqual(outbox.drain(), (3, 0))
+        self.assertEqual(len(FakeClient.sent), 3)
+
+    def test_forbidden_tweet_fails_without_retries(self):
+        response = mock.Mock(status_code=403, reason='Forbidden',
+                             json=mock.Mock(return_value={'detail': 'Duplicate'}))
+        FakeClient.error = tweepy.Forbidden(response)
+        outbox.drain()
+        self.assertEqual(set(OutboxEvent.objects.values_list('status', 'attempts')),
+                         {('failed', 1)})
+
+    def test_crash_mid_batch_keeps_finished_events(self):
+        handle_tweet = outbox.HANDLERS['tweet']
+        calls = []
+
+        def crash_on_second(payload, checkpoint=None):
+            calls.append(payload)
+            if len(calls) == 2:
+                raise SystemExit("Worker killed")
+            handle_tweet(payload, checkpoint)
+
+        with mock.patch.dict(outbox.HANDLERS, {'tweet': crash_on_second}):
+            with self.assertRaises(SystemExit):
+                outbox.drain()
+        # The first tweet's outcome was committed before the crash
+        self.assertEqual(OutboxEvent.objects.filter(status='done').count(), 1)
+        OutboxEvent.objects.update(available_at=timezone.now())
+        self.assertEqual(outbox.drain(), (2, 0))
+        self.assertEqual(len(FakeClient.sent), 3)
+
+
+@override_settings(NEWSAPP_INSTRUMENTATION=True)
+class InstrumentationTests(TestCase):
+
+    def setUp(self):
+        registry.clear()
+        User.objects.create_user(username='metricsreader', password='password123')
+        publisher, journalist = create_newsroom('metrics')
+        Article.objects.create(title='Measured', content='Content', journalist=journalist,
+                               publisher=publisher, approved=True)
+        self.client.login(username='metricsreader', password='password123')
+
+    def test_request_is_logged_and_exported(self):
+        with self.assertLogs('newsapp.requests', 'INFO') as logs:
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get(reverse('news_app:article_list'))
+        queries = len(ctx.captured_queries)
+        fields = logs.records[0].fields
+        self.assertEqual(fields['view'], 'news_app:article_list')
+        self.assertEqual(fields['status'], 200)
+        self.assertEqual(fields['queries'], queries)
+        self.assertGreater(fields['template_ms'], 0)
+        self.assertIn('"view": "news_app:article_list"',
+                      JsonFormatter().format(logs.records[0]))
+
+        metrics = self.client.get(reverse('news_app:metrics')).content.decode()
+        self.assertIn('newsapp_requests_total{view="news_app:article_list",'
+                      'method="GET",status="200"} 1', metrics)
+        self.assertIn(f'newsapp_db_queries_total{{view="news_app:article_list"}} {queries}',
+                      metrics)
+        self.assertIn('newsapp_request_duration_seconds_count'
+                      '{view="news_app:article_list"} 1', metrics)
+
+    def test_duplicate_and_similar_queries(self):
+        stats = RequestStats()
+        for params in ((1,), (1,), (2,)):
+            stats.record_query('SELECT * FROM t WHERE id = %s', params, 0.001)
+        self.assertEqual((stats.queries, stats.duplicates, stats.similar), (3, 1, 1))
+        self.assertEqual(stats.repeated_sql(), [('SELECT * FROM t WHERE id = %s', 3)])
+
+    def test_connections_are_counted(self):
+        install_connection_timer()
+        fresh = connections.create_connection('default')
+        stats = RequestStats('GET')
+        with instrument(stats):
+            fresh.connect()
+        fresh.close()
+        stats.view = 'news_app:api_articles'
+        registry.observe(stats)
+        registry.observe(RequestStats('GET'))
+        self.assertEqual(stats.connects, 1)
+        self.assertEqual(registry.connection_totals()['opened'], 1)
+        metrics = registry.render()
+        self.assertIn('newsapp_db_connections_opened_total{alias="default"} 1', metrics)
+        self.assertIn('newsapp_db_connection_reuse_ratio{view="news_app:api_articles"} 0.0000',
+                      metrics)
+        self.assertIn('newsapp_db_connection_reuse_ratio{view=""} 1.0000', metrics)
+
+    def test_profile_header_returns_a_report(self):
+        response = self.client.get(reverse('news_app:article_list'), HTTP_X_PROFILE='1')
+        self.assertEqual(response['X-Profiled-Status'], '200')
+        self.assertIn('function calls', response.content.decode())
+
+        response = self.client.get(reverse('news_app:article_list'), HTTP_X_PROFILE='1',
+                                   REMOTE_ADDR='10.0.0.1')
+        self.assertFalse(response.has_header('X-Profiled-Status'))
+
+    def test_metrics_are_internal(self):
+        response = self.client.get(reverse('news_app:metrics'), REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 403)
+        with override_settings(NEWSAPP_INSTRUMENTATION=False):
+            self.assertEqual(self.client.get(reverse('news_app:metrics')).status_code, 404)
+
+
+class ImportCommandTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.publisher, self.journalist = create_newsroom('import')
+
+    def write(self, name, text):
+        path = f'{self.directory.name}/{name}'
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def test_import_csv_in_chunks(self):
+        path = self.write('wire.csv', 'title,content\n' + ''.join(
+            f'Story {i},Body {i}\n' for i in range(5)) + ',No title\n')
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_articles', path, '--journalist', 'importwriter',
+                     '--chunk-size', '2', stdout=stdout, stderr=stderr)
+        self.assertEqual(Article.objects.filter(journalist=self.journalist,
+                                                approved=False).count(), 5)
+        self.assertIn('5 articles created, 1 rows rejected', stdout.getvalue())
+        self.assertIn('Row 6:', stderr.getvalue())
+
+    def test_database_error_only_rejects_its_row(self):
+        path = self.write('wire.ndjson', '{"title": "One", "content": "a"}\n'
+                                         '{"title": "Two", "content": "b"}\n')
+        original = Article.save
+
+        def save(article, *args, **kwargs):
+            if article.title == 'Two':
+                raise IntegrityError("duplicate story")
+            return original(article, *args, **kwargs)
+
+        with mock.patch.object(Article.objects, 'bulk_create',
+                               side_effect=IntegrityError("batch refused")), \
+                mock.patch.object(Article, 'save', save):
+            call_command('import_articles', path, '--journalist', 'importwriter',
+                         '--type', 'article', stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(list(Article.objects.values_list('title', flat=True)), ['One'])
+
+    def test_unknown_journalist(self):
+        path = self.write('wire.ndjson', '')
+        with self.assertRaises(CommandError):
+            call_command('import_articles', path, '--journalist', 'nobody')
+
+
+@override_settings(NEWSAPP_TWITTER_CLIENT=FAKE_TWITTER)
+class BulkModerationTests(TemporarySearchIndexMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        FakeClient.reset()
+        self.user = User.objects.create_user(username='moderator', password='password123')
+        self.user.groups.add(Group.objects.get(name='Editor'))
+        self.publisher, self.journalist = create_newsroom('moderated')
+        Editor.objects.create(user=self.user, publisher=self.publisher)
+        other, other_journalist = create_newsroom('other')
+        self.foreign = Article.objects.create(title='Foreign', content='Content',
+                                              publisher=other, journalist=other_journalist)
+        self.approved = self.article('Approved harbour story', approved=True)
+        for i in range(2):
+            reader = User.objects.create_user(username=f'digestreader{i}',
+                                              email=f'digest{i}@test.com')
+            Subscription.objects.create(user=reader, type='publisher', publisher=self.publisher)
+        self.client = Client()
+        self.client.login(username='moderator', password='password123')
+
+    def article(self, title, approved=False):
+        return Article.objects.create(title=title, content='Harbour cranes',
+                                      journalist=self.journalist,
+                                      publisher=self.publisher, approved=approved)
+
+    def moderate(self, post_ids, action='approve', post_type='article'):
+        return self.client.post(reverse('news_app:moderate_posts'),
+                                {'post_type': post_type, 'action': action,
+                                 'post_id': post_ids},
+                                HTTP_ACCEPT='application/json')
+
+    def test_approve_reports_each_id(self):
+        pending = [self.article(f'Pending {i}') for i in range(3)]
+        ids = [p.id for p in pending] + [self.approved.id, self.foreign.id, 999999]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.moderate(ids)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['result'] for r in response.json()['results']],
+                         ['approved'] * 3 + ['already_approved', 'forbidden', 'not_found'])
+        self.assertEqual(Article.objects.published().filter(
+            publisher=self.publisher).count(), 4)
+        self.assertFalse(Article.objects.get(id=self.foreign.id).approved)
+        # Approved posts are searchable although update() skips post_save
+        self.assertEqual(search('pending').total, 3)
+
+    def test_queries_do_not_grow_with_batch(self):
+        def count(size):
+            ids = [self.article(f'Batch {size} {i}').id for i in range(size)]
+            with CaptureQueriesContext(connection) as queries:
+                self.moderate(ids)
+            return len(queries)
+        self.assertEqual(count(2), count(20))
+
+    def test_batch_gets_one_digest(self):
+        ids = [self.article(f'Morning {i}').id for i in range(3)]
+        self.moderate(ids)
+        self.assertEqual(sorted(OutboxEvent.objects.values_list('kind', flat=True)),
+                         ['email', 'feed', 'feed', 'feed', 'tweet'])
+        call_command('drain_outbox', '--once', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[0].subject, '3 new articles from moderatedpub')
+        self.assertIn('- Morning 2', mail.outbox[0].body)
+        self.assertEqual(len(FakeClient.sent), 1)
+        self.assertFalse(OutboxEvent.objects.exclude(status='done').exists())
+
+    def test_reject_deletes_pending_only(self):
+        pending = self.article('Rejected')
+        response = self.moderate([pending.id, self.approved.id], action='reject')
+        self.assertEqual([r['result'] for r in response.json()['results']],
+                         ['rejected', 'already_approved'])
+        self.assertFalse(Article.objects.filter(id=pending.id).exists())
+        self.assertTrue(Article.objects.filter(id=self.approved.id).exists())
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.moderate(['x']).status_code, 400)
+        self.assertEqual(self.moderate([1], action='archive').status_code, 400)
+
+    def test_queue_page(self):
+        self.article('Waiting for review')
+        response = self.client.get(reverse('news_app:moderate_posts'))
+        self.assertContains(response, 'Waiting for review')
+        self.assertNotContains(response, 'Foreign')
+        response = self.client.post(reverse('news_app:moderate_posts'),
+                                    {'post_type': 'article', 'action': 'approve',
+                                     'post_id': [self.approved.id]}, follow=True)
+        self.assertContains(response, 'Skipped')
+
+    def second_editor(self):
+        user = User.objects.create_user(username='moderator2', password='password123')
+        user.groups.add(Group.objects.get(name='Editor'))
+        Editor.objects.create(user=user, publisher=self.publisher)
+        client = Client()
+        client.login(username='moderator2', password='password123')
+        return client
+
+    def claim(self, client, post_ids, action='claim'):
+        response = client.post(reverse('news_app:claim_posts'),
+                               {'post_type': 'article', 'action': action,
+                                'post_id': post_ids},
+                               HTTP_ACCEPT='application/json')
+        return [r['result'] for r in response.json()['results']]
+
+    def test_claim_goes_to_first_moderator(self):
+        post = self.article('Contested')
+        other = self.second_editor()
+        self.assertEqual(self.claim(self.client, [post.id]), ['claimed'])
+        self.assertEqual(self.claim(other, [post.id, self.foreign.id]), ['taken', 'taken'])
+        self.assertEqual([r['result'] for r in self.moderate([post.id]).json()['results']],
+                         ['approved'])
+
+    def test_claimed_posts_are_skipped(self):
+        post = self.article('Claimed elsewhere')
+        other = self.second_editor()
+        self.claim(other, [post.id])
+        self.assertEqual([r['result'] for r in self.moderate([post.id]).json()['results']],
+                         ['claimed'])
+        self.assertEqual(self.claim(other, [post.id], action='release'), ['released'])
+        self.assertEqual([r['result'] for r in self.moderate([post.id]).json()['results']],
+                         ['approved'])
+
+    def test_expired_claim_can_be_taken(self):
+        post = self.article('Abandoned')
+        other = self.second_editor()
+        self.claim(other, [post.id])
+        with override_settings(NEWSAPP_CLAIM_TIMEOUT=0):
+            self.assertEqual(self.claim(self.client, [post.id]), ['claimed'])
+        self.assertEqual(Article.objects.get(id=post.id).claimed_by, self.user)
+
+    def test_queue_pages_oldest_first(self):
+        titles = [self.article(f'Queued {i}').title for i in range(5)]
+        seen, cursor = [], ''
+        while True:
+            response = self.client.get(reverse('news_app:moderate_posts'),
+                                       {'page_size': 2, 'cursor': cursor},
+                                       HTTP_ACCEPT='application/json')
+            page = response.json()
+            seen += [post['title'] for post in page['posts']]
+            if not page['next']:
+                break
+            cursor = page['next']
+        self.assertEqual(seen, titles)
+
+
+class StatsCounterTests(TestCase):
+
+    def setUp(self):
+        self.publisher, self.journalist = create_newsroom('stats')
+
+    def counts(self, owner, *fields):
+        owner.refresh_from_db()
+        return [getattr(owner, field) for field in fields]
+
+    def article(self, approved=False):
+        return Article.objects.create(title='Counted', content='Body', approved=approved,
+                                      journalist=self.journalist, publisher=self.publisher)
+
+    def test_posts_counted_through_their_lifecycle(self):
+        fields = ('articles_approved', 'articles_pending', 'newsletters_approved')
+        self.article()
+        pending = self.article()
+        Newsletter.objects.create(title='Weekly', content='Body', approved=True,
+                                  journalist=self.journalist, publisher=self.publisher)
+        self.assertEqual(self.counts(self.publisher, *fields), [0, 2, 1])
+
+        post = Article.objects.get(id=pending.id)
+        post.approved = True
+        post.save()
+        post.save()
+        self.assertEqual(self.counts(self.journalist, *fields), [1, 1, 1])
+        post.delete()
+        self.assertEqual(self.counts(self.publisher, *fields), [0, 1, 1])
+        self.assertEqual(self.counts(self.journalist, *fields), [0, 1, 1])
+
+    def test_subscribers_counted(self):
+        reader = User.objects.create_user(username='statsreader')
+        subscriptions = [
+            Subscription.objects.create(user=reader, type='publisher', publisher=self.publisher),
+            Subscription.objects.create(user=reader, type='journalist', journalist=self.journalist),
+        ]
+        self.assertEqual(self.counts(self.publisher, 'subscribers'), [1])
+        self.assertEqual(self.counts(self.journalist, 'subscribers'), [1])
+        subscriptions[0].delete()
+        self.assertEqual(self.counts(self.publisher, 'subscribers'), [0])
+
+    def test_bulk_import_and_moderation(self):
+        import_posts([f'{{"title": "{i}", "content": "Body"}}' for i in range(4)],
+                     'ndjson', ArticleImportSerializer, self.journalist)
+        self.assertEqual(self.counts(self.publisher, 'articles_pending'), [4])
+        ids = list(Article.objects.order_by('id').values_list('id', flat=True))
+        moderator = self.publisher.user
+        moderation.moderate('article', ids[:2], self.publisher, moderator, 'approve')
+        # savepoint, lock, posts to delete, feed entries, posts, one counter
+        # UPDATE per model, release
+        with self.assertNumQueries(8):
+            moderation.moderate('article', ids[2:], self.publisher, moderator, 'reject')
+        fields = ('articles_approved', 'articles_pending')
+        self.assertEqual(self.counts(self.publisher, *fields), [2, 0])
+        self.assertEqual(self.counts(self.journalist, *fields), [2, 0])
+
+    def test_recount_stats_repairs_drift(self):
+        self.article(approved=True)
+        Publisher.objects.update(articles_approved=40, subscribers=-2)
+        stdout = StringIO()
+        call_command('recount_stats', '--batch-size', '1', stdout=stdout)
+        self.assertEqual(self.counts(self.publisher, 'articles_approved', 'subscribers'),
+                         [1, 0])
+        self.assertIn('Publishers: 1 checked, 1 fixed', stdout.getvalue())
+        self.assertIn('Journalists: 1 checked, 0 fixed', stdout.getvalue())
+
+
+@override_settings(NEWSAPP_READ_REPLICAS=['replica1'], NEWSAPP_REPLICA_STICKY_SECONDS=30)
+class ReplicaRoutingTests(SimpleTestCase):
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def route(self, request, write=False):
+        """Run ``request`` through the middleware; return where it read and the response"""
+        seen = {}
+
+        def view(request):
+            if write:
+                self.router.db_for_write(Article)
+            seen['read'] = self.router.db_for_read(Article)
+            return HttpResponse()
+        response = ReplicaMiddleware(view)(request)
+        return seen['read'], response
+
+    def test_reads_leave_primary_only_when_asked(self):
+        self.assertEqual(self.router.db_for_read(Article), 'default')
+        with read_from_replica() as outcome:
+            self.assertEqual(self.router.db_for_read(Article), 'replica1')
+            self.assertEqual(self.router.db_for_write(Article), 'default')
+            # Read your own writes
+            self.assertEqual(self.router.db_for_read(Article), 'default')
+        self.assertTrue(outcome['wrote'])
+        self.assertFalse(self.router.allow_migrate('replica1', 'newsapp'))
+
+    def test_get_reads_from_replica(self):
+        read, response = self.route(self.factory.get('/articles/'))
+        self.assertEqual(read, 'replica1')
+        self.assertNotIn(PRIMARY_COOKIE, response.cookies)
+
+    def test_writes_pin_user_to_primary(self):
+        read, response = self.route(self.factory.post('/create_post/'))
+        self.assertEqual(read, 'default')
+        self.assertEqual(response.cookies[PRIMARY_COOKIE]['max-age'], 30)
+        _, response = self.route(self.factory.get('/articles/'), write=True)
+        self.assertIn(PRIMARY_COOKIE, response.cookies)
+
+        request = self.factory.get('/articles/')
+        request.COOKIES[PRIMARY_COOKIE] = str(time.time() + 30)
+        self.assertEqual(self.route(request)[0], 'default')
+        request.COOKIES[PRIMARY_COOKIE] = str(time.time() - 1)
+        self.assertEqual(self.route(request)[0], 'replica1')
+
+    def test_unused_without_replicas(self):
+        with override_settings(NEWSAPP_READ_REPLICAS=[]):
+            with self.assertRaises(MiddlewareNotUsed):
+                ReplicaMiddleware(HttpResponse)
+
+
+@skipUnless('replica1' in settings.DATABASES,
+            "set DB_ENGINE=sqlite DB_REPLICA_NAME=<file> to route to a replica")
+class ReplicaDatabaseTests(TransactionTestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='replicawriter', password='password123')
+        self.user.groups.add(Group.objects.get_or_create(name='Journalist')[0])
+        ensure_group_permissions()
+        create_newsroom('replica', writer=self.user)
+        self.client.login(username='replicawriter', password='password123')
+        self.client.cookies.pop(PRIMARY_COOKIE, None)
+
+    def queries(self, method, *args, **kwargs):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica1']) as replica:
+            getattr(self.client, method)(*args, **kwargs)
+        return len(primary), len(replica)
+
+    def test_listing_reads_replica_until_user_writes(self):
+        primary, replica = self.queries('get', reverse('news_app:article_list'))
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+        self.queries('post', reverse('news_app:create_post'),
+                     {'post_type': 'article', 'title': 'Fresh', 'content': 'Body'})
+        primary, replica = self.queries('get', reverse('news_app:article_list'))
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+
+class ProductionServingTests(SimpleTestCase):
+
+    def test_production_settings(self):
+        # In a fresh interpreter: the profile rewrites settings in place
+        script = ("import django, json; django.setup(); from django.conf import settings; "
+                  "print(json.dumps([settings.DEBUG, settings.ALLOWED_HOSTS, "
+                  "settings.TEMPLATES[0]['APP_DIRS'], settings.TEMPLATES[0]['OPTIONS']['loaders'], "
+                  "settings.MIDDLEWARE, settings.CACHES]))")
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'news_app.settings_production',
+               'DJANGO_ALLOWED_HOSTS': 'news.example.com', 'DJANGO_SECRET_KEY': 'production-key',
+               'REDIS_URL': 'redis://cache:6379/0'}
+        output = subprocess.run([sys.executable, '-c', script], env=env, cwd=settings.BASE_DIR,
+                                capture_output=True, text=True, check=True).stdout
+        debug, hosts, app_dirs, loaders, middleware, caches = json.loads(output)
+        self.assertFalse(debug)
+        self.assertEqual(hosts, ['news.example.com'])
+        self.assertEqual(caches['default']['BACKEND'],
+                         'django.core.cache.backends.redis.RedisCache')
+        self.assertFalse(app_dirs)
+        self.assertEqual(loaders[0][0], 'django.template.loaders.cached.Loader')
+        self.assertIn('django.middleware.security.SecurityMiddleware', middleware)
+
+    def test_production_settings_need_a_secret_key(self):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'news_app.settings_production',
+               'DJANGO_SECRET_KEY': ''}
+        result = subprocess.run([sys.executable, '-c', 'import django; django.setup()'], env=env,
+                                cwd=settings.BASE_DIR, capture_output=True, text=True)
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn('DJANGO_SECRET_KEY', result.stderr)
+
+    def test_gunicorn_config(self):
+        with mock.patch.dict(os.environ, {'WEB_CONCURRENCY': '3', 'GUNICORN_THREADS': '8'}):
+            config = runpy.run_path(str(settings.BASE_DIR / 'gunicorn.conf.py'))
+        self.assertEqual((config['workers'], config['threads']), (3, 8))
+        self.assertTrue(config['preload_app'])
+        self.assertEqual(config['wsgi_app'], 'news_app.wsgi:application')
+
+
+class ListFragmentCacheTests(TestCase):
+
+    def setUp(self):
+        object_cache.get_cache().clear()
+        self.publisher, self.journalist = create_newsroom('row')
+        self.editor = Editor.objects.create(user=User.objects.create_user(username='roweditor'),
+                                            publisher=self.publisher)
+        self.article = Article.objects.create(title='Pending story', content='Body',
+                                              journalist=self.journalist,
+                                              publisher=self.publisher)
+        Article.objects.create(title='Published story', content='Body',
+                               journalist=self.journalist, publisher=self.publisher,
+                               approved=True)
+        self.url = reverse('news_app:article_list')
+
+    def get(self, user):
+        self.client.force_login(user)
+        return self.client.get(self.url)
+
+    def test_rows_are_rendered_once_per_role(self):
+        with mock.patch('newsapp.functions.fragments.render_to_string',
+                        wraps=fragments.render_to_string) as render_row:
+            self.get(self.editor.user)
+            self.assertEqual(render_row.call_count, 2)
+            response = self.get(self.editor.user)
+            self.assertEqual(render_row.call_count, 2)
+        self.assertContains(response, 'Approve', count=1)
+        # Readers only see the published story and get rows without buttons
+        response = self.get(User.objects.create_user(username='rowreader'))
+        self.assertContains(response, 'Published story')
+        self.assertNotContains(response, 'Approve')
+
+    def test_edit_changes_the_row(self):
+        self.get(self.editor.user)
+        self.article.title = 'Corrected story'
+        self.article.save()
+        response = self.get(self.editor.user)
+        self.assertContains(response, 'Corrected story')
+        self.assertNotContains(response, 'Pending story')
+
+    def test_csrf_token_stays_out_of_rows(self):
+        response = self.get(self.editor.user)
+        # One form per section carries the token for every row's buttons
+        self.assertContains(response, 'csrfmiddlewaretoken', count=1)
+        cache = object_cache.get_cache()
+        key = fragments.row_key('article', self.article, 'editor', False)
+        self.assertNotIn('csrfmiddlewaretoken', cache.get(key))
+        self.assertIn('formaction="{}"'.format(reverse('news_app:publish_post')), cache.get(key))
+
+    def test_templates_use_cached_loader(self):
+        loader = engines['django'].engine.template_loaders[0]
+        self.assertIsInstance(loader, CachedLoader)
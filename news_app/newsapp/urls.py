@@ -2,6 +2,7 @@
 from django.urls import path
 from . import views
 from . import api_views
+from . import async_api_views
 
 app_name = 'news_app'
 
@@ -32,6 +33,8 @@ urlpatterns = [
          name='view_article'),
     path('subscribed/', views.subscribed_articles,
          name='subscribed_articles'),
+    path('feed/', views.feed, name='feed'),
+    path('search/', views.search_posts, name='search'),
     path('article/read/<int:article_id>/', views.read_article,
          name='read_article'),
     path('article/update/<int:post_id>/', views.update_post,
@@ -40,6 +43,8 @@ urlpatterns = [
          name='remove_post'),
     path('article/create/', views.create_post, name='create_post'),
     path('article/publish/', views.publish_post, name='publish_post'),
+    path('moderate/', views.moderate_posts, name='moderate_posts'),
+    path('moderate/claim/', views.claim_posts, name='claim_posts'),
     path('newsletter/read/<int:newsletter_id>/', views.read_newsletter,
          name='read_newsletter'),
     path('newsletter/update/<int:newsletter_id>/', views.update_newsletter,
@@ -53,6 +58,9 @@ urlpatterns = [
     path('reset-password/', views.token_request, name='token_request'),
     path('reset-password/update/', views.reset_password,
          name='reset_password'),
+
+    # Request metrics for Prometheus
+    path('internal/metrics/', views.metrics, name='metrics'),
 ]
 
 # API Endpoints
@@ -60,8 +68,37 @@ urlpatterns += [
     path('api/articles/', api_views.api_articles, name='api_articles'),
     path('api/articles/create/', api_views.api_create_article,
          name='api_create_article'),
+    path('api/articles/bulk/', api_views.api_import_articles,
+         name='api_import_articles'),
+    path('api/articles/export/', api_views.api_export_articles,
+         name='api_export_articles'),
+    path('api/articles/<int:pk>/', api_views.api_article_detail,
+         name='api_article_detail'),
     path('api/newsletters/', api_views.api_newsletters,
          name='api_newsletters'),
     path('api/newsletters/create/', api_views.api_create_newsletter,
          name='api_create_newsletter'),
+    path('api/newsletters/bulk/', api_views.api_import_newsletters,
+         name='api_import_newsletters'),
+    path('api/newsletters/export/', api_views.api_export_newsletters,
+         name='api_export_newsletters'),
+    path('api/newsletters/<int:pk>/', api_views.api_newsletter_detail,
+         name='api_newsletter_detail'),
+    path('api/search/', api_views.api_search, name='api_search'),
+
+    # Async read API, for ASGI deployments
+    path('api/async/articles/', async_api_views.api_articles,
+         name='api_articles_async'),
+    path('api/async/articles/export/', async_api_views.api_export_articles,
+         name='api_export_articles_async'),
+    path('api/async/articles/<int:pk>/', async_api_views.api_article_detail,
+         name='api_article_detail_async'),
+    path('api/async/newsletters/', async_api_views.api_newsletters,
+         name='api_newsletters_async'),
+    path('api/async/newsletters/export/',
+         async_api_views.api_export_newsletters,
+         name='api_export_newsletters_async'),
+    path('api/async/newsletters/<int:pk>/',
+         async_api_views.api_newsletter_detail,
+         name='api_newsletter_detail_async'),
 ]
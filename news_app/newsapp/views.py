@@ -1,20 +1,26 @@
 '''Imported Modules'''
+import logging
 import secrets
 from datetime import datetime, timedelta
 from hashlib import sha1
+from urllib.parse import urlencode
 from django.shortcuts import get_object_or_404, render, redirect
 from django.urls import reverse
-from django.conf import settings
 from django.utils import timezone
-from django.http import HttpResponseRedirect, JsonResponse
+from django.utils.dateparse import parse_datetime
+from django.http import (
+    Http404, HttpResponse, HttpResponseRedirect, JsonResponse
+)
 from django.contrib.auth import authenticate, login, logout
-from django.contrib.auth.models import Group, Permission
+from django.contrib.auth.models import Group
 from django.contrib.auth.password_validation import validate_password
-from django.core.mail import EmailMessage, send_mail
+from django.core.mail import EmailMessage
 from django.core.exceptions import ValidationError
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, permission_required
-from django.contrib.contenttypes.models import ContentType
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Prefetch, Q, Value
 from .models import (
     User, Reader,
     Publisher, Journalist,
@@ -23,7 +29,30 @@ from .models import (
     Newsletter, NewsletterSerializer,
     Subscription, ResetToken
 )
-from .functions.twitter_api import Tweet
+from .functions.feed import FEED_PAGE_SIZE, read_feed
+from .functions.fragments import listing_context
+from .functions.instrumentation import enabled_setting, registry
+from .functions.moderation import (
+    ACTIONS, CLAIM_ACTIONS, MAX_MODERATION_BATCH, POST_MODELS, claim,
+    claim_cutoff, moderate, moderator_publisher, parse_post_ids, queue,
+    release
+)
+from .functions.object_cache import post_html, post_json
+from .functions.outbox import enqueue_publication
+from .functions.pagination import (
+    InvalidCursor, paginate_by_cursor, parse_page_size
+)
+from .functions.search import load_hits, search
+from .functions.roles import forget_user_roles, get_user_roles
+from .middleware import is_internal
+
+TEAM_PAGE_SIZE = 25
+TEAM_POSTS = 5
+MAX_TEAM_POSTS = 50
+SEARCH_PAGE_SIZE = 20
+MODERATION_PAGE_SIZE = 50
+
+logger = logging.getLogger(__name__)
 
 
 def verify_username(username):
@@ -41,58 +70,10 @@ def verify_password(password):
         validate_password(password)
         return True
     except ValidationError:
-        print("Issue with passowrd")
+        logger.info("Password rejected by the validators")
         return False
 
 
-def ensure_group_permissions():
-    """
-    Ensures the user's group permissions are implemented
-
-    Args:
-
-    Returns:
-    """
-    journalist_group, _ = Group.objects.get_or_create(name='Journalist')
-    editor_group, _ = Group.objects.get_or_create(name='Editor')
-    reader_group, _ = Group.objects.get_or_create(name='Reader')
-    publisher_group, _ = Group.objects.get_or_create(name='Publisher')
-
-    # Attaching permissions to Journalist
-    journalist_ct = ContentType.objects.get_for_model(Journalist)
-    journalist_perms = Permission.objects.filter(
-        content_type=journalist_ct,
-        codename__in=['can_update', 'can_create', 'can_remove',
-                      'can_view', 'join_publisher']
-    )
-    journalist_group.permissions.add(*journalist_perms)
-
-    # Attach permissions defined to Editor model
-    editor_ct = ContentType.objects.get_for_model(Editor)
-    editor_perms = Permission.objects.filter(
-        content_type=editor_ct,
-        codename__in=['can_update', 'can_remove',
-                      'can_view', 'join_publisher', 'can_publish']
-    )
-    editor_group.permissions.add(*editor_perms)
-
-    # Attach permissions defined to Reader model
-    reader_ct = ContentType.objects.get_for_model(Reader)
-    reader_perms = Permission.objects.filter(
-        content_type=reader_ct,
-        codename__in=['can_subscribe']
-    )
-    reader_group.permissions.add(*reader_perms)
-
-    # Attach permissions defined to Publisher model
-    publisher_ct = ContentType.objects.get_for_model(Publisher)
-    publisher_perms = Permission.objects.filter(
-        content_type=publisher_ct,
-        codename__in=['can_publish', 'can_view']
-    )
-    publisher_group.permissions.add(*publisher_perms)
-
-
 def welcome(request):
     """
     Function that displays the first view to logged user
@@ -156,10 +137,10 @@ def choose_group(request):
         or redirects based on selection.
     """
     user = request.user
-    ensure_group_permissions()
 
     if request.method == 'POST':
         selected_role = request.POST.get('role')
+        forget_user_roles(request)
 
         if selected_role == 'reader':
             Reader.objects.get_or_create(user=user)
@@ -268,20 +249,20 @@ def home(request):
     Returns:
         HttpResponse: Renders the 'home.html' template with articles.
     """
-    ensure_group_permissions()
-    user = request.user
+    roles = get_user_roles(request)
     context = {"options": []}
 
-    if user.groups.filter(name='Publisher').exists():
+    if 'Publisher' in roles:
         context['group'] = 'Publisher'
         context['options'] = [
             {"label": "Create Post", "url_name": "news_app:create_post"},
             {"label": "View Submissions", "url_name": "news_app:view_mine"},
             {"label": "Manage Team",
              "url_name": "news_app:publisher_team_view"},
+            {"label": "Moderate Posts", "url_name": "news_app:moderate_posts"},
         ]
 
-    elif user.groups.filter(name='Journalist').exists():
+    elif 'Journalist' in roles:
         context['group'] = 'Journalist'
         context['options'] = [
             {"label": "Write Post", "url_name": "news_app:create_post"},
@@ -291,20 +272,23 @@ def home(request):
              "url_name": "news_app:register_under_publisher"},
         ]
 
-    elif user.groups.filter(name='Editor').exists():
+    elif 'Editor' in roles:
         context['group'] = 'Editor'
         context['options'] = [
             {"label": "View All Posts", "url_name": "news_app:article_list"},
             {'label': 'Edit/Delete Posts', 'url_name': 'news_app:view_mine'},
+            {"label": "Moderate Posts", "url_name": "news_app:moderate_posts"},
             {"label": "Join Publisher",
              "url_name": "news_app:register_under_publisher"},
         ]
 
-    elif user.groups.filter(name='Reader').exists():
+    elif 'Reader' in roles:
         context['group'] = 'Reader'
         context['options'] = [
             {"label": "Read All Posts", "url_name": "news_app:article_list"},
             {"label": "Subscribe", "url_name": "news_app:subscribe"},
+            {"label": "My Feed", "url_name": "news_app:feed"},
+            {"label": "Search", "url_name": "news_app:search"},
         ]
 
     else:
@@ -364,7 +348,7 @@ def register_under_publisher(request):
             'publisher': publisher
         })
 
-    publishers = Publisher.objects.all()
+    publishers = Publisher.objects.select_related('user')
     return render(request, 'newsapp/register_under_publisher.html',
                   {'publishers': publishers})
 
@@ -385,8 +369,8 @@ def subscribe(request):
     user = request.user
 
     # Get lists for the dropdowns
-    publishers = Publisher.objects.all()
-    journalists = Journalist.objects.all()
+    publishers = Publisher.objects.select_related('user')
+    journalists = Journalist.objects.select_related('user')
 
     if request.method == 'POST':
         publisher_id = request.POST.get('publisher_id')
@@ -426,11 +410,25 @@ def subscribe(request):
     })
 
 
+def recent_posts(model, limit):
+    """
+    Newest posts per journalist, sliced inside a single prefetch query
+    """
+    return model.objects.only(
+        'id', 'title', 'approved', 'created_at', 'journalist_id'
+    ).order_by('-created_at')[:limit]
+
+
 @login_required
 def publisher_team_view(request):
     """
     View for a Publisher to see all Editors and Journalists
     under their publishing house.
+
+    Journalists are paginated with ``?page=`` and show their newest
+    ``?posts=`` articles and newsletters with approved/pending totals,
+    read from the journalists' counters.
+    The page costs a fixed number of queries regardless of team size.
     """
     try:
         publisher = request.user.publisher
@@ -440,23 +438,33 @@ def publisher_team_view(request):
             "message": "You are not a publisher."
         })
 
+    # Number of recent posts listed under each journalist
+    posts_per_journalist = parse_page_size(request.GET.get('posts'),
+                                           default=TEAM_POSTS,
+                                           maximum=MAX_TEAM_POSTS)
+
     # Get all editors and journalists under this publisher
-    editors = Editor.objects.filter(publisher=publisher)
-    journalists = Journalist.objects.filter(publisher=publisher)
-
-    # Optionally, include published articles/newsletters for each journalist
-    journalist_data = []
-    for journalist in journalists:
-        journalist_data.append({
-            "journalist": journalist,
-            "articles": Article.objects.filter(journalist=journalist),
-            "newsletters": Newsletter.objects.filter(journalist=journalist)
-        })
+    editors = Editor.objects.filter(publisher=publisher).select_related('user')
+    journalists = Journalist.objects.filter(
+        publisher=publisher
+    ).select_related('user').prefetch_related(
+        Prefetch('articles_written',
+                 queryset=recent_posts(Article, posts_per_journalist),
+                 to_attr='recent_articles'),
+        Prefetch('newsletters_written',
+                 queryset=recent_posts(Newsletter, posts_per_journalist),
+                 to_attr='recent_newsletters'),
+    ).order_by('user__username')
+
+    page = Paginator(journalists, TEAM_PAGE_SIZE).get_page(
+        request.GET.get('page'))
 
     context = {
         "publisher": publisher,
         "editors": editors,
-        "journalists": journalist_data,
+        "journalists": page,
+        "posts_per_journalist": posts_per_journalist,
+        "more_posts": min(posts_per_journalist * 2, MAX_TEAM_POSTS),
     }
 
     return render(request, "newsapp/publisher_team.html", context)
@@ -487,28 +495,21 @@ def article_list(request):
             articles = Article.objects.filter(publisher=user.publisher)
             newsletters = Newsletter.objects.filter(publisher=user.publisher)
         elif hasattr(user, 'editor'):
-            # Editor sees approved articles/newsletters
-            articles = Article.objects.filter(approved=True).union(
-                Article.objects.filter(approved=False,
-                                       publisher=user.editor.publisher)
-            )
-            newsletters = Newsletter.objects.filter(approved=True).union(
-                Newsletter.objects.filter(approved=False,
-                                          publisher=user.editor.publisher)
-            )
+            # Editor sees approved articles/newsletters plus their
+            # publisher's pending ones
+            visible = (Q(approved=Value(True))
+                       | Q(approved=Value(False),
+                           publisher=user.editor.publisher))
+            articles = Article.objects.filter(visible)
+            newsletters = Newsletter.objects.filter(visible)
         else:
             # Normal users: only approved
-            articles = Article.objects.filter(approved=True)
-            newsletters = Newsletter.objects.filter(approved=True)
+            articles = Article.objects.published()
+            newsletters = Newsletter.objects.published()
 
-    context = {
-        'articles': articles,
-        'newsletters': newsletters,
-        'mine_view': mine_view,
-        'is_journalist': hasattr(user, 'journalist'),
-        'is_editor': hasattr(user, 'editor'),
-        'is_publisher': hasattr(user, 'publisher'),
-    }
+    # Rows are cached per post version and role; see functions/fragments.py
+    context = listing_context(user, articles.for_listing(),
+                              newsletters.for_listing(), mine_view)
 
     return render(request, 'newsapp/article_list.html', context)
 
@@ -549,11 +550,9 @@ def view_mine(request):
         articles = Article.objects.none()
         newsletters = Newsletter.objects.none()
 
-    return render(request, 'newsapp/article_list.html', {
-        'articles': articles,
-        'newsletters': newsletters,
-        'mine_view': True
-    })
+    return render(request, 'newsapp/article_list.html', listing_context(
+        user, articles.for_listing(), newsletters.for_listing(),
+        mine_view=True))
 
 
 def subscribed_articles(request):
@@ -568,7 +567,8 @@ def subscribed_articles(request):
     """
 
     user = request.user
-    subscriptions = Subscription.objects.filter(user=user)
+    subscriptions = Subscription.objects.filter(user=user).select_related(
+        'publisher__user', 'journalist__user')
 
     # publishers = [sub.publisher for sub in subscriptions if sub.publisher]
     # journalists = [sub.journalist for sub in subscriptions if sub.journalist]
@@ -578,6 +578,68 @@ def subscribed_articles(request):
     })
 
 
+@login_required
+def feed(request):
+    """
+    Display the logged-in user's feed of posts from the publishers and
+    journalists they follow, newest first.
+
+    Args:
+        request (HttpRequest): The request object.
+
+    Returns:
+        HttpResponse: Renders the feed template with one page of posts.
+    """
+    before = request.GET.get('before')
+    before = parse_datetime(before) if before else None
+    # The last post of the previous page, as post_type:id
+    before_post = None
+    post_type, _, post_id = request.GET.get('before_post', '').partition(':')
+    if post_type in ('article', 'newsletter') and post_id.isdigit():
+        before_post = (post_type, int(post_id))
+    size = parse_page_size(request.GET.get('size'), FEED_PAGE_SIZE)
+    items = read_feed(request.user, before=before, limit=size,
+                      before_post=before_post)
+
+    older = None
+    if len(items) == size:
+        at, post_type, post = items[-1]
+        older = "?" + urlencode({'before': at.isoformat(),
+                                 'before_post': f"{post_type}:{post.id}"})
+
+    return render(request, 'newsapp/feed.html', {
+        'items': [{'type': post_type, 'post': post, 'published_at': at}
+                  for at, post_type, post in items],
+        'older': older,
+    })
+
+
+@login_required
+def search_posts(request):
+    """
+    Search approved articles and newsletters, best match first.
+
+    Args:
+        request (HttpRequest): The request object.
+
+    Returns:
+        HttpResponse: Renders the search template with one page of results.
+    """
+    query = request.GET.get('q', '').strip()
+    page = parse_page_size(request.GET.get('page'), 1, 500)
+    results = search(query, limit=SEARCH_PAGE_SIZE,
+                     offset=(page - 1) * SEARCH_PAGE_SIZE)
+
+    return render(request, 'newsapp/search.html', {
+        'query': query,
+        'total': results.total,
+        'results': [{'type': hit.post_type, 'post': post}
+                    for hit, post in load_hits(results.hits)],
+        'page': page,
+        'has_next': page * SEARCH_PAGE_SIZE < results.total,
+    })
+
+
 def read_article(request, article_id):
     """
     Display the content of a single article.
@@ -590,12 +652,9 @@ def read_article(request, article_id):
         HttpResponse: Renders the article template or returns JSON.
     """
 
-    article = get_object_or_404(Article, id=article_id)
-    serializer = ArticleSerializer(article)
     if request.headers.get("Accept") == "application/json":
-        return JsonResponse(serializer.data, safe=False)
-    return render(request, 'newsapp/read_article.html',
-                  {'article': article})
+        return JsonResponse(post_json('article', article_id), safe=False)
+    return HttpResponse(post_html('article', article_id))
 
 
 def read_newsletter(request, newsletter_id):
@@ -609,14 +668,11 @@ def read_newsletter(request, newsletter_id):
     Returns:
         HttpResponse: Renders the newsletter template.
     """
-    newsletter = get_object_or_404(Newsletter, id=newsletter_id)
-    serializer = NewsletterSerializer(newsletter)
-
     if request.headers.get("Accept") == "application/json":
-        return JsonResponse(serializer.data, safe=False)
+        return JsonResponse(post_json('newsletter', newsletter_id),
+                            safe=False)
 
-    return render(request, 'newsapp/read_newsletter.html',
-                  {'newsletter': newsletter})
+    return HttpResponse(post_html('newsletter', newsletter_id))
 
 
 def view_article(request, article_id):
@@ -631,6 +687,9 @@ def view_article(request, article_id):
         HttpResponse: Renders article details template or returns JSON data.
     """
 
+    if request.headers.get("Accept") == "application/json":
+        return JsonResponse(post_json('article', article_id), safe=False)
+
     user = request.user
     article = get_object_or_404(Article, id=article_id)
 
@@ -642,10 +701,6 @@ def view_article(request, article_id):
     elif hasattr(user, 'journalist'):
         role = "journalist"
 
-    serializer = ArticleSerializer(article)
-    if request.headers.get("Accept") == "application/json":
-        return JsonResponse(serializer.data, safe=False)
-
     return render(request, 'newsapp/article_list.html',
                   {'article': article,
                    'role': role})
@@ -665,7 +720,7 @@ def create_post(request):
     """
 
     user = request.user
-    publishers = Publisher.objects.all()
+    publishers = Publisher.objects.select_related('user')
 
     if not hasattr(user, 'journalist'):
         messages.error(request, "Only journalists can create posts.")
@@ -850,6 +905,10 @@ def remove_post(request, post_id):
 def publish_post(request):
     """
     Approve and publish an article or newsletter.
+
+    Subscriber emails and the tweet are queued in the outbox in the same
+    transaction as the approval, so the request returns without waiting
+    on SMTP or Twitter. ``manage.py drain_outbox`` delivers them.
     """
 
     if request.method != 'POST':
@@ -878,34 +937,11 @@ def publish_post(request):
             return JsonResponse(
                 {'error': 'Editor cannot approve this article.'}, status=403)
 
-        article.approved = True
-        article.save()
-
-        subscribers = Subscription.objects.filter(
-            type='publisher',
-            publisher=publisher
-        )
-
-        emails = [sub.user.email for sub in subscribers if sub.user.email]
-
-        if emails:
-            send_mail(
-                subject=f"New Article Published: {article.title}",
-                message=f"A new article has been published by"
-                        f"{publisher.user.username}.\n\nTitle:"
-                        f"{article.title}\n\n{article.content[:200]}...",
-                from_email=settings.EMAIL_HOST_USER,
-                recipient_list=emails,
-                fail_silently=True,
-            )
-
-        # Post tweet
-        post_tweet = f"New Post by {publisher}: {article.title}"
-        try:
-            tweet = Tweet()
-            tweet.make_tweet(post_tweet)
-        except Exception as e:
-            print(f"Twitter post failed: {e}")
+        # Subscriber emails and the tweet are sent by the outbox worker
+        with transaction.atomic():
+            article.approved = True
+            article.save()
+            enqueue_publication('article', article, publisher)
 
         if request.headers.get("Accept") == "application/json":
             return JsonResponse({
@@ -925,34 +961,11 @@ def publish_post(request):
         if hasattr(request.user, 'editor') and newsletter.publisher != publisher:
             return JsonResponse({'error': 'Editor cannot approve this newsletter.'}, status=403)
 
-        newsletter.approved = True
-        newsletter.save()
-
-        subscribers = Subscription.objects.filter(
-            type='publisher',
-            publisher=publisher
-        )
-
-        emails = [sub.user.email for sub in subscribers if sub.user.email]
-
-        if emails:
-            send_mail(
-                subject=f"New Newsletter: {newsletter.title}",
-                message=f"{publisher.user.username} just released a new"
-                        f"newsletter.\n\nTitle:"
-                        f"{newsletter.title}\n\n{newsletter.content[:200]}...",
-                from_email=settings.EMAIL_HOST_USER,
-                recipient_list=emails,
-                fail_silently=True,
-            )
-
-        # Tweet
-        post_tweet = f"New Post by {publisher}: {newsletter.title}"
-        try:
-            tweet = Tweet()
-            tweet.make_tweet(post_tweet)
-        except Exception as e:
-            print(f"Twitter post failed: {e}")
+        # Subscriber emails and the tweet are sent by the outbox worker
+        with transaction.atomic():
+            newsletter.approved = True
+            newsletter.save()
+            enqueue_publication('newsletter', newsletter, publisher)
 
         if request.headers.get("Accept") == "application/json":
             return JsonResponse({
@@ -967,6 +980,185 @@ def publish_post(request):
     return JsonResponse({'error': 'Invalid post type.'}, status=400)
 
 
+def queue_url(post_type, cursor=None):
+    """
+    URL of a page of the moderation queue.
+    """
+    params = {'post_type': post_type}
+    if cursor:
+        params['cursor'] = cursor
+    return f"{reverse('news_app:moderate_posts')}?{urlencode(params)}"
+
+
+def claim_state(post, user, cutoff):
+    """
+    Whose live claim a queued post carries: 'mine', 'other' or None.
+    """
+    if post.claimed_by_id is None or post.claimed_at < cutoff:
+        return None
+    return 'mine' if post.claimed_by_id == user.id else 'other'
+
+
+@login_required
+@permission_required('newsapp.can_publish', raise_exception=True)
+def moderate_posts(request):
+    """
+    Moderation queue: the pending posts of the moderator's publisher,
+    oldest first, and bulk approval or rejection.
+
+    GET shows one page of ``post_type`` posts (``?cursor=`` keyset pages of
+    ``?page_size=``), as JSON when the request accepts it. POST takes
+    ``post_type``, ``action`` ('approve' or 'reject') and up to
+    ``MAX_MODERATION_BATCH`` ``post_id`` values, and changes them with one
+    statement (see ``moderate``). Subscribers get one digest per batch.
+    Posts another moderator has claimed are skipped.
+
+    Args:
+        request (HttpRequest): The request object.
+
+    Returns:
+        HttpResponse: The queue, the outcome per id as JSON when the
+        request accepts it, or a redirect back to the queue.
+    """
+    publisher = moderator_publisher(request.user)
+    if publisher is None:
+        return JsonResponse({'error': 'User is not a publisher or editor.'},
+                            status=403)
+    wants_json = request.headers.get("Accept") == "application/json"
+
+    if request.method == 'POST':
+        post_type = request.POST.get('post_type')
+        action = request.POST.get('action')
+        if post_type not in POST_MODELS or action not in ACTIONS:
+            return JsonResponse({'error': 'Unknown post type or action.'},
+                                status=400)
+        try:
+            post_ids = parse_post_ids(request.POST.getlist('post_id'))
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        outcome = moderate(post_type, post_ids, publisher, request.user,
+                           action)
+        if wants_json:
+            return JsonResponse({
+                'post_type': post_type,
+                'action': action,
+                'results': [{'id': post_id, 'result': result}
+                            for post_id, result in outcome.items()],
+            })
+
+        done = sum(result in ('approved', 'rejected')
+                   for result in outcome.values())
+        messages.success(request, f"{done} {post_type}(s) {action}d.")
+        skipped = [str(post_id) for post_id, result in outcome.items()
+                   if result not in ('approved', 'rejected')]
+        if skipped:
+            messages.warning(request, "Skipped (claimed, not pending or "
+                             "not yours): " + ", ".join(skipped))
+        return redirect(queue_url(post_type, request.POST.get('cursor')))
+
+    post_type = request.GET.get('post_type', 'article')
+    if post_type not in POST_MODELS:
+        return JsonResponse({'error': 'Unknown post type.'}, status=400)
+    page_size = parse_page_size(request.GET.get('page_size'),
+                                default=MODERATION_PAGE_SIZE,
+                                maximum=MAX_MODERATION_BATCH)
+    try:
+        page = paginate_by_cursor(queue(post_type, publisher),
+                                  request.GET.get('cursor'), page_size,
+                                  oldest_first=True)
+    except InvalidCursor:
+        return JsonResponse({'error': 'Invalid cursor.'}, status=400)
+
+    cutoff = claim_cutoff()
+    for post in page.items:
+        post.claim_state = claim_state(post, request.user, cutoff)
+
+    if wants_json:
+        return JsonResponse({
+            'post_type': post_type,
+            'posts': [{
+                'id': post.id,
+                'title': post.title,
+                'journalist': post.journalist.user.username,
+                'created_at': post.created_at,
+                'claimed_by': (post.claimed_by.username
+                               if post.claim_state else None),
+            } for post in page.items],
+            'next': page.next_cursor,
+            'prev': page.prev_cursor,
+        })
+
+    return render(request, 'newsapp/moderate.html', {
+        'publisher': publisher,
+        'post_type': post_type,
+        'post_types': list(POST_MODELS),
+        'page': page,
+        'cursor': request.GET.get('cursor', ''),
+        'next_url': (queue_url(post_type, page.next_cursor)
+                     if page.next_cursor else None),
+        'prev_url': (queue_url(post_type, page.prev_cursor)
+                     if page.prev_cursor else None),
+    })
+
+
+@login_required
+@permission_required('newsapp.can_publish', raise_exception=True)
+def claim_posts(request):
+    """
+    Claim pending posts for review, or release them.
+
+    POST takes ``post_type``, ``action`` ('claim' or 'release') and
+    ``post_id`` values. A claim keeps other moderators from approving or
+    rejecting the posts for ``NEWSAPP_CLAIM_TIMEOUT`` seconds; see
+    ``claim`` for how two moderators racing for a post are settled.
+
+    Args:
+        request (HttpRequest): The request object.
+
+    Returns:
+        HttpResponse: The outcome per id as JSON when the request accepts
+        it, otherwise a redirect back to the queue.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+    publisher = moderator_publisher(request.user)
+    if publisher is None:
+        return JsonResponse({'error': 'User is not a publisher or editor.'},
+                            status=403)
+
+    post_type = request.POST.get('post_type')
+    action = request.POST.get('action')
+    if post_type not in POST_MODELS or action not in CLAIM_ACTIONS:
+        return JsonResponse({'error': 'Unknown post type or action.'},
+                            status=400)
+    try:
+        post_ids = parse_post_ids(request.POST.getlist('post_id'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    if action == 'claim':
+        outcome = claim(post_type, post_ids, publisher, request.user)
+    else:
+        release(post_type, post_ids, request.user)
+        outcome = dict.fromkeys(post_ids, 'released')
+
+    if request.headers.get("Accept") == "application/json":
+        return JsonResponse({
+            'post_type': post_type,
+            'action': action,
+            'results': [{'id': post_id, 'result': result}
+                        for post_id, result in outcome.items()],
+        })
+
+    taken = [str(post_id) for post_id, result in outcome.items()
+             if result == 'taken']
+    if taken:
+        messages.warning(request, "Already claimed by someone else: "
+                         + ", ".join(taken))
+    return redirect(queue_url(post_type, request.POST.get('cursor')))
+
+
 # Password reset handling
 def build_email(user, reset_link):
     """
@@ -1142,3 +1334,18 @@ def reset_password(request):
 
     messages.success(request, "Password reset successful.")
     return redirect('news_app:login')
+
+
+def metrics(request):
+    """
+    Per-view request metrics in the Prometheus text format.
+
+    Only answered for ``INTERNAL_IPS`` and staff users, and only while
+    ``NEWSAPP_INSTRUMENTATION`` is on.
+    """
+    if not enabled_setting():
+        raise Http404
+    if not (is_internal(request) or request.user.is_staff):
+        return HttpResponse(status=403)
+    return HttpResponse(registry.render(),
+                        content_type='text/plain; version=0.0.4')